@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.admission.AdmissionMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -70,17 +74,171 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'AudioServe.wsgi.application'
 
+# AudioServe/asgi.py turns this on to serve the API through the async views
+# in api/async_views.py. Their database work runs on a pool of
+# AUDIO_ASYNC_DB_THREADS threads, each holding one SQLite connection.
+AUDIO_ASYNC_VIEWS = os.environ.get('AUDIOSERVE_ASYNC_VIEWS') == '1'
+
+AUDIO_ASYNC_DB_THREADS = int(os.environ.get('AUDIOSERVE_DB_THREADS', 4))
+
+# With AUDIOSERVE_GROUP_COMMIT=1, single-item creates are inserted by one
+# writer thread (api/group_commit.py) that commits up to
+# AUDIO_GROUP_COMMIT_MAX_ITEMS items at a time, waiting at most
+# AUDIO_GROUP_COMMIT_MAX_DELAY seconds for a batch to fill.
+AUDIO_GROUP_COMMIT = os.environ.get('AUDIOSERVE_GROUP_COMMIT') == '1'
+
+AUDIO_GROUP_COMMIT_MAX_ITEMS = int(os.environ.get('AUDIOSERVE_GROUP_COMMIT_MAX_ITEMS', 64))
+
+AUDIO_GROUP_COMMIT_MAX_DELAY = float(os.environ.get('AUDIOSERVE_GROUP_COMMIT_MAX_DELAY', 0.002))
+
+# Bulk creates, updates and deletes bigger than this many bytes are refused
+# with a 413. Their JSON or NDJSON body is parsed in memory as a whole.
+AUDIO_BULK_MAX_BYTES = int(os.environ.get('AUDIOSERVE_BULK_MAX_BYTES', 16 * 1024 * 1024))
+
+# api/compression.py compresses JSON responses of at least
+# AUDIO_COMPRESSION_MIN_SIZE bytes, and every streamed response, with the
+# best of zstd, br and gzip the client accepts. zstd and br need the
+# zstandard and brotli packages.
+AUDIO_COMPRESSION_MIN_SIZE = int(os.environ.get('AUDIOSERVE_COMPRESSION_MIN_SIZE', 1024))
+
+AUDIO_COMPRESSION_LEVELS = {
+    'zstd': int(os.environ.get('AUDIOSERVE_ZSTD_LEVEL', 3)),
+    'br': int(os.environ.get('AUDIOSERVE_BROTLI_LEVEL', 4)),
+    'gzip': int(os.environ.get('AUDIOSERVE_GZIP_LEVEL', 6)),
+}
+
+# api/admission.py admits at most this many concurrent reads and writes
+# (POSTs), with this many more waiting, and sheds requests that wait longer
+# than AUDIO_ADMISSION_MAX_WAIT seconds. A streamed read gives its slot
+# back after AUDIO_ADMISSION_MAX_HOLD seconds, even if its client is still
+# reading. Reads are CPU bound, so they are limited per core. SQLite runs
+# one write at a time, so more concurrent writes only queue inside SQLite's
+# busy handler, unless group commit is batching them.
+# AUDIOSERVE_CLIENT_RATE turns on per-client rate limiting, in requests per
+# second.
+AUDIO_ADMISSION_LIMITS = {
+    'read': (
+        int(os.environ.get('AUDIOSERVE_READ_CONCURRENCY', 2 * (os.cpu_count() or 1))),
+        int(os.environ.get('AUDIOSERVE_READ_QUEUE', 64)),
+    ),
+    'write': (
+        int(os.environ.get(
+            'AUDIOSERVE_WRITE_CONCURRENCY', AUDIO_GROUP_COMMIT_MAX_ITEMS if AUDIO_GROUP_COMMIT else 1,
+        )),
+        int(os.environ.get('AUDIOSERVE_WRITE_QUEUE', 32)),
+    ),
+}
+
+AUDIO_ADMISSION_MAX_WAIT = float(os.environ.get('AUDIOSERVE_ADMISSION_MAX_WAIT', 0.25))
+
+AUDIO_ADMISSION_MAX_HOLD = float(os.environ.get('AUDIOSERVE_ADMISSION_MAX_HOLD', 1.0))
+
+AUDIO_CLIENT_RATE = float(os.environ.get('AUDIOSERVE_CLIENT_RATE', 0))
+
+AUDIO_CLIENT_BURST = int(os.environ.get('AUDIOSERVE_CLIENT_BURST', 100))
+
+# Uploaded audio files are kept under AUDIOSERVE_MEDIA_ROOT. Uploads are
+# written to FILE_UPLOAD_TEMP_DIR, inside it, one AUDIO_UPLOAD_CHUNK_SIZE
+# chunk at a time, so that storing them is a rename and never a copy.
+MEDIA_ROOT = os.environ.get('AUDIOSERVE_MEDIA_ROOT', BASE_DIR / 'media')
+
+FILE_UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, '.uploads')
+
+AUDIO_UPLOAD_CHUNK_SIZE = int(os.environ.get('AUDIOSERVE_UPLOAD_CHUNK_SIZE', 1024 * 1024))
+
+AUDIO_MAX_UPLOAD_SIZE = int(os.environ.get('AUDIOSERVE_MAX_UPLOAD_SIZE', 2 * 1024 ** 3))
+
+# The duration of an uploaded file is read from its headers by
+# AUDIO_PROBE_WORKERS worker processes (0 to read it in the request thread),
+# waiting at most AUDIO_PROBE_TIMEOUT seconds.
+AUDIO_PROBE_WORKERS = int(os.environ.get('AUDIOSERVE_PROBE_WORKERS', os.cpu_count() or 1))
+
+AUDIO_PROBE_TIMEOUT = float(os.environ.get('AUDIOSERVE_PROBE_TIMEOUT', 5))
+
+# `manage.py generate_peaks` writes one min/max waveform peak per this many
+# sample frames, for each level that /peaks/ serves. Each must divide the next.
+AUDIO_PEAK_RESOLUTIONS = (256, 1024, 4096, 16384)
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# AUDIOSERVE_DB_PROFILE=production tunes SQLite for concurrent use through
+# api/backends/sqlite3: WAL, so readers never wait for the writer, a busy
+# timeout instead of immediate "database is locked" errors, and persistent
+# connections. ReadView queries go to the read-only 'reader' alias; writes
+# go to 'default', whose transactions take the write lock up front.
+
+AUDIO_DB_PATH = os.environ.get('AUDIOSERVE_DB_PATH', BASE_DIR / 'db.sqlite3')
+
+AUDIO_SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
 }
 
+if os.environ.get('AUDIOSERVE_DB_PROFILE') == 'production':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'api.backends.sqlite3',
+            'NAME': AUDIO_DB_PATH,
+            'CONN_MAX_AGE': None,
+            'PRAGMAS': AUDIO_SQLITE_PRAGMAS,
+            'TRANSACTION_MODE': 'IMMEDIATE',
+        },
+        'reader': {
+            'ENGINE': 'api.backends.sqlite3',
+            'NAME': AUDIO_DB_PATH,
+            'CONN_MAX_AGE': None,
+            'PRAGMAS': dict(AUDIO_SQLITE_PRAGMAS, query_only='ON'),
+            'TEST': {'MIRROR': 'default'},
+        },
+    }
+    DATABASE_ROUTERS = ['api.routers.ReadWriteRouter']
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': AUDIO_DB_PATH,
+        }
+    }
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# ReadView responses are cached here, with the versions that writes move on
+# to invalidate them. The local-memory cache is per process, so a write only
+# invalidates the cache of the process that made it: use it only with a
+# single worker process, like runserver. The production profile, meant for
+# several workers, defaults to the file cache, which they all share.
+# AUDIOSERVE_CACHE=file or locmem picks one explicitly.
+
+AUDIO_CACHE_MAX_ENTRIES = int(os.environ.get('AUDIOSERVE_CACHE_MAX_ENTRIES', 10000))
+
+AUDIO_CACHE_BACKEND = os.environ.get(
+    'AUDIOSERVE_CACHE', 'file' if os.environ.get('AUDIOSERVE_DB_PROFILE') == 'production' else 'locmem',
+)
+
+if AUDIO_CACHE_BACKEND == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache.FileBasedLRUCache',
+            'LOCATION': BASE_DIR / 'cache',
+            'OPTIONS': {'MAX_ENTRIES': AUDIO_CACHE_MAX_ENTRIES},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'api.cache.LocMemLRUCache',
+            'LOCATION': 'audioserve',
+            'OPTIONS': {'MAX_ENTRIES': AUDIO_CACHE_MAX_ENTRIES},
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -0,0 +1,302 @@
+"""
+Admission control in front of the views, so that a burst is turned away
+quickly instead of queueing behind SQLite's single writer until every
+request is slow.
+
+AdmissionMiddleware sends each request through one of two gates: 'write'
+for POSTs, which take SQLite's write lock, and 'read' for everything else.
+A gate admits up to `limit` requests at a time. Up to `queue` more wait
+for a slot, for at most AUDIO_ADMISSION_MAX_WAIT seconds each. A request
+that finds the queue full, or is still waiting at the deadline, is shed
+with a 503 and a Retry-After. So an admitted request never queues longer
+than the target. The slot is held until the response is closed, which
+for streamed reads is after the last row has been sent, but for no more
+than AUDIO_ADMISSION_MAX_HOLD seconds, so that slow clients cannot keep
+every slot. Requests whose body may be large are the exception: UploadView
+and CreateView take the write gate themselves once an audio file has
+arrived, and the bulk views once they have read their JSON body.
+
+With AUDIO_CLIENT_RATE set, every client address also gets a token bucket
+of AUDIO_CLIENT_BURST requests refilled at AUDIO_CLIENT_RATE per second.
+A client that runs out gets a 429 with a Retry-After. Behind a proxy,
+REMOTE_ADDR is the proxy, so leave the rate off there or limit clients in
+the proxy.
+
+Under ASGI the middleware runs as a coroutine. A request that finds a
+free slot takes it on the event loop; one that has to queue waits in a
+thread of the loop's default executor.
+
+Gate and bucket state is per process, and is served at /metrics/.
+"""
+from django.conf import settings
+from django.http import HttpResponse
+
+from asgiref.sync import sync_to_async
+
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .bulk import is_bulk
+
+
+ADMISSION_LIMITS = getattr(settings, 'AUDIO_ADMISSION_LIMITS', {
+    # gate: (concurrent requests, waiting requests)
+    'read': (2 * (os.cpu_count() or 1), 64),
+    'write': (1, 32),
+})
+
+ADMISSION_MAX_WAIT = getattr(settings, 'AUDIO_ADMISSION_MAX_WAIT', 0.25)
+
+ADMISSION_MAX_HOLD = getattr(settings, 'AUDIO_ADMISSION_MAX_HOLD', 1.0)
+
+CLIENT_RATE = getattr(settings, 'AUDIO_CLIENT_RATE', 0)
+
+CLIENT_BURST = getattr(settings, 'AUDIO_CLIENT_BURST', 100)
+
+MAX_CLIENTS = 10000
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Never shed, so that monitoring still works under overload.
+EXEMPT_PATHS = ('/metrics/',)
+
+# Take the write gate themselves once the upload is on disk, so that a slow
+# upload does not hold the write slot while its body arrives. Creates do so
+# when their body is multipart, and may carry an audio file.
+SELF_GATED_PATHS = ('/upload/',)
+
+MULTIPART_SELF_GATED_PATHS = ('/create/',)
+
+# Bulk requests to /<action>/<audioType>/ read their body before taking the
+# write gate.
+BULK_SELF_GATED_PATHS = ('/create/', '/update/', '/delete/')
+
+OVERLOADED_MESSAGE = 'Server overloaded, retry later.'
+
+RATE_LIMITED_MESSAGE = 'Too many requests, retry later.'
+
+
+class Gate:
+    """A concurrency limit with a bounded, deadline-limited wait queue."""
+
+    def __init__(self, limit, queue, max_wait):
+        self.limit = limit
+        self.queue = queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = {'queue_full': 0, 'timeout': 0}
+        self.condition = threading.Condition()
+
+    def try_acquire(self):
+        """Take a slot if one is free and nobody is waiting for it."""
+        with self.condition:
+            if self.active < self.limit and not self.waiting:
+                self.active += 1
+                self.admitted += 1
+                return True
+            return False
+
+    def acquire(self):
+        """Wait for a slot. Returns False if the request should be shed."""
+        with self.condition:
+            # The condition's lock is an RLock.
+            if self.try_acquire():
+                return True
+            if self.waiting >= self.queue:
+                self.shed['queue_full'] += 1
+                return False
+            self.waiting += 1
+            deadline = time.monotonic() + self.max_wait
+            try:
+                while self.active >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed['timeout'] += 1
+                        return False
+                    self.condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.active += 1
+            self.admitted += 1
+            return True
+
+    def release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify()
+
+    def stats(self):
+        with self.condition:
+            return {
+                'limit': self.limit, 'active': self.active, 'waiting': self.waiting,
+                'admitted': self.admitted, 'shed': dict(self.shed),
+            }
+
+
+class Lease:
+    """
+    A gate slot held by a streamed response. It is released when the
+    response is closed, or after max_hold seconds, whichever comes first.
+    """
+
+    def __init__(self, gate, max_hold):
+        self.gate = gate
+        self.held = True
+        self.lock = threading.Lock()
+        self.timer = threading.Timer(max_hold, self.release)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def release(self):
+        with self.lock:
+            held, self.held = self.held, False
+        if held:
+            self.timer.cancel()
+            self.gate.release()
+
+
+class TokenBuckets:
+    """Per-client token buckets, keeping the MAX_CLIENTS most recent clients."""
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.limited = 0
+        self.lock = threading.Lock()
+
+    def take(self, client):
+        """
+        Take a token for client. Returns 0 if the request may go ahead, or
+        the number of seconds until the client has a token again.
+        """
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                self.limited += 1
+                wait = (1 - tokens) / self.rate
+            self.buckets[client] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+            return wait
+
+
+gates = {name: Gate(limit, queue, ADMISSION_MAX_WAIT) for name, (limit, queue) in ADMISSION_LIMITS.items()}
+
+buckets = TokenBuckets(CLIENT_RATE, CLIENT_BURST) if CLIENT_RATE else None
+
+
+def admission_stats():
+    return {
+        'gates': {name: gate.stats() for name, gate in gates.items()},
+        'rate_limited': buckets.limited if buckets is not None else 0,
+    }
+
+
+def _retry_after(response, seconds):
+    response['Retry-After'] = str(max(1, math.ceil(seconds)))
+    return response
+
+
+def overloaded(gate):
+    """The response for a request that gate has shed."""
+    return _retry_after(HttpResponse(OVERLOADED_MESSAGE, status=503), gate.max_wait)
+
+
+def gates_itself(request):
+    """Whether the view takes its gate itself, with run_gated()."""
+    if request.path.startswith(SELF_GATED_PATHS):
+        return True
+    if request.path.startswith(BULK_SELF_GATED_PATHS) and request.path.count('/') == 3 and is_bulk(request):
+        return True
+    return request.path.startswith(MULTIPART_SELF_GATED_PATHS) and request.content_type == 'multipart/form-data'
+
+
+def run_gated(name, function, *args):
+    """Return function(*args), run in a slot of the named gate, or a 503 if shed."""
+    gate = gates[name]
+    if not gate.acquire():
+        return overloaded(gate)
+    try:
+        return function(*args)
+    finally:
+        gate.release()
+
+
+class AdmissionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        refused, gate = self.check(request)
+        if refused is not None:
+            return refused
+        if gate is None:
+            return self.get_response(request)
+        if not gate.acquire():
+            return overloaded(gate)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            gate.release()
+            raise
+        return self.hold(gate, response)
+
+    async def __acall__(self, request):
+        refused, gate = self.check(request)
+        if refused is not None:
+            return refused
+        if gate is None:
+            return await self.get_response(request)
+        if not gate.try_acquire() and not await sync_to_async(gate.acquire, thread_sensitive=False)():
+            return overloaded(gate)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            gate.release()
+            raise
+        return self.hold(gate, response)
+
+    def check(self, request):
+        """
+        Return (response, gate): a response that refuses the request, or
+        the gate it must pass, if any.
+        """
+        if request.path in EXEMPT_PATHS:
+            return None, None
+        if buckets is not None:
+            wait = buckets.take(request.META.get('REMOTE_ADDR'))
+            if wait:
+                return _retry_after(HttpResponse(RATE_LIMITED_MESSAGE, status=429), wait), None
+        if gates_itself(request):
+            return None, None
+        return None, gates['write' if request.method in WRITE_METHODS else 'read']
+
+    def hold(self, gate, response):
+        """Release gate's slot now, or when the response is closed."""
+        if response.streaming and getattr(response, 'file_to_stream', None) is None:
+            # Streamed rows are read from the database as they are sent;
+            # files are not, and may take a slow client minutes.
+            response._resource_closers.append(Lease(gate, ADMISSION_MAX_HOLD).release)
+        else:
+            gate.release()
+        return response
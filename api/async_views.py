@@ -0,0 +1,78 @@
+"""
+Async entry points for the views in api/views.py, used when the project is
+served through AudioServe/asgi.py.
+
+Django's ORM is synchronous, so the database work still runs in threads,
+but on a dedicated pool sized to AUDIO_ASYNC_DB_THREADS (the number of
+SQLite connections we are willing to hold) instead of Django's default
+thread_sensitive executor, which runs every request's sync code in one
+thread. Waiting for slow clients happens on the event loop and holds no
+thread. Each pool thread owns its own connection and runs Django's
+request-boundary connection cleanup around every job, which respects
+CONN_MAX_AGE.
+
+This only helps if every middleware in MIDDLEWARE is async capable.
+Django runs a sync-only middleware, and everything inside it, the views
+included, in the same single thread_sensitive thread, so requests run one
+at a time again.
+"""
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import FileResponse
+
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from tempfile import SpooledTemporaryFile
+
+from .metrics import timed_queries
+
+
+DB_THREADS = getattr(settings, 'AUDIO_ASYNC_DB_THREADS', 4)
+
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+db_executor = ThreadPoolExecutor(max_workers=DB_THREADS, thread_name_prefix='audioserve-db')
+
+
+def _run_view(view, request, args, kwargs):
+    close_old_connections()
+    try:
+        # MetricsMiddleware ran on another thread, with other connections;
+        # time the queries made on this one too.
+        timer = getattr(request, 'query_timer', None)
+        with timed_queries(timer) if timer is not None else nullcontext():
+            response = view(request, *args, **kwargs)
+            # A file response reads no rows; it is sent from the file as is.
+            if response.streaming and getattr(response, 'file_to_stream', None) is None:
+                response = _spool(response)
+        return response
+    finally:
+        close_old_connections()
+
+
+def _spool(response):
+    # Django 3.2's ASGI handler iterates streaming responses on the event
+    # loop, where the ORM refuses to run. Drain the iterator here, on the
+    # pool thread, into a temporary file that only stays in memory while it
+    # is small.
+    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    for chunk in response.streaming_content:
+        spool.write(chunk)
+    response.close()
+    spool.seek(0)
+    spooled = FileResponse(spool, status=response.status_code)
+    for header, value in response.items():
+        spooled[header] = value
+    return spooled
+
+
+def as_async_view(view_class):
+    view = view_class.as_view()
+    run = sync_to_async(_run_view, thread_sensitive=False, executor=db_executor)
+
+    async def async_view(request, *args, **kwargs):
+        return await run(view, request, args, kwargs)
+
+    async_view.view_class = view_class
+    return async_view
@@ -0,0 +1,150 @@
+"""
+Generated audio files of known duration, for the tests of api/audio_headers.py
+and api/peaks.py, and for the benchmarks.
+
+Each file has the headers, tags and pages a real encoder would write where
+audio_headers reads them. The audio in between is left as a hole in a
+sparse file, so an hour-long file costs nothing to create.
+"""
+import os
+import random
+import struct
+
+
+MP3_CBR_FRAME = 0xFFFB9000  # MPEG-1 layer III, 128 kbit/s, 44.1 kHz, stereo
+
+MP3_MPEG2_MONO_FRAME = 0xFFF380C0  # MPEG-2 layer III, 64 kbit/s, 22.05 kHz, mono
+
+KINDS = ('wav', 'wav-8bit', 'mp3-cbr', 'mp3-mpeg2', 'mp3-xing', 'mp3-vbri', 'ogg-vorbis', 'ogg-opus')
+
+EXTENSIONS = {'wav': '.wav', 'mp3': '.mp3', 'ogg': '.ogg'}
+
+
+def _sparse(path, head, size, tail=b''):
+    with open(path, 'wb') as f:
+        f.write(head)
+        f.truncate(max(size, len(head) + len(tail)))
+        if tail:
+            f.seek(-len(tail), os.SEEK_END)
+            f.write(tail)
+
+
+def wav_header(data, sample_rate=44100, channels=2, bits=16, audio_format=1):
+    """The headers of a WAV file with data bytes of audio after them."""
+    block_align = channels * bits // 8
+    fmt = struct.pack('<HHIIHH', audio_format, channels, sample_rate, sample_rate * block_align, block_align, bits)
+    # An odd-sized LIST chunk before the data, as tagging tools write.
+    info = b'INFOISFT\x07\x00\x00\x00corpus\x00'
+    chunks = (
+        b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        + b'LIST' + struct.pack('<I', len(info)) + info + b'\x00'
+        + b'data' + struct.pack('<I', data)
+    )
+    return b'RIFF' + struct.pack('<I', 4 + len(chunks) + data) + b'WAVE' + chunks
+
+
+def write_wav(path, seconds, sample_rate=44100, channels=2, bits=16):
+    data = int(seconds * sample_rate * channels * bits // 8)
+    head = wav_header(data, sample_rate, channels, bits)
+    _sparse(path, head, len(head) + data)
+
+
+def _id3(size=2048):
+    body = size - 10
+    syncsafe = bytes([body >> 21 & 0x7F, body >> 14 & 0x7F, body >> 7 & 0x7F, body & 0x7F])
+    return (b'ID3\x04\x00\x00' + syncsafe).ljust(size, b'\x00')
+
+
+def write_mp3(path, seconds, tag=None, header=MP3_CBR_FRAME, id3=True):
+    """
+    Write an MP3 file of constant bitrate, or with a 'Xing' or 'VBRI'
+    tag in its first frame that gives its frame count.
+    """
+    mpeg1 = header >> 19 & 3 == 3
+    bitrate, sample_rate = (128000, 44100) if mpeg1 else (64000, 22050)
+    samples = 1152 if mpeg1 else 576
+    mono = header >> 6 & 3 == 3
+    frames = round(seconds * sample_rate / samples)
+    frame = struct.pack('>I', header)
+    if tag == 'Xing':
+        side_info = (17 if mono else 32) if mpeg1 else (9 if mono else 17)
+        frame += bytes(side_info) + b'Xing' + struct.pack('>II', 1, frames)
+    elif tag == 'VBRI':
+        frame += bytes(32) + b'VBRI' + struct.pack('>HHHII', 1, 0, 75, 0, frames)
+    head = (_id3() if id3 else b'') + frame
+    audio = int(seconds * bitrate / 8)
+    tail = b'TAG' + bytes(125)
+    _sparse(path, head, len(head) - len(frame) + audio + len(tail), tail)
+
+
+def _ogg_crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 24
+        for _ in range(8):
+            crc = (crc << 1) ^ 0x04C11DB7 if crc & 0x80000000 else crc << 1
+        table.append(crc & 0xFFFFFFFF)
+    return table
+
+
+OGG_CRC_TABLE = _ogg_crc_table()
+
+
+def ogg_page(packet, granule, serial, sequence, header_type=0):
+    lacing = [255] * (len(packet) // 255) + [len(packet) % 255]
+    header = struct.pack('<4sBBqIIIB', b'OggS', 0, header_type, granule, serial, sequence, 0, len(lacing))
+    page = bytearray(header + bytes(lacing) + packet)
+    crc = 0
+    for byte in page:
+        crc = (crc << 8 & 0xFFFFFFFF) ^ OGG_CRC_TABLE[crc >> 24 ^ byte]
+    page[22:26] = struct.pack('<I', crc)
+    return bytes(page)
+
+
+def write_ogg(path, seconds, codec='vorbis', serial=0x5EED):
+    if codec == 'opus':
+        sample_rate, pre_skip = 48000, 312
+        packet = b'OpusHead' + struct.pack('<BBHIhB', 1, 2, pre_skip, 44100, 0, 0)
+    else:
+        sample_rate, pre_skip = 44100, 0
+        packet = b'\x01vorbis' + struct.pack('<IBIiiiBB', 0, 2, sample_rate, 0, 128000, 0, 0xB8, 1)
+    head = ogg_page(packet, 0, serial, 0, header_type=2)
+    last = ogg_page(bytes(100), int(seconds * sample_rate) + pre_skip, serial, 2, header_type=4)
+    _sparse(path, head, int(seconds * 16000), last)
+
+
+def write_audio(path, kind, seconds):
+    if kind == 'wav':
+        write_wav(path, seconds)
+    elif kind == 'wav-8bit':
+        write_wav(path, seconds, sample_rate=8000, channels=1, bits=8)
+    elif kind == 'mp3-cbr':
+        write_mp3(path, seconds)
+    elif kind == 'mp3-mpeg2':
+        write_mp3(path, seconds, header=MP3_MPEG2_MONO_FRAME, id3=False)
+    elif kind == 'mp3-xing':
+        write_mp3(path, seconds, tag='Xing')
+    elif kind == 'mp3-vbri':
+        write_mp3(path, seconds, tag='VBRI', id3=False)
+    elif kind == 'ogg-vorbis':
+        write_ogg(path, seconds)
+    elif kind == 'ogg-opus':
+        write_ogg(path, seconds, codec='opus')
+    else:
+        raise ValueError('Unknown kind: %r.' % kind)
+
+
+def generate_corpus(directory, count, max_seconds=3600, seed=0):
+    """
+    Write count files to directory, cycling through KINDS, with random
+    whole-second durations. Returns [(path, kind, seconds)].
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        kind = KINDS[i % len(KINDS)]
+        seconds = rng.randint(1, max_seconds)
+        path = os.path.join(directory, '%05d%s' % (i, EXTENSIONS[kind.split('-')[0]]))
+        write_audio(path, kind, seconds)
+        corpus.append((path, kind, seconds))
+    return corpus
@@ -0,0 +1,235 @@
+"""
+Audio duration from container headers, without decoding any audio.
+
+audio_duration() recognises the format by its first bytes and reads only
+what the format needs to state its length:
+
+- WAV: the RIFF chunk headers up to the data chunk, and the fmt (and, for
+  compressed data, fact) chunk. Duration is data bytes / byte rate.
+- MP3: the first frame header, after any ID3v2 tag. A Xing/Info or VBRI
+  tag in that frame gives the frame count; without one the file is taken
+  to be constant bitrate, and its size gives the duration.
+- Ogg Vorbis and Opus: the identification header on the first page for
+  the sample rate, and the granule position of the last page, found in
+  the last OGG_TAIL_SIZE bytes.
+
+Every read is bounded, so the cost does not depend on the file's length.
+This module only uses the standard library, so that the worker processes
+of api/probe.py can import it without setting up Django.
+"""
+import os
+import struct
+
+
+HEAD_SIZE = 16 * 1024
+
+OGG_TAIL_SIZE = 64 * 1024
+
+MAX_WAV_CHUNKS = 64
+
+WAV_PCM_FORMATS = (1, 3, 0xFFFE)
+
+MPEG_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+
+MPEG_LAYERS = {1: 3, 2: 2, 3: 1}
+
+# Kilobits per second by (version 1 or not, layer), for bitrate indexes 1-14.
+MPEG_BITRATES = {
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+MPEG_SAMPLE_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 2.5: (11025, 12000, 8000)}
+
+OPUS_SAMPLE_RATE = 48000
+
+
+def audio_duration(path):
+    """
+    Return the duration of the audio file at path in seconds, as a float.
+    Raises ValueError if the format is not recognised or the headers are
+    inconsistent.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(HEAD_SIZE)
+        try:
+            if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+                return wav_duration(f, size)
+            if head[:4] == b'OggS':
+                return ogg_duration(f, size, head)
+            if head[:3] == b'ID3' or mpeg_frame(head, 0) is not None:
+                return mp3_duration(f, size, head)
+        except (struct.error, IndexError):
+            raise ValueError('Truncated audio headers.')
+    raise ValueError('Unrecognised audio format.')
+
+
+def safe_duration(path):
+    """audio_duration(), or None if the file cannot be read or parsed."""
+    try:
+        return audio_duration(path)
+    except (OSError, ValueError):
+        return None
+
+
+def wav_layout(f, size):
+    """
+    Walk the chunks of a WAV file. Returns (fmt, samples, offset, length):
+    the fields of its fmt chunk (format, channels, sample rate, byte rate,
+    block align, bits per sample), the sample count of its fact chunk or
+    None, and where its audio data starts and how many bytes it has.
+    Raises ValueError if the chunks are missing or truncated.
+    """
+    f.seek(12)
+    fmt = samples = None
+    for _ in range(MAX_WAV_CHUNKS):
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk, length = struct.unpack('<4sI', header)
+        if chunk == b'fmt ':
+            body = f.read(16)
+            if length < 16 or len(body) < 16:
+                raise ValueError('Truncated WAV fmt chunk.')
+            fmt = struct.unpack('<HHIIHH', body)
+            length -= 16
+        elif chunk == b'fact' and length >= 4:
+            body = f.read(4)
+            if len(body) < 4:
+                raise ValueError('Truncated WAV fact chunk.')
+            samples, = struct.unpack('<I', body)
+            length -= 4
+        elif chunk == b'data':
+            if fmt is None:
+                break
+            offset = f.tell()
+            # Streaming writers leave the size at 0 or 0xFFFFFFFF.
+            data = size - offset
+            if 0 < length < data:
+                data = length
+            return fmt, samples, offset, data
+        f.seek(length + (length & 1), os.SEEK_CUR)
+    raise ValueError('No fmt and data chunks in WAV file.')
+
+
+def wav_duration(f, size):
+    fmt, samples, _, data = wav_layout(f, size)
+    audio_format, _, sample_rate, byte_rate, _, _ = fmt
+    if audio_format not in WAV_PCM_FORMATS and samples is not None and sample_rate:
+        return samples / sample_rate
+    if not byte_rate:
+        raise ValueError('Invalid WAV byte rate.')
+    return data / byte_rate
+
+
+def mpeg_frame(data, offset):
+    """
+    Parse the MPEG audio frame header at offset. Returns (version, layer,
+    bitrate in bit/s, sample rate, samples per frame, frame length, mono),
+    or None if there is no valid header there.
+    """
+    if offset + 4 > len(data):
+        return None
+    header, = struct.unpack_from('>I', data, offset)
+    if header >> 21 != 0x7FF:
+        return None
+    version = MPEG_VERSIONS.get(header >> 19 & 3)
+    layer = MPEG_LAYERS.get(header >> 17 & 3)
+    bitrate_index = header >> 12 & 15
+    rate_index = header >> 10 & 3
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = MPEG_BITRATES[version == 1, layer][bitrate_index - 1] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = header >> 9 & 1
+    mono = header >> 6 & 3 == 3
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == 1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return version, layer, bitrate, sample_rate, samples, length, mono
+
+
+def mp3_duration(f, size, head):
+    base = 0
+    if head[:3] == b'ID3':
+        # ID3v2: a 10 byte header with a syncsafe size, and maybe a footer.
+        base = 10 + (head[6] << 21 | head[7] << 14 | head[8] << 7 | head[9])
+        if head[5] & 0x10:
+            base += 10
+        f.seek(base)
+        head = f.read(HEAD_SIZE)
+    offset, frame = _first_frame(head)
+    version, layer, bitrate, sample_rate, samples, length, mono = frame
+
+    # A Xing/Info tag sits after the side information, a VBRI tag 32 bytes in.
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if head[xing:xing + 4] in (b'Xing', b'Info') and len(head) >= xing + 12:
+        flags, frames = struct.unpack_from('>II', head, xing + 4)
+        if flags & 1 and frames:
+            return frames * samples / sample_rate
+    vbri = offset + 36
+    if head[vbri:vbri + 4] == b'VBRI' and len(head) >= vbri + 18:
+        frames, = struct.unpack_from('>I', head, vbri + 14)
+        if frames:
+            return frames * samples / sample_rate
+
+    audio = size - base - offset
+    if size >= 128:
+        f.seek(size - 128)
+        if f.read(3) == b'TAG':
+            audio -= 128
+    return max(audio, 0) * 8 / bitrate
+
+
+def _first_frame(head):
+    # A frame right where the audio starts is trusted. Further in, a sync
+    # pattern only counts if the next frame follows it.
+    frame = mpeg_frame(head, 0)
+    if frame is not None:
+        return 0, frame
+    offset = head.find(b'\xff')
+    while offset != -1:
+        frame = mpeg_frame(head, offset)
+        if frame is not None:
+            following = mpeg_frame(head, offset + frame[5])
+            if following is not None and following[:2] == frame[:2] and following[3] == frame[3]:
+                return offset, frame
+        offset = head.find(b'\xff', offset + 1)
+    raise ValueError('No MPEG audio frame found.')
+
+
+def ogg_duration(f, size, head):
+    serial, = struct.unpack_from('<I', head, 14)
+    segments = head[26]
+    packet = head[27 + segments:]
+    if packet[:7] == b'\x01vorbis':
+        sample_rate, = struct.unpack_from('<I', packet, 12)
+        pre_skip = 0
+    elif packet[:8] == b'OpusHead':
+        pre_skip, = struct.unpack_from('<H', packet, 10)
+        sample_rate = OPUS_SAMPLE_RATE
+    else:
+        raise ValueError('Unsupported Ogg codec.')
+    if not sample_rate:
+        raise ValueError('Invalid Ogg sample rate.')
+
+    tail_start = max(0, size - OGG_TAIL_SIZE)
+    f.seek(tail_start)
+    tail = f.read(OGG_TAIL_SIZE)
+    page = tail.rfind(b'OggS')
+    while page != -1:
+        if page + 27 <= len(tail) and tail[page + 4] == 0:
+            granule, page_serial = struct.unpack_from('<qI', tail, page + 6)
+            if page_serial == serial and granule >= 0:
+                return max(granule - pre_skip, 0) / sample_rate
+        page = tail.rfind(b'OggS', 0, page)
+    raise ValueError('No Ogg page with a granule position found.')
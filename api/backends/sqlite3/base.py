@@ -0,0 +1,37 @@
+"""
+SQLite backend for the production database profile in AudioServe/settings.py.
+
+Two extra keys are read from the DATABASES entry:
+
+PRAGMAS
+    A dict of PRAGMA statements run on every new connection, e.g.
+    {'journal_mode': 'WAL', 'busy_timeout': 5000}.
+TRANSACTION_MODE
+    'DEFERRED' (SQLite's default), 'IMMEDIATE' or 'EXCLUSIVE'. The writer
+    uses IMMEDIATE so that a transaction takes the write lock when it
+    begins and waits for it under busy_timeout, instead of failing with
+    "database is locked" when a read inside it is later upgraded to a write.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, settings_dict, alias=DEFAULT_DB_ALIAS):
+        super().__init__(settings_dict, alias)
+        self.transaction_mode = settings_dict.get('TRANSACTION_MODE', 'DEFERRED').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ImproperlyConfigured('TRANSACTION_MODE must be one of %s.' % ', '.join(TRANSACTION_MODES))
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.settings_dict.get('PRAGMAS', {}).items():
+            conn.execute('PRAGMA %s = %s' % (name, value))
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN %s' % self.transaction_mode)
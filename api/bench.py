@@ -0,0 +1,213 @@
+"""
+Benchmark suite behind `manage.py bench`.
+
+seed() fills the three audio tables, and run_benchmarks() sends every route
+in api/urls.py through Django's test client, so each request goes through
+the URL resolver, the middleware and the view exactly as under WSGI. Each
+endpoint is timed request by request. The result is a JSON-ready dict that
+compare() checks against a saved baseline.
+"""
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.test import Client, override_settings
+
+import json
+import os
+import random
+import tempfile
+import time
+
+from .audio_corpus import wav_header
+from .models import Audiobook, Podcast, Song
+from .pagination import encode_cursor
+from .peaks import write_peaks
+
+
+SEED_BATCH_SIZE = 5000
+
+PARTICIPANTS = ['adam', 'bob', 'carl', 'dennis', 'erin', 'fay', 'gus', 'hal']
+
+WORDS = ['blue', 'moon', 'river', 'night', 'city', 'song', 'dream', 'fire', 'rain', 'road']
+
+AUDIO_FILE_SIZE = 1024 * 1024
+
+RANGE_SIZE = 64 * 1024
+
+
+def _title(rng):
+    return '%s %s' % (rng.choice(WORDS), rng.choice(WORDS))
+
+
+def seed(rows, seed=0):
+    """Insert rows items of every type. Returns {audioType: [ids]}."""
+    rng = random.Random(seed)
+    builders = {
+        Song: lambda: Song(name=_title(rng), duration=rng.randint(30, 600)),
+        Podcast: lambda: Podcast(
+            name=_title(rng), duration=rng.randint(600, 7200), host=rng.choice(PARTICIPANTS),
+            participants=json.dumps(rng.sample(PARTICIPANTS, 3)),
+        ),
+        Audiobook: lambda: Audiobook(
+            title=_title(rng), author=rng.choice(PARTICIPANTS), narrator=rng.choice(PARTICIPANTS),
+            duration=rng.randint(3600, 72000),
+        ),
+    }
+    for model, build in builders.items():
+        for start in range(0, rows, SEED_BATCH_SIZE):
+            with transaction.atomic():
+                model.objects.bulk_create([build() for _ in range(min(SEED_BATCH_SIZE, rows - start))])
+    return {
+        model._meta.model_name: list(model.objects.order_by('id').values_list('id', flat=True))
+        for model in builders
+    }
+
+
+def _endpoints(ids, rng):
+    """
+    Return [(name, request)] in the order they run. Each request is a
+    callable taking the client and the iteration number. Reads come before
+    writes, and deletes come last, working down from the highest ids. The
+    file uploads go to the lowest song ids, for the range and peaks reads
+    after them.
+    """
+    songs, podcasts, audiobooks = ids['song'], ids['podcast'], ids['audiobook']
+    cursors = [
+        encode_cursor([uploaded_time.isoformat(), pk])
+        for uploaded_time, pk in Song.objects.filter(id__in=rng.sample(songs, min(len(songs), 1000)))
+        .values_list('uploaded_time', 'id')
+    ]
+
+    def get(path, params=None):
+        return lambda client, i: client.get(path, params() if callable(params) else params)
+
+    def post_json(path, body):
+        return lambda client, i: client.post(path, json.dumps(body(i)), content_type='application/json')
+
+    bulk_songs = [{'name': 'bulk song', 'duration': 100}] * 100
+    audio = wav_header(AUDIO_FILE_SIZE) + bytes(rng.getrandbits(8) for _ in range(4096)) * (AUDIO_FILE_SIZE // 4096)
+
+    def range_header():
+        start = rng.randrange(len(audio) - RANGE_SIZE)
+        return 'bytes=%d-%d' % (start, start + RANGE_SIZE - 1)
+
+    def peaks(client, i):
+        if not i:
+            # Peaks are written offline, by generate_peaks; do it for the
+            # first uploaded file before its first request.
+            write_peaks(Song.objects.get(id=songs[0]).audio_file.path)
+        return client.get('/peaks/song/%d/' % songs[0], {'resolution': 1024})
+    return [
+        ('read song', lambda client, i: client.get('/read/song/%d/' % rng.choice(songs))),
+        ('read podcast', lambda client, i: client.get('/read/podcast/%d/' % rng.choice(podcasts))),
+        ('read audiobook', lambda client, i: client.get('/read/audiobook/%d/' % rng.choice(audiobooks))),
+        ('list song page', get('/read/song/', lambda: {'limit': 50, 'after': rng.choice(cursors)})),
+        ('list song filtered', get('/read/song/', lambda: {
+            'min_duration': rng.randint(30, 500), 'order_by': '-duration', 'limit': 50,
+        })),
+        ('list podcast by participant', get('/read/podcast/', lambda: {
+            'participant': rng.choice(PARTICIPANTS), 'limit': 50,
+        })),
+        ('list audiobook by author', get('/read/audiobook/', lambda: {
+            'author': rng.choice(PARTICIPANTS), 'limit': 50,
+        })),
+        ('stream song', get('/read/song/', lambda: {'stream': 'ndjson', 'max_duration': rng.randint(30, 40)})),
+        ('feed', get('/read/all/', {'limit': 50})),
+        ('search', get('/search/', lambda: {'q': rng.choice(WORDS)[:3], 'limit': 20})),
+        ('stats', get('/stats/')),
+        ('cache stats', get('/cache/stats/')),
+        ('metrics', get('/metrics/')),
+        ('create song', lambda client, i: client.post('/create/song/', {'name': 'new song', 'duration': 100})),
+        ('create podcast', lambda client, i: client.post('/create/podcast/', {
+            'name': 'new podcast', 'duration': 1000, 'host': 'host', 'participants': 'adam, bob',
+        })),
+        ('create audiobook', lambda client, i: client.post('/create/audiobook/', {
+            'title': 'new book', 'author': 'author', 'narrator': 'narrator', 'duration': 10000,
+        })),
+        ('bulk create song x100', post_json('/create/song/', lambda i: bulk_songs)),
+        ('update song', lambda client, i: client.post('/update/song/%d/' % rng.choice(songs), {'duration': 200})),
+        ('update podcast', lambda client, i: client.post(
+            '/update/podcast/%d/' % rng.choice(podcasts), {'participants': 'carl, dennis'},
+        )),
+        ('update audiobook', lambda client, i: client.post(
+            '/update/audiobook/%d/' % rng.choice(audiobooks), {'narrator': 'erin'},
+        )),
+        ('bulk update song x10', post_json('/update/song/', lambda i: [
+            {'id': pk, 'duration': 300} for pk in rng.sample(songs, min(len(songs), 10))
+        ])),
+        ('upload song 1MB', lambda client, i: client.post('/upload/song/%d/' % songs[i], {
+            'file': SimpleUploadedFile('song.wav', audio, 'audio/wav'),
+        })),
+        ('stream song range 64KB', lambda client, i: client.get(
+            '/stream/song/%d/' % songs[i], HTTP_RANGE=range_header(),
+        )),
+        ('peaks song', peaks),
+        ('delete song', lambda client, i: client.post('/delete/song/%d/' % songs.pop())),
+        ('delete podcast', lambda client, i: client.post('/delete/podcast/%d/' % podcasts.pop())),
+        ('delete audiobook', lambda client, i: client.post('/delete/audiobook/%d/' % audiobooks.pop())),
+        ('bulk delete song x10', post_json('/delete/song/', lambda i: [songs.pop() for _ in range(10)])),
+    ]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_benchmarks(ids, requests, seed=0):
+    """
+    Time requests requests to every endpoint. ids is what seed() returned;
+    the delete endpoints consume ids from the end of its lists, so each needs
+    requests * 11 song ids and requests podcast and audiobook ids to spare.
+    Returns {name: {requests, errors, throughput, p50_ms, p95_ms, p99_ms}}.
+    """
+    rng = random.Random(seed)
+    ids = {audioType: list(pks) for audioType, pks in ids.items()}
+    client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+    results = {}
+    with tempfile.TemporaryDirectory() as media, override_settings(
+        MEDIA_ROOT=media, FILE_UPLOAD_TEMP_DIR=os.path.join(media, '.uploads'),
+    ):
+        for name, request in _endpoints(ids, rng):
+            results[name] = _time_endpoint(client, request, requests)
+    return results
+
+
+def _time_endpoint(client, request, requests):
+    latencies = []
+    errors = 0
+    for i in range(requests):
+        started = time.perf_counter()
+        response = request(client, i)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code not in (200, 206):
+            errors += 1
+    return {
+        'requests': requests,
+        'errors': errors,
+        'throughput': requests / sum(latencies),
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Return a list of (endpoint, metric, baseline value, new value) for every
+    endpoint whose p95 latency grew, or whose throughput fell, by more than
+    threshold (a fraction) against the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result['p95_ms'] > before['p95_ms'] * (1 + threshold):
+            regressions.append((name, 'p95_ms', before['p95_ms'], result['p95_ms']))
+        if result['throughput'] < before['throughput'] * (1 - threshold):
+            regressions.append((name, 'throughput', before['throughput'], result['throughput']))
+    return regressions
@@ -0,0 +1,200 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import MaxLengthValidator
+from django.utils import timezone
+
+import json
+
+from .models import Podcast
+from .validators import validate_participants
+
+
+BULK_BATCH_SIZE = getattr(settings, 'AUDIO_BULK_BATCH_SIZE', 500)
+
+BULK_MAX_BYTES = getattr(settings, 'AUDIO_BULK_MAX_BYTES', 16 * 1024 * 1024)
+
+BULK_CONTENT_TYPES = ('application/json', 'application/x-ndjson')
+
+CREATE_FIELDS = {
+    'song': ['name', 'duration'],
+    'podcast': ['name', 'host', 'participants', 'duration'],
+    'audiobook': ['title', 'author', 'narrator', 'duration'],
+}
+
+validate_participants_length = MaxLengthValidator(Podcast._meta.get_field('participants').max_length)
+
+
+def is_id(value):
+    """Whether a decoded JSON value is an integer id. JSON true and false are not."""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_bulk(request):
+    return request.content_type in BULK_CONTENT_TYPES
+
+
+class BodyTooLarge(ValueError):
+    pass
+
+
+def parse_items(request):
+    """
+    Read a JSON array or NDJSON request body into a list of items. The body
+    is read from the request stream, so bulk requests are not subject to
+    DATA_UPLOAD_MAX_MEMORY_SIZE, but to BULK_MAX_BYTES instead. Raises
+    BodyTooLarge for a longer body, without reading more than that, and
+    ValueError on malformed input.
+    """
+    try:
+        length = int(request.META.get('CONTENT_LENGTH') or 0)
+    except ValueError:
+        length = 0
+    if length > BULK_MAX_BYTES:
+        raise BodyTooLarge('Body over %d bytes.' % BULK_MAX_BYTES)
+    # The length header may be missing; never read past the limit.
+    body = request.read(BULK_MAX_BYTES + 1)
+    if len(body) > BULK_MAX_BYTES:
+        raise BodyTooLarge('Body over %d bytes.' % BULK_MAX_BYTES)
+    if request.content_type == 'application/x-ndjson':
+        items = [json.loads(line) for line in body.splitlines() if line.strip()]
+    else:
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError('Expected a JSON array.')
+    return items
+
+
+def parse_participants(participants):
+    """
+    Turn a participants list or comma separated string into the stored JSON
+    text. The list is validated before it is encoded, so callers can leave
+    participants out of full_clean() and never decode it again.
+    """
+    if isinstance(participants, str):
+        participants = [p.strip() for p in participants.split(',')]
+    try:
+        validate_participants(participants)
+        value = json.dumps(participants)
+        validate_participants_length(value)
+    except ValidationError as e:
+        raise ValidationError({'participants': e.messages})
+    return value
+
+
+def build_items(model, audioType, items):
+    """
+    Validate every item and return (instances, errors). Items take the same
+    fields as the single create form; errors are reported per item index.
+    """
+    fields = set(CREATE_FIELDS[audioType])
+    instances = []
+    errors = []
+    for index, data in enumerate(items):
+        try:
+            if not isinstance(data, dict) or set(data) != fields:
+                raise ValidationError('Expected fields: %s.' % ', '.join(sorted(fields)))
+            data = dict(data)
+            exclude = []
+            if 'participants' in data:
+                data['participants'] = parse_participants(data['participants'])
+                exclude.append('participants')
+            item = model(**data)
+            item.full_clean(exclude=exclude)
+        except ValidationError as e:
+            errors.append({'index': index, 'errors': _error_dict(e)})
+            continue
+        instances.append(item)
+    return instances, errors
+
+
+def clean_fields(model, data):
+    """
+    Validate only the given fields with the model field validators and
+    return their cleaned values.
+    """
+    cleaned = {}
+    errors = {}
+    for name, value in data.items():
+        field = model._meta.get_field(name)
+        try:
+            if name == 'participants':
+                cleaned[name] = parse_participants(value)
+            else:
+                cleaned[name] = field.clean(value, None)
+        except ValidationError as e:
+            errors[name] = e.messages
+    if errors:
+        raise ValidationError(errors)
+    return cleaned
+
+
+def build_updates(model, audioType, items):
+    """
+    Validate a list of {id, fields...} items and return ({id: changes},
+    errors). Later items for the same id override earlier ones.
+    """
+    fields = set(CREATE_FIELDS[audioType])
+    changes = {}
+    errors = []
+    for index, data in enumerate(items):
+        try:
+            if not isinstance(data, dict) or not is_id(data.get('id')):
+                raise ValidationError('Expected an object with an integer id.')
+            data = dict(data)
+            pk = data.pop('id')
+            if not data or not set(data) <= fields:
+                raise ValidationError('Allowed fields: %s.' % ', '.join(sorted(fields)))
+            cleaned = clean_fields(model, data)
+        except ValidationError as e:
+            errors.append({'index': index, 'errors': _error_dict(e)})
+            continue
+        changes.setdefault(pk, {}).update(cleaned)
+    return changes, errors
+
+
+def update_items(model, changes):
+    """
+    Apply {id: changes} with one SELECT and one CASE/WHEN UPDATE per batch
+    and per distinct set of changed fields. Returns the ids that matched.
+    Must be called inside a transaction.
+    """
+    matched = _matching_ids(model, list(changes))
+    now = timezone.now()
+    groups = {}
+    for pk in matched:
+        fields = tuple(sorted(changes[pk])) + ('updated_time',)
+        groups.setdefault(fields, []).append(model(id=pk, updated_time=now, **changes[pk]))
+    for fields, objs in groups.items():
+        model.objects.bulk_update(objs, fields, batch_size=BULK_BATCH_SIZE)
+    return matched
+
+
+def delete_ids(model, ids):
+    """
+    Delete the given ids with one SELECT and one DELETE per batch. Returns
+    the ids that matched and the names of their stored audio files, for
+    api.files.delete_files(). Must be called inside a transaction.
+    """
+    rows = []
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        batch = ids[start:start + BULK_BATCH_SIZE]
+        rows += model.objects.filter(id__in=batch).values_list('id', 'audio_file')
+    rows.sort()
+    matched = [pk for pk, _ in rows]
+    for start in range(0, len(matched), BULK_BATCH_SIZE):
+        model.objects.filter(id__in=matched[start:start + BULK_BATCH_SIZE]).delete()
+    return matched, [name for _, name in rows if name]
+
+
+def _matching_ids(model, ids):
+    matched = []
+    for start in range(0, len(ids), BULK_BATCH_SIZE):
+        batch = ids[start:start + BULK_BATCH_SIZE]
+        matched += model.objects.filter(id__in=batch).values_list('id', flat=True)
+    return sorted(matched)
+
+
+def _error_dict(error):
+    if hasattr(error, 'error_dict'):
+        return error.message_dict
+    return {'__all__': error.messages}
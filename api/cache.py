@@ -0,0 +1,140 @@
+"""
+Read-through cache for ReadView responses.
+
+Single-item responses are keyed by the item's version and list responses by
+the version of their audio type, both along with the query string, so that
+each ?fields= subset is cached on its own. Writes never delete cached responses; they
+move the versions on so that stale entries are no longer looked up and age
+out through LRU eviction. A read that races with a write can only store its
+result under a version that has already been replaced.
+
+Versions are moved on by post_save for saves made through the ORM, and
+explicitly by the bulk and delete paths in api/views.py, which do not send
+model signals.
+
+The versions live in the cache itself, so only a cache that every worker
+process shares sees every write. LocMemLRUCache is per process: with more
+than one worker, the others would keep serving what they cached before a
+write. Use it with a single process only; AudioServe/settings.py defaults
+to FileBasedLRUCache under the production profile.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+
+import hashlib
+import os
+import threading
+import time
+
+
+CACHE_ALIAS = getattr(settings, 'AUDIO_CACHE_ALIAS', 'default')
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+
+def _count(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+class LocMemLRUCache(LocMemCache):
+    """
+    LocMemCache already keeps its entries in LRU order; this evicts one entry
+    at a time instead of culling a fraction of the cache, and counts it.
+    """
+    def _cull(self):
+        key, _ = self._cache.popitem()
+        del self._expire_info[key]
+        _count('evictions')
+
+
+class FileBasedLRUCache(FileBasedCache):
+    """
+    FileBasedCache that refreshes a file's mtime on every hit and culls the
+    least recently used files, instead of a random sample.
+    """
+    def get(self, key, default=None, version=None):
+        value = super().get(key, self, version)
+        if value is self:
+            return default
+        try:
+            os.utime(self._key_to_file(key, version))
+        except OSError:
+            pass
+        return value
+
+    def _cull(self):
+        filelist = self._list_cache_files()
+        num_entries = len(filelist)
+        if num_entries < self._max_entries:
+            return
+        if self._cull_frequency == 0:
+            _count('evictions', num_entries)
+            return self.clear()
+        filelist.sort(key=_mtime)
+        for fname in filelist[:max(1, num_entries // self._cull_frequency)]:
+            if self._delete(fname):
+                _count('evictions')
+
+
+def _mtime(fname):
+    try:
+        return os.path.getmtime(fname)
+    except OSError:
+        return 0
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _version(key):
+    cache = get_cache()
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def _item_version_key(audioType, audioFileID):
+    return 'audio:%s:%d:version' % (audioType, audioFileID)
+
+
+def _list_version_key(audioType):
+    return 'audio:%s:version' % audioType
+
+
+def response_key(audioType, audioFileID, query):
+    query = hashlib.md5(query.encode()).hexdigest()
+    if audioFileID is not None:
+        version = _version(_item_version_key(audioType, audioFileID))
+        return 'audio:%s:%d:%d:%s' % (audioType, audioFileID, version, query)
+    version = _version(_list_version_key(audioType))
+    return 'audio:%s:list:%d:%s' % (audioType, version, query)
+
+
+def get_response(key):
+    content = get_cache().get(key)
+    _count('misses' if content is None else 'hits')
+    return content
+
+
+def set_response(key, content):
+    get_cache().set(key, content)
+
+
+def invalidate(audioType, ids=()):
+    cache = get_cache()
+    version = time.time_ns()
+    cache.set_many({_item_version_key(audioType, pk): version for pk in ids}, timeout=None)
+    cache.set(_list_version_key(audioType), version, timeout=None)
@@ -0,0 +1,12 @@
+from .cache import invalidate
+from .models import AudioVersion
+
+
+def audio_changed(audioType, ids=()):
+    """
+    Record a write to the given audio type: move its change version on for
+    conditional GETs and invalidate the cached responses. Call it once the
+    rows are written, so a version is never published ahead of its data.
+    """
+    AudioVersion.bump(audioType)
+    invalidate(audioType, ids)
@@ -0,0 +1,170 @@
+"""
+Content-negotiated response compression.
+
+CompressionMiddleware picks the best coding the client accepts from zstd
+and br (only when the zstandard or brotli package is installed) and gzip.
+Responses smaller than AUDIO_COMPRESSION_MIN_SIZE go out as they are.
+Streamed responses are always compressed, one chunk at a time, with a
+flush after every chunk, so the body is never buffered and an NDJSON
+client can still parse rows as they arrive.
+
+Compressible responses always get "Vary: Accept-Encoding", so that a
+shared cache keeps the compressed and identity copies apart. A strong
+ETag is weakened when the body is compressed, like Django's
+GZipMiddleware does, because the bytes are no longer the same.
+
+Under ASGI the middleware runs as a coroutine. Whole bodies are compressed
+on a thread of the event loop's default executor, so that they do not hold
+up the loop; streamed chunks are compressed as the server sends them.
+"""
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from asgiref.sync import sync_to_async
+
+import asyncio
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSION_MIN_SIZE = getattr(settings, 'AUDIO_COMPRESSION_MIN_SIZE', 1024)
+
+COMPRESSION_LEVELS = dict({'zstd': 3, 'br': 4, 'gzip': 6}, **getattr(settings, 'AUDIO_COMPRESSION_LEVELS', {}))
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/')
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        # wbits 31: a deflate stream with a gzip header and trailer.
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+# In order of preference when the client accepts several equally.
+COMPRESSORS = {'gzip': GzipCompressor}
+if brotli is not None:
+    COMPRESSORS = dict({'br': BrotliCompressor}, **COMPRESSORS)
+if zstandard is not None:
+    COMPRESSORS = dict({'zstd': ZstdCompressor}, **COMPRESSORS)
+
+
+def choose_encoding(accept_encoding):
+    """
+    Return the coding in COMPRESSORS with the highest q-value in an
+    Accept-Encoding header, or None if the client accepts none of them.
+    """
+    qualities = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                continue
+        if coding:
+            qualities[coding] = quality
+    best, best_quality = None, 0
+    for coding in COMPRESSORS:
+        quality = qualities.get(coding, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress_stream(chunks, compressor):
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if response.streaming or len(response.content) < COMPRESSION_MIN_SIZE:
+            # Nothing to compress yet: streamed chunks are compressed as the
+            # server sends them.
+            return self.compress(request, response)
+        return await sync_to_async(self.compress, thread_sensitive=False)(request, response)
+
+    def compress(self, request, response):
+        if response.status_code != 200 or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if not response.streaming and len(response.content) < COMPRESSION_MIN_SIZE:
+            return response
+        encoding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        compressor = COMPRESSORS[encoding](COMPRESSION_LEVELS[encoding])
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, compressor)
+            del response['Content-Length']
+        else:
+            content = compressor.compress(response.content) + compressor.finish()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response['Content-Length'] = str(len(content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,43 @@
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from calendar import timegm
+
+from .models import AudioVersion
+
+
+def get_validators(model, audioFileID):
+    """
+    Return (etag, last_modified) for a read, or (None, None) if there is
+    nothing to validate against. Lists are tagged with the change version of
+    their audio type and single items with their own updated_time, so
+    either costs one indexed lookup and no serialization.
+    """
+    audioType = model._meta.model_name
+    if audioFileID is None:
+        row = AudioVersion.objects.filter(audio_type=audioType).values_list('version', 'updated_time').first()
+        if row is None:
+            return None, None
+        version, updated_time = row
+        etag = '%s-v%d' % (audioType, version)
+    else:
+        updated_time = model.objects.filter(id=audioFileID).values_list('updated_time', flat=True).first()
+        if updated_time is None:
+            return None, None
+        etag = '%s-%d-%d' % (audioType, audioFileID, _microseconds(updated_time))
+    return quote_etag(etag), timegm(updated_time.utctimetuple())
+
+
+def not_modified(request, etag, last_modified):
+    """Return a 304 response if the client's copy is still current."""
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _microseconds(value):
+    return timegm(value.utctimetuple()) * 1000000 + value.microsecond
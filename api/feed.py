@@ -0,0 +1,113 @@
+"""
+Cross-type feed of the latest uploads, newest first.
+
+One UNION ALL statement reads the common fields of the three audio tables.
+Each branch walks its own (uploaded_time, id) index backwards from the
+cursor and stops after one page, so a page costs three short index range
+scans and a merge of at most three pages, however large the tables are.
+
+Rows are ordered by (uploaded_time, type code, id) descending. Pages are
+keyed on that triple.
+"""
+from django.db import connections, router
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Song
+from .pagination import decode_cursor, encode_cursor, is_cursor_int, parse_limit
+
+
+FEED_TYPES = [
+    # (type code, audio type, table, name column)
+    (1, 'song', 'api_song', 'name'),
+    (2, 'podcast', 'api_podcast', 'name'),
+    (3, 'audiobook', 'api_audiobook', 'title'),
+]
+
+FEED_TYPE_NAMES = {code: audioType for code, audioType, _, _ in FEED_TYPES}
+
+BRANCH_SQL = (
+    'SELECT * FROM (SELECT %d AS kind, id, %s AS name, duration, uploaded_time FROM %s%s'
+    ' ORDER BY uploaded_time DESC, id DESC LIMIT %%s)'
+)
+
+
+def feed_sql(limit, after=None):
+    """
+    Return (sql, params) for one page of the feed, fetching one row more than
+    limit. after is a decoded (uploaded_time, type code, id) cursor, with
+    uploaded_time already adapted for the database.
+    """
+    branches = []
+    params = []
+    for code, _, table, name in FEED_TYPES:
+        where = ''
+        if after is not None:
+            uploaded_time, kind, pk = after
+            if code < kind:
+                where = ' WHERE uploaded_time <= %s'
+                params.append(uploaded_time)
+            elif code == kind:
+                where = ' WHERE uploaded_time <= %s AND (uploaded_time < %s OR id < %s)'
+                params += [uploaded_time, uploaded_time, pk]
+            else:
+                where = ' WHERE uploaded_time < %s'
+                params.append(uploaded_time)
+        branches.append(BRANCH_SQL % (code, name, table, where))
+        params.append(limit + 1)
+    sql = ' UNION ALL '.join(branches) + ' ORDER BY uploaded_time DESC, kind DESC, id DESC LIMIT %s'
+    params.append(limit + 1)
+    return sql, params
+
+
+def feed_page(limit=None, after=None):
+    """
+    Return (items, next_cursor) for one page of the feed. Items are dicts
+    with type, id, name, duration and uploaded_time. Raises ValueError on
+    a bad limit or cursor.
+    """
+    limit = parse_limit(limit)
+    connection = connections[router.db_for_read(Song)]
+    if after:
+        after = _decode(after, connection)
+    sql, params = feed_sql(limit, after)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    items = [
+        {
+            'type': FEED_TYPE_NAMES[kind],
+            'id': pk,
+            'name': name,
+            'duration': duration,
+            'uploaded_time': _uploaded_time(uploaded_time, connection),
+        }
+        for kind, pk, name, duration, uploaded_time in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        kind, pk = rows[limit - 1][:2]
+        next_cursor = encode_cursor([items[-1]['uploaded_time'].isoformat(), kind, pk])
+    return items, next_cursor
+
+
+def _decode(cursor, connection):
+    try:
+        uploaded_time, kind, pk = decode_cursor(cursor)
+        uploaded_time = parse_datetime(uploaded_time)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor.')
+    if uploaded_time is None or kind not in FEED_TYPE_NAMES or not is_cursor_int(pk):
+        raise ValueError('Invalid cursor.')
+    if timezone.is_naive(uploaded_time):
+        raise ValueError('Invalid cursor.')
+    return connection.ops.adapt_datetimefield_value(uploaded_time), kind, pk
+
+
+def _uploaded_time(value, connection):
+    # Raw queries skip the backend's converters; SQLite returns text.
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, connection.timezone)
+    return value
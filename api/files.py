@@ -0,0 +1,194 @@
+"""
+Audio file uploads and downloads.
+
+Uploads are parsed with AudioUploadHandler, which writes every chunk of the
+request body to a temporary file in FILE_UPLOAD_TEMP_DIR as it arrives, so
+an upload is never held in memory, whatever its size. That directory is
+inside MEDIA_ROOT, so storing the finished upload is a rename.
+
+Downloads are FileResponses over the stored file. Under a WSGI server whose
+wsgi.file_wrapper uses sendfile() (gunicorn, uWSGI), the bytes go from the
+page cache to the socket without passing through Python. A request for one
+byte range (Range: bytes=a-b, a- or -n) gets a 206 with that range only:
+the file is positioned at its start and Content-Length is its length, which
+is all sendfile() needs. Multiple ranges and malformed headers get the
+whole file, as RFC 7233 allows; a range past the end gets a 416.
+"""
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from django.http import FileResponse, HttpResponse
+from django.utils.http import parse_http_date_safe, quote_etag
+
+import mimetypes
+import os
+import re
+
+from .conditional import not_modified, set_validators
+
+
+UPLOAD_CHUNK_SIZE = getattr(settings, 'AUDIO_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+
+MAX_UPLOAD_SIZE = getattr(settings, 'AUDIO_MAX_UPLOAD_SIZE', 2 * 1024 ** 3)
+
+# Read size when the server has no sendfile() and the file goes through Python.
+FILE_BLOCK_SIZE = 256 * 1024
+
+UPLOAD_FIELD = 'file'
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)', re.IGNORECASE)
+
+# Files kept next to a stored file, named after it: api/peaks.py's peaks.
+PEAKS_SUFFIX = '.peaks'
+
+SIDECAR_SUFFIXES = (PEAKS_SUFFIX,)
+
+
+class AudioUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams each uploaded file to disk in UPLOAD_CHUNK_SIZE chunks, and
+    stops the upload once it is larger than MAX_UPLOAD_SIZE.
+    """
+    chunk_size = UPLOAD_CHUNK_SIZE
+    stopped = False
+
+    def new_file(self, *args, **kwargs):
+        if settings.FILE_UPLOAD_TEMP_DIR:
+            os.makedirs(settings.FILE_UPLOAD_TEMP_DIR, exist_ok=True)
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_UPLOAD_SIZE:
+            self.stopped = True
+            self.upload_interrupted()
+            raise StopUpload(connection_reset=True)
+        super().receive_data_chunk(raw_data, start)
+
+
+def receive_upload(request):
+    """
+    Parse a multipart request body with AudioUploadHandler. Returns the
+    file in the UPLOAD_FIELD field as a TemporaryUploadedFile, or None if
+    there is none. Raises ValueError if the request holds any other file,
+    more than one, or one that is too large.
+    """
+    handler = AudioUploadHandler(request)
+    request.upload_handlers = [handler]
+    files = request.FILES
+    if handler.stopped or set(files) - {UPLOAD_FIELD} or len(files.getlist(UPLOAD_FIELD)) > 1:
+        raise ValueError('Expected one file, in the %r field.' % UPLOAD_FIELD)
+    return files.get(UPLOAD_FIELD)
+
+
+def store_upload(model, upload):
+    """Move an upload into the model's audio_file storage. Returns its name."""
+    field = model._meta.get_field('audio_file')
+    return field.storage.save(field.generate_filename(None, upload.name), upload, max_length=field.max_length)
+
+
+class RangeFile:
+    """
+    A read-only file restricted to bytes [start, stop). It keeps the real
+    file descriptor, positioned at start, for sendfile().
+    """
+
+    def __init__(self, path, start, stop):
+        self.file = open(path, 'rb', buffering=0)
+        self.file.seek(start)
+        self.remaining = stop - start
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the (start, stop) byte offsets named by a Range header for a
+    file of size bytes, or None if the whole file should be sent. Raises
+    ValueError if the range is not satisfiable.
+    """
+    match = RANGE_RE.fullmatch(header.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start >= size:
+            raise ValueError('Range starts past the end of the file.')
+        return start, min(int(last) + 1, size) if last else size
+    if not last:
+        return None
+    length = int(last)
+    if not length or not size:
+        raise ValueError('Empty suffix range.')
+    return max(size - length, 0), size
+
+
+def _range_applies(request, etag, last_modified):
+    # If-Range: only honour the Range if the client's copy is this one.
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range is None:
+        return True
+    if if_range.startswith('"'):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def file_response(request, path):
+    """
+    Serve the file at path, or the byte range the request asks for, with
+    validators for conditional and If-Range requests.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = quote_etag('%x-%x' % (stat.st_mtime_ns, size))
+    last_modified = int(stat.st_mtime)
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return set_validators(response, etag, last_modified)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+    byte_range = None
+    header = request.META.get('HTTP_RANGE')
+    if header and _range_applies(request, etag, last_modified):
+        try:
+            byte_range = parse_range(header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */%d' % size
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, stop = byte_range
+        response = FileResponse(RangeFile(path, start, stop), status=206, content_type=content_type)
+        response['Content-Length'] = str(stop - start)
+        response['Content-Range'] = 'bytes %d-%d/%d' % (start, stop - 1, size)
+    response.block_size = FILE_BLOCK_SIZE
+    response['Accept-Ranges'] = 'bytes'
+    return set_validators(response, etag, last_modified)
+
+
+def delete_files(model, names):
+    """
+    Remove stored files and the files kept next to them. Call it once the
+    rows naming them are gone.
+    """
+    storage = model._meta.get_field('audio_file').storage
+    for name in names:
+        if name:
+            storage.delete(name)
+            for suffix in SIDECAR_SUFFIXES:
+                storage.delete(name + suffix)
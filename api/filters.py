@@ -0,0 +1,82 @@
+"""
+Query parameters for filtering and ordering list reads.
+
+    min_duration, max_duration      duration range, in seconds, inclusive
+    uploaded_after, uploaded_before uploaded_time range, ISO 8601 date or
+                                    datetime; after is inclusive, before is not
+    <field>, <field>_prefix         exact or case-sensitive prefix match on
+                                    the fields in TEXT_FILTERS
+    order_by                        one of ORDERINGS
+
+Every filter maps to a range or equality on the leading column of an index
+declared in api/models.py. Prefixes are matched as a range (>= prefix and
+< prefix + U+10FFFF) rather than with LIKE, which SQLite cannot serve from
+an ordinary index.
+"""
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from datetime import datetime, time
+
+from .pagination import MAX_INTEGER
+
+
+TEXT_FILTERS = {
+    'song': ['name'],
+    'podcast': ['name', 'host'],
+    'audiobook': ['title', 'author'],
+}
+
+ORDERINGS = ['uploaded_time', '-uploaded_time', 'duration', '-duration']
+
+DEFAULT_ORDERING = 'uploaded_time'
+
+PREFIX_END = '\U0010ffff'
+
+
+def parse_ordering(value):
+    if value is None:
+        return DEFAULT_ORDERING
+    if value not in ORDERINGS:
+        raise ValueError('Invalid order_by.')
+    return value
+
+
+def filter_queryset(queryset, audioType, params):
+    """Apply the filters in params. Raises ValueError on a bad value."""
+    lookups = {}
+    if 'min_duration' in params:
+        lookups['duration__gte'] = _duration(params['min_duration'])
+    if 'max_duration' in params:
+        lookups['duration__lte'] = _duration(params['max_duration'])
+    if 'uploaded_after' in params:
+        lookups['uploaded_time__gte'] = _datetime(params['uploaded_after'])
+    if 'uploaded_before' in params:
+        lookups['uploaded_time__lt'] = _datetime(params['uploaded_before'])
+    for field in TEXT_FILTERS[audioType]:
+        if field in params:
+            lookups[field] = params[field]
+        prefix = params.get(field + '_prefix')
+        if prefix:
+            lookups[field + '__gte'] = prefix
+            lookups[field + '__lt'] = prefix + PREFIX_END
+    return queryset.filter(**lookups)
+
+
+def _duration(value):
+    duration = int(value)
+    if duration < 0 or duration > MAX_INTEGER:
+        raise ValueError('Invalid duration.')
+    return duration
+
+
+def _datetime(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        date = parse_date(value)
+        if date is None:
+            raise ValueError('Invalid datetime.')
+        parsed = datetime.combine(date, time())
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
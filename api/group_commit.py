@@ -0,0 +1,101 @@
+"""
+Group commit for single-item creates.
+
+With AUDIO_GROUP_COMMIT on, CreateView hands each validated item to one
+writer thread instead of saving it in its own transaction. The writer
+gathers the items that arrive within AUDIO_GROUP_COMMIT_MAX_DELAY seconds of
+the first one, up to AUDIO_GROUP_COMMIT_MAX_ITEMS, and inserts them in a
+single transaction, so many concurrent requests share one commit. Each item
+gets its own savepoint, so a failing insert only fails its own request.
+Requests wait for the commit and get their new id or their error back.
+"""
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .changes import audio_changed
+from .signals import deferred_changes
+
+
+GROUP_COMMIT = getattr(settings, 'AUDIO_GROUP_COMMIT', False)
+GROUP_COMMIT_MAX_ITEMS = getattr(settings, 'AUDIO_GROUP_COMMIT_MAX_ITEMS', 64)
+GROUP_COMMIT_MAX_DELAY = getattr(settings, 'AUDIO_GROUP_COMMIT_MAX_DELAY', 0.002)
+
+
+class GroupCommitWriter:
+    def __init__(self, max_items=GROUP_COMMIT_MAX_ITEMS, max_delay=GROUP_COMMIT_MAX_DELAY):
+        self.max_items = max_items
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, instance):
+        """Queue an unsaved instance. Returns a Future of its new id."""
+        future = Future()
+        self._queue.put((instance, future))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='audioserve-group-commit', daemon=True)
+                self._thread.start()
+        return future
+
+    def save(self, instance):
+        return self.submit(instance).result()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            close_old_connections()
+            try:
+                self._commit(batch)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_items:
+            try:
+                batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, batch):
+        with deferred_changes() as changes:
+            with transaction.atomic():
+                errors = [_save(instance) for instance, _ in batch]
+        for audioType, ids in changes.items():
+            audio_changed(audioType, ids)
+        for (instance, future), error in zip(batch, errors):
+            if error is None:
+                future.set_result(instance.pk)
+            else:
+                future.set_exception(error)
+
+
+def _save(instance):
+    try:
+        with transaction.atomic():
+            instance.save(force_insert=True)
+    except DatabaseError as exc:
+        return exc
+    return None
+
+
+writer = GroupCommitWriter()
+
+
+def save_item(instance):
+    """Insert a validated instance, through the group-commit writer if it is on."""
+    if GROUP_COMMIT:
+        return writer.save(instance)
+    instance.save()
+    return instance.pk
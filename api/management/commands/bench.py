@@ -0,0 +1,87 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import setup_databases, teardown_databases
+
+import json
+import os
+import platform
+import sqlite3
+import tempfile
+import time
+
+import django
+
+from api.bench import compare, run_benchmarks, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway database and time every API route through the test client. '
+        'Reports throughput and p50/p95/p99 latency per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Items seeded per audio type (default 1000).')
+        parser.add_argument('--requests', type=int, default=100, help='Requests per endpoint (default 100).')
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against the results in this JSON file.')
+        parser.add_argument(
+            '--threshold', type=float, default=0.2,
+            help='Fail when p95 latency grows, or throughput falls, by more than this fraction (default 0.2).',
+        )
+        parser.add_argument(
+            '--in-memory', action='store_true',
+            help='Benchmark an in-memory database instead of a temporary file.',
+        )
+
+    def handle(self, *args, **options):
+        rows, requests = options['rows'], options['requests']
+        if requests < 1 or rows < requests * 11:
+            raise CommandError('--rows must be at least 11 times --requests, for the delete endpoints.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            if not options['in_memory']:
+                connection.settings_dict['TEST']['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_config = setup_databases(verbosity=0, interactive=False)
+            try:
+                started = time.perf_counter()
+                ids = seed(rows)
+                self.stderr.write('Seeded %d rows per type in %.1f s.' % (rows, time.perf_counter() - started))
+                endpoints = run_benchmarks(ids, requests)
+            finally:
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+
+        results = {
+            'meta': {
+                'rows': rows,
+                'requests': requests,
+                'database': 'memory' if options['in_memory'] else 'file',
+                'engine': connection.settings_dict['ENGINE'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+                'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            },
+            'endpoints': endpoints,
+        }
+        self.stdout.write('%-30s %6s %10s %9s %9s %9s' % ('endpoint', 'errors', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+        for name, result in endpoints.items():
+            self.stdout.write('%-30s %6d %10.1f %9.2f %9.2f %9.2f' % (
+                name, result['errors'], result['throughput'], result['p50_ms'], result['p95_ms'], result['p99_ms'],
+            ))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+
+        if baseline is not None:
+            regressions = compare(endpoints, baseline['endpoints'], options['threshold'])
+            for name, metric, before, after in regressions:
+                self.stdout.write(self.style.ERROR('%s: %s %.2f -> %.2f' % (name, metric, before, after)))
+            if regressions:
+                raise CommandError('%d regressions against %s.' % (len(regressions), options['baseline']))
+            self.stdout.write(self.style.SUCCESS('No regressions against %s.' % options['baseline']))
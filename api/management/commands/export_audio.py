@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import time
+
+from api.streaming import STREAM_CHUNK_SIZE
+from api.transfer import FORMATS, export_records, format_for
+
+
+class Command(BaseCommand):
+    help = 'Export every song, podcast or audiobook to a CSV or NDJSON file, in id order.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('audioType', choices=['song', 'podcast', 'audiobook'])
+        parser.add_argument('path', nargs='?', default='-', help="Output file, or '-' for standard output (default).")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Output format. Defaults to csv for .csv files and ndjson otherwise.',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=STREAM_CHUNK_SIZE,
+            help='Rows fetched from the database at a time (default %d).' % STREAM_CHUNK_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        audioType, path = options['audioType'], options['path']
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        fmt = options['format'] or format_for(path)
+        started = time.perf_counter()
+        if path == '-':
+            count = export_records(audioType, self.stdout, fmt, options['chunk_size'])
+        else:
+            try:
+                file = open(path, 'w', newline='', encoding='utf-8')
+            except OSError as e:
+                raise CommandError(e)
+            with file:
+                count = export_records(audioType, file, fmt, options['chunk_size'])
+        elapsed = time.perf_counter() - started
+        self.stderr.write('Exported %d %ss in %.1f s.' % (count, audioType, elapsed))
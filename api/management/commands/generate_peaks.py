@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+
+import os
+
+from api.files import PEAKS_SUFFIX
+from api.models import Song, Podcast, Audiobook
+from api.peaks import write_peaks
+
+
+AUDIO_MODELS = {
+    'song': Song,
+    'podcast': Podcast,
+    'audiobook': Audiobook,
+}
+
+
+class Command(BaseCommand):
+    help = 'Write the waveform peaks of every stored audio file that has none, or older ones.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--type', choices=sorted(AUDIO_MODELS), action='append', dest='types',
+            help='Only this audio type; may be repeated. Default: all of them.',
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rewrite peaks that are up to date too.',
+        )
+
+    def handle(self, *args, **options):
+        generated = current = unsupported = missing = 0
+        for audioType in options['types'] or AUDIO_MODELS:
+            model = AUDIO_MODELS[audioType]
+            storage = model._meta.get_field('audio_file').storage
+            names = model.objects.exclude(audio_file='').values_list('audio_file', flat=True)
+            for name in names.iterator():
+                path = storage.path(name)
+                try:
+                    modified = os.stat(path).st_mtime_ns
+                except FileNotFoundError:
+                    missing += 1
+                    continue
+                if not options['force']:
+                    try:
+                        if os.stat(path + PEAKS_SUFFIX).st_mtime_ns >= modified:
+                            current += 1
+                            continue
+                    except FileNotFoundError:
+                        pass
+                try:
+                    write_peaks(path)
+                except ValueError:
+                    unsupported += 1
+                    continue
+                generated += 1
+        self.stdout.write(self.style.SUCCESS(
+            'Wrote peaks for %d files; %d were up to date, %d unsupported, %d missing.'
+            % (generated, current, unsupported, missing)
+        ))
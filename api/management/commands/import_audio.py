@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand, CommandError
+
+import json
+import os
+import sys
+import time
+
+from api.transfer import FORMATS, IMPORT_BATCH_SIZE, format_for, import_records, read_records
+
+
+PROGRESS_INTERVAL = 2.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Import songs, podcasts or audiobooks from a CSV or NDJSON file, validated like the create '
+        'endpoint. Invalid records are reported and skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('audioType', choices=['song', 'podcast', 'audiobook'])
+        parser.add_argument('path', help="File to import, or '-' for standard input.")
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Input format. Defaults to csv for .csv files and ndjson otherwise.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Skip the records of this file committed by an earlier, interrupted import.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Records per transaction (default %d).' % IMPORT_BATCH_SIZE,
+        )
+
+    def handle(self, *args, **options):
+        audioType, path = options['audioType'], options['path']
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+        fmt = options['format'] or format_for(path)
+        source = '%s:%s' % (audioType, '-' if path == '-' else os.path.abspath(path))
+        started = last_report = time.perf_counter()
+
+        def on_error(number, errors):
+            self.stderr.write('record %d: %s' % (number, json.dumps(errors)))
+
+        def on_progress(records, imported, errors):
+            nonlocal last_report
+            now = time.perf_counter()
+            if now - last_report >= PROGRESS_INTERVAL:
+                last_report = now
+                self.stderr.write('%d records, %d imported, %d invalid, %.0f rows/s'
+                                  % (records, imported, errors, imported / (now - started)))
+
+        try:
+            file = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        except OSError as e:
+            raise CommandError(e)
+        with file:
+            records, imported, errors = import_records(
+                audioType, read_records(file, fmt), source, resume=options['resume'],
+                batch_size=options['batch_size'], on_error=on_error, on_progress=on_progress,
+            )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d %ss in %.1f s (%.0f rows/s); %d invalid records skipped; %d records read in total.'
+            % (imported, audioType, elapsed, imported / elapsed if elapsed else 0, errors, records)
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.stats import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Recount the catalog statistics from the song, podcast and audiobook tables and report any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the drift; leave the counters as they are.',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drift = reconcile(dry_run=options['dry_run'])
+        for audioType, bucket, (count, duration), (actual_count, actual_duration) in drift:
+            self.stdout.write(
+                '%s bucket %d: count %d -> %d, total duration %d -> %d'
+                % (audioType, bucket, count, actual_count, duration, actual_duration)
+            )
+        if not drift:
+            self.stdout.write(self.style.SUCCESS('Catalog statistics are consistent.'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING('%d counters drifted.' % len(drift)))
+        else:
+            self.stdout.write(self.style.SUCCESS('%d counters drifted and were rebuilt.' % len(drift)))
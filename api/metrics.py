@@ -0,0 +1,194 @@
+"""
+Request metrics: wall time, database time, query count and response size
+per request, aggregated into histograms by route (the URL pattern name) and
+served at /metrics/ in the Prometheus text format.
+
+MetricsMiddleware times the whole request and counts queries through
+connection.execute_wrapper. Recording costs a few dict lookups and a lock per
+request. Under WSGI, queries run while a streaming response is being read
+are not counted, because they happen after the middleware has returned.
+Under ASGI the middleware runs as a coroutine, and the async views time
+the queries on their database threads. Metrics are per process.
+"""
+from django.db import connections
+
+import asyncio
+import bisect
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from .admission import admission_stats
+from .cache import cache_stats
+
+
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+QUERY_BUCKETS = [0, 1, 2, 3, 5, 10, 20, 50, 100]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+HISTOGRAMS = [
+    # (name, help, buckets)
+    ('audioserve_request_duration_seconds', 'Wall time per request.', LATENCY_BUCKETS),
+    ('audioserve_db_duration_seconds', 'Time spent in database queries per request.', LATENCY_BUCKETS),
+    ('audioserve_db_queries', 'Database queries per request.', QUERY_BUCKETS),
+    ('audioserve_response_size_bytes', 'Response body size; streaming responses count as 0.', SIZE_BUCKETS),
+]
+
+_lock = threading.Lock()
+_histograms = {}
+_requests = {}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """Yield (le, cumulative count) pairs, ending with '+Inf'."""
+        total = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            total += count
+            yield bound, total
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and adds up their time."""
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+@contextmanager
+def timed_queries(timer):
+    """Run timer around every query made by this thread's connections."""
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+        yield timer
+
+
+def record(route, status, duration, db_duration, queries, size):
+    values = [duration, db_duration, queries, size]
+    with _lock:
+        for (name, _, buckets), value in zip(HISTOGRAMS, values):
+            histogram = _histograms.get((name, route))
+            if histogram is None:
+                histogram = _histograms[name, route] = Histogram(buckets)
+            histogram.observe(value)
+        _requests[route, status] = _requests.get((route, status), 0) + 1
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _requests.clear()
+
+
+def server_timing(duration, db_duration, queries):
+    return 'total;dur=%.2f, db;dur=%.2f;desc="%d queries"' % (duration * 1000, db_duration * 1000, queries)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Let Django call us as a coroutine, so that under ASGI the rest
+            # of the chain is not run in its single thread_sensitive thread.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        timer = request.query_timer = QueryTimer()
+        started = time.perf_counter()
+        with timed_queries(timer):
+            response = self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # The views' queries run on other threads; api/async_views.py times
+        # them there, into request.query_timer.
+        request.query_timer = QueryTimer()
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        return self.finish(request, response, time.perf_counter() - started)
+
+    def finish(self, request, response, duration):
+        timer = request.query_timer
+        match = request.resolver_match
+        route = match.url_name if match is not None and match.url_name else 'unmatched'
+        size = 0 if response.streaming else len(response.content)
+        record(route, response.status_code, duration, timer.duration, timer.count, size)
+        response['Server-Timing'] = server_timing(duration, timer.duration, timer.count)
+        return response
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def render():
+    """Return every metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: (list(h.samples()), h.sum) for key, h in _histograms.items()}
+        requests = dict(_requests)
+    lines = []
+    for name, help_text, _ in HISTOGRAMS:
+        lines.append('# HELP %s %s' % (name, help_text))
+        lines.append('# TYPE %s histogram' % name)
+        for (metric, route), (samples, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in samples:
+                lines.append('%s_bucket{route="%s",le="%s"} %d' % (name, route, _format_bound(bound), count))
+            lines.append('%s_sum{route="%s"} %s' % (name, route, repr(float(total))))
+            lines.append('%s_count{route="%s"} %d' % (name, route, samples[-1][1]))
+    lines.append('# HELP audioserve_requests_total Requests by route and status code.')
+    lines.append('# TYPE audioserve_requests_total counter')
+    for (route, status), count in sorted(requests.items()):
+        lines.append('audioserve_requests_total{route="%s",status="%d"} %d' % (route, status, count))
+    for name, value in sorted(cache_stats().items()):
+        lines.append('# HELP audioserve_cache_%s_total Read cache %s.' % (name, name))
+        lines.append('# TYPE audioserve_cache_%s_total counter' % name)
+        lines.append('audioserve_cache_%s_total %d' % (name, value))
+    admission = admission_stats()
+    gauges = [
+        ('limit', 'Concurrent requests admitted at most'),
+        ('active', 'Requests holding an admission slot'),
+        ('waiting', 'Requests queued for an admission slot'),
+    ]
+    for name, help_text in gauges:
+        lines.append('# HELP audioserve_admission_%s %s, by gate.' % (name, help_text))
+        lines.append('# TYPE audioserve_admission_%s gauge' % name)
+        for gate, stats in sorted(admission['gates'].items()):
+            lines.append('audioserve_admission_%s{gate="%s"} %d' % (name, gate, stats[name]))
+    lines.append('# HELP audioserve_admission_admitted_total Requests admitted, by gate.')
+    lines.append('# TYPE audioserve_admission_admitted_total counter')
+    for gate, stats in sorted(admission['gates'].items()):
+        lines.append('audioserve_admission_admitted_total{gate="%s"} %d' % (gate, stats['admitted']))
+    lines.append('# HELP audioserve_admission_shed_total Requests shed with a 503, by gate and reason.')
+    lines.append('# TYPE audioserve_admission_shed_total counter')
+    for gate, stats in sorted(admission['gates'].items()):
+        for reason, count in sorted(stats['shed'].items()):
+            lines.append('audioserve_admission_shed_total{gate="%s",reason="%s"} %d' % (gate, reason, count))
+    lines.append('# HELP audioserve_rate_limited_total Requests refused with a 429 by the per-client rate limit.')
+    lines.append('# TYPE audioserve_rate_limited_total counter')
+    lines.append('audioserve_rate_limited_total %d' % admission['rate_limited'])
+    return '\n'.join(lines) + '\n'
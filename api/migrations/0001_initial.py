@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 18:18
+
+import api.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Audiobook',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=100)),
+                ('author', models.CharField(max_length=100)),
+                ('narrator', models.CharField(max_length=100)),
+                ('duration', models.PositiveIntegerField()),
+                ('uploaded_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Podcast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('duration', models.PositiveIntegerField()),
+                ('uploaded_time', models.DateTimeField(auto_now_add=True)),
+                ('host', models.CharField(max_length=100)),
+                ('participants', models.CharField(max_length=1040, validators=[api.validators.validate_participants])),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Song',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('duration', models.PositiveIntegerField()),
+                ('uploaded_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiobook',
+            index=models.Index(fields=['uploaded_time', 'id'], name='audiobook_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='podcast',
+            index=models.Index(fields=['uploaded_time', 'id'], name='podcast_uploaded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['uploaded_time', 'id'], name='song_uploaded_idx'),
+        ),
+    ]
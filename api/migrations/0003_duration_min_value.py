@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 18:20
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_uploaded_time_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='audiobook',
+            name='duration',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='podcast',
+            name='duration',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='song',
+            name='duration',
+            field=models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+    ]
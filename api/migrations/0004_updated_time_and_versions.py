@@ -0,0 +1,44 @@
+# Generated by Django 3.2 on 2026-10-18 18:22
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def create_versions(apps, schema_editor):
+    AudioVersion = apps.get_model('api', 'AudioVersion')
+    for audio_type in ('song', 'podcast', 'audiobook'):
+        AudioVersion.objects.get_or_create(audio_type=audio_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_duration_min_value'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioVersion',
+            fields=[
+                ('audio_type', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_time', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='audiobook',
+            name='updated_time',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='updated_time',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='song',
+            name='updated_time',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(create_versions, migrations.RunPython.noop),
+    ]
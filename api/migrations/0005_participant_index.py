@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 18:24
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+PARTICIPANT_TRIGGERS = [
+    """
+    CREATE TRIGGER api_podcast_participants_insert AFTER INSERT ON api_podcast
+    BEGIN
+        INSERT INTO api_participant (podcast_id, name, position)
+        SELECT new.id, value, key FROM json_each(new.participants);
+    END
+    """,
+    """
+    CREATE TRIGGER api_podcast_participants_update AFTER UPDATE OF participants ON api_podcast
+    BEGIN
+        DELETE FROM api_participant WHERE podcast_id = old.id;
+        INSERT INTO api_participant (podcast_id, name, position)
+        SELECT new.id, value, key FROM json_each(new.participants);
+    END
+    """,
+    """
+    CREATE TRIGGER api_podcast_participants_delete AFTER DELETE ON api_podcast
+    BEGIN
+        DELETE FROM api_participant WHERE podcast_id = old.id;
+    END
+    """,
+]
+
+DROP_PARTICIPANT_TRIGGERS = [
+    'DROP TRIGGER api_podcast_participants_insert',
+    'DROP TRIGGER api_podcast_participants_update',
+    'DROP TRIGGER api_podcast_participants_delete',
+]
+
+BACKFILL_PARTICIPANTS = """
+    INSERT INTO api_participant (podcast_id, name, position)
+    SELECT api_podcast.id, participant.value, participant.key
+    FROM api_podcast, json_each(api_podcast.participants) AS participant
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_updated_time_and_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Participant',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('position', models.PositiveSmallIntegerField()),
+                ('podcast', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, related_name='participant_set', related_query_name='participant', to='api.podcast')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['name', 'podcast'], name='participant_name_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_PARTICIPANTS, 'DELETE FROM api_participant'),
+        migrations.RunSQL(PARTICIPANT_TRIGGERS, DROP_PARTICIPANT_TRIGGERS),
+    ]
@@ -0,0 +1,100 @@
+from django.db import migrations
+
+
+CREATE_SEARCH_TABLE = """
+    CREATE VIRTUAL TABLE api_search USING fts5(
+        title, people, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )
+"""
+
+SEARCH_TRIGGERS = [
+    """
+    CREATE TRIGGER api_song_search_insert AFTER INSERT ON api_song
+    BEGIN
+        INSERT INTO api_search (rowid, title, people) VALUES (new.id * 4 + 1, new.name, '');
+    END
+    """,
+    """
+    CREATE TRIGGER api_song_search_update AFTER UPDATE OF name ON api_song
+    BEGIN
+        UPDATE api_search SET title = new.name WHERE rowid = new.id * 4 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER api_song_search_delete AFTER DELETE ON api_song
+    BEGIN
+        DELETE FROM api_search WHERE rowid = old.id * 4 + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER api_podcast_search_insert AFTER INSERT ON api_podcast
+    BEGIN
+        INSERT INTO api_search (rowid, title, people)
+        VALUES (new.id * 4 + 2, new.name, new.host || ' ' || new.participants);
+    END
+    """,
+    """
+    CREATE TRIGGER api_podcast_search_update AFTER UPDATE OF name, host, participants ON api_podcast
+    BEGIN
+        UPDATE api_search SET title = new.name, people = new.host || ' ' || new.participants
+        WHERE rowid = new.id * 4 + 2;
+    END
+    """,
+    """
+    CREATE TRIGGER api_podcast_search_delete AFTER DELETE ON api_podcast
+    BEGIN
+        DELETE FROM api_search WHERE rowid = old.id * 4 + 2;
+    END
+    """,
+    """
+    CREATE TRIGGER api_audiobook_search_insert AFTER INSERT ON api_audiobook
+    BEGIN
+        INSERT INTO api_search (rowid, title, people)
+        VALUES (new.id * 4 + 3, new.title, new.author || ' ' || new.narrator);
+    END
+    """,
+    """
+    CREATE TRIGGER api_audiobook_search_update AFTER UPDATE OF title, author, narrator ON api_audiobook
+    BEGIN
+        UPDATE api_search SET title = new.title, people = new.author || ' ' || new.narrator
+        WHERE rowid = new.id * 4 + 3;
+    END
+    """,
+    """
+    CREATE TRIGGER api_audiobook_search_delete AFTER DELETE ON api_audiobook
+    BEGIN
+        DELETE FROM api_search WHERE rowid = old.id * 4 + 3;
+    END
+    """,
+]
+
+DROP_SEARCH_TRIGGERS = [
+    'DROP TRIGGER api_%s_search_%s' % (table, action)
+    for table in ('song', 'podcast', 'audiobook')
+    for action in ('insert', 'update', 'delete')
+]
+
+BACKFILL_SEARCH = [
+    "INSERT INTO api_search (rowid, title, people) SELECT id * 4 + 1, name, '' FROM api_song",
+    """
+    INSERT INTO api_search (rowid, title, people)
+    SELECT id * 4 + 2, name, host || ' ' || participants FROM api_podcast
+    """,
+    """
+    INSERT INTO api_search (rowid, title, people)
+    SELECT id * 4 + 3, title, author || ' ' || narrator FROM api_audiobook
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_participant_index'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_SEARCH_TABLE, 'DROP TABLE api_search'),
+        migrations.RunSQL(BACKFILL_SEARCH, migrations.RunSQL.noop),
+        migrations.RunSQL(SEARCH_TRIGGERS, DROP_SEARCH_TRIGGERS),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 3.2 on 2026-10-18 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audiobook',
+            index=models.Index(fields=['duration', 'id'], name='audiobook_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiobook',
+            index=models.Index(fields=['title', 'uploaded_time', 'id'], name='audiobook_title_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audiobook',
+            index=models.Index(fields=['author', 'uploaded_time', 'id'], name='audiobook_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='podcast',
+            index=models.Index(fields=['duration', 'id'], name='podcast_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='podcast',
+            index=models.Index(fields=['name', 'uploaded_time', 'id'], name='podcast_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='podcast',
+            index=models.Index(fields=['host', 'uploaded_time', 'id'], name='podcast_host_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['duration', 'id'], name='song_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['name', 'uploaded_time', 'id'], name='song_name_idx'),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 3.2 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+# A frozen copy of api.stats.DURATION_BUCKETS.
+DURATION_BUCKETS = [60, 180, 300, 600, 1200, 1800, 3600, 7200]
+
+STATS_TABLES = {'song': 'api_song', 'podcast': 'api_podcast', 'audiobook': 'api_audiobook'}
+
+
+def bucket_sql(column):
+    cases = ' '.join('WHEN %s < %d THEN %d' % (column, edge, i) for i, edge in enumerate(DURATION_BUCKETS))
+    return 'CASE %s ELSE %d END' % (cases, len(DURATION_BUCKETS))
+
+
+ADD_SQL = """
+    INSERT INTO api_audiostat (audio_type, bucket, count, total_duration)
+    VALUES ('{type}', {bucket}, 1, {row}.duration)
+    ON CONFLICT (audio_type, bucket) DO UPDATE SET
+        count = count + 1, total_duration = total_duration + excluded.total_duration;
+"""
+
+REMOVE_SQL = """
+    UPDATE api_audiostat SET count = count - 1, total_duration = total_duration - {row}.duration
+    WHERE audio_type = '{type}' AND bucket = {bucket};
+"""
+
+
+def stats_triggers(audioType, table):
+    add = ADD_SQL.format(type=audioType, row='new', bucket=bucket_sql('new.duration'))
+    remove = REMOVE_SQL.format(type=audioType, row='old', bucket=bucket_sql('old.duration'))
+    return [
+        'CREATE TRIGGER api_%s_stats_insert AFTER INSERT ON %s BEGIN %s END' % (audioType, table, add),
+        'CREATE TRIGGER api_%s_stats_update AFTER UPDATE OF duration ON %s BEGIN %s %s END'
+        % (audioType, table, remove, add),
+        'CREATE TRIGGER api_%s_stats_delete AFTER DELETE ON %s BEGIN %s END' % (audioType, table, remove),
+    ]
+
+
+STATS_TRIGGERS = [sql for audioType, table in STATS_TABLES.items() for sql in stats_triggers(audioType, table)]
+
+DROP_STATS_TRIGGERS = [
+    'DROP TRIGGER api_%s_stats_%s' % (audioType, event)
+    for audioType in STATS_TABLES for event in ('insert', 'update', 'delete')
+]
+
+BACKFILL_STATS = [
+    """
+    INSERT INTO api_audiostat (audio_type, bucket, count, total_duration)
+    SELECT '%s', %s AS bucket, COUNT(*), COALESCE(SUM(duration), 0) FROM %s GROUP BY bucket
+    """ % (audioType, bucket_sql('duration'), table)
+    for audioType, table in STATS_TABLES.items()
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AudioStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('audio_type', models.CharField(max_length=20)),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.BigIntegerField(default=0)),
+                ('total_duration', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='audiostat',
+            constraint=models.UniqueConstraint(fields=('audio_type', 'bucket'), name='audiostat_type_bucket_unique'),
+        ),
+        migrations.RunSQL(BACKFILL_STATS, 'DELETE FROM api_audiostat'),
+        migrations.RunSQL(STATS_TRIGGERS, DROP_STATS_TRIGGERS),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_catalog_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportProgress',
+            fields=[
+                ('source', models.CharField(max_length=1024, primary_key=True, serialize=False)),
+                ('records', models.PositiveBigIntegerField(default=0)),
+                ('updated_time', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,50 @@
+from django.db import migrations, models
+
+from importlib import import_module
+
+
+# On SQLite, adding a column remakes the table, and dropping the old table
+# drops its triggers. Re-create the participant, search and stats triggers
+# of migrations 0005, 0006 and 0008 once the three tables are remade.
+participant_index = import_module('api.migrations.0005_participant_index')
+search_index = import_module('api.migrations.0006_search_index')
+catalog_stats = import_module('api.migrations.0008_catalog_stats')
+
+TRIGGERS = participant_index.PARTICIPANT_TRIGGERS + search_index.SEARCH_TRIGGERS + catalog_stats.STATS_TRIGGERS
+
+DROP_TRIGGERS = [
+    sql.replace('DROP TRIGGER', 'DROP TRIGGER IF EXISTS')
+    for sql in (
+        participant_index.DROP_PARTICIPANT_TRIGGERS
+        + search_index.DROP_SEARCH_TRIGGERS
+        + catalog_stats.DROP_STATS_TRIGGERS
+    )
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_import_progress'),
+    ]
+
+    operations = [
+        # Backwards, this re-creates the triggers after the columns are gone.
+        migrations.RunSQL(DROP_TRIGGERS, TRIGGERS),
+        migrations.AddField(
+            model_name='song',
+            name='audio_file',
+            field=models.FileField(blank=True, max_length=255, upload_to='song/'),
+        ),
+        migrations.AddField(
+            model_name='podcast',
+            name='audio_file',
+            field=models.FileField(blank=True, max_length=255, upload_to='podcast/'),
+        ),
+        migrations.AddField(
+            model_name='audiobook',
+            name='audio_file',
+            field=models.FileField(blank=True, max_length=255, upload_to='audiobook/'),
+        ),
+        migrations.RunSQL(TRIGGERS, DROP_TRIGGERS),
+    ]
@@ -1,12 +1,24 @@
+from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import F
+from django.utils import timezone
 
 from .validators import validate_participants
 
 
 class Song(models.Model):
     name = models.CharField(max_length=100, blank=False)
-    duration = models.PositiveIntegerField(blank=False)
+    duration = models.PositiveIntegerField(blank=False, validators=[MinValueValidator(0)])
     uploaded_time = models.DateTimeField(auto_now_add=True)
+    updated_time = models.DateTimeField(auto_now=True)
+    audio_file = models.FileField(upload_to='song/', max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_time', 'id'], name='song_uploaded_idx'),
+            models.Index(fields=['duration', 'id'], name='song_duration_idx'),
+            models.Index(fields=['name', 'uploaded_time', 'id'], name='song_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -14,11 +26,42 @@ class Song(models.Model):
 
 class Podcast(models.Model):
     name = models.CharField(max_length=100, blank=False)
-    duration = models.PositiveIntegerField(blank=False)
+    duration = models.PositiveIntegerField(blank=False, validators=[MinValueValidator(0)])
     uploaded_time = models.DateTimeField(auto_now_add=True)
+    updated_time = models.DateTimeField(auto_now=True)
+    audio_file = models.FileField(upload_to='podcast/', max_length=255, blank=True)
     host = models.CharField(max_length=100)
     participants = models.CharField(max_length=1040, validators=[validate_participants])
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_time', 'id'], name='podcast_uploaded_idx'),
+            models.Index(fields=['duration', 'id'], name='podcast_duration_idx'),
+            models.Index(fields=['name', 'uploaded_time', 'id'], name='podcast_name_idx'),
+            models.Index(fields=['host', 'uploaded_time', 'id'], name='podcast_host_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class Participant(models.Model):
+    """
+    Index of Podcast.participants, one row per name. Rows are written by
+    SQLite triggers on api_podcast (see migration 0005), so every write
+    path, including bulk_create and set-based updates, keeps it in sync.
+    """
+    podcast = models.ForeignKey(
+        Podcast, on_delete=models.DO_NOTHING, related_name='participant_set', related_query_name='participant'
+    )
+    name = models.CharField(max_length=100)
+    position = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name', 'podcast'], name='participant_name_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -27,8 +70,75 @@ class Audiobook(models.Model):
     title = models.CharField(max_length=100, blank=False)
     author = models.CharField(max_length=100, blank=False)
     narrator = models.CharField(max_length=100, blank=False)
-    duration = models.PositiveIntegerField(blank=False)
+    duration = models.PositiveIntegerField(blank=False, validators=[MinValueValidator(0)])
     uploaded_time = models.DateTimeField(auto_now_add=True)
+    updated_time = models.DateTimeField(auto_now=True)
+    audio_file = models.FileField(upload_to='audiobook/', max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['uploaded_time', 'id'], name='audiobook_uploaded_idx'),
+            models.Index(fields=['duration', 'id'], name='audiobook_duration_idx'),
+            models.Index(fields=['title', 'uploaded_time', 'id'], name='audiobook_title_idx'),
+            models.Index(fields=['author', 'uploaded_time', 'id'], name='audiobook_author_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class AudioVersion(models.Model):
+    """
+    Change counter per audio type, moved on by every write to that type.
+    ReadView uses it to build ETag and Last-Modified for list responses.
+    """
+    audio_type = models.CharField(max_length=20, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_time = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return '%s@%d' % (self.audio_type, self.version)
+
+    @classmethod
+    def bump(cls, audio_type):
+        now = timezone.now()
+        updated = cls.objects.filter(audio_type=audio_type).update(
+            version=F('version') + 1, updated_time=now
+        )
+        if not updated:
+            cls.objects.get_or_create(audio_type=audio_type, defaults={'version': 1, 'updated_time': now})
+
+
+class AudioStat(models.Model):
+    """
+    Number of items and their total duration for one audio type and one
+    duration bucket (see api/stats.py). Rows are kept up to date by SQLite
+    triggers on the audio tables (see migration 0008), inside the writing
+    transaction, so /stats/ never has to scan the catalog.
+    """
+    audio_type = models.CharField(max_length=20)
+    bucket = models.PositiveSmallIntegerField()
+    count = models.BigIntegerField(default=0)
+    total_duration = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['audio_type', 'bucket'], name='audiostat_type_bucket_unique'),
+        ]
+
+    def __str__(self):
+        return '%s[%d]' % (self.audio_type, self.bucket)
+
+
+class ImportProgress(models.Model):
+    """
+    Number of records of an import source that import_audio has committed.
+    It is updated in the same transaction as the rows it counts, so a
+    resumed import never skips or repeats a record.
+    """
+    source = models.CharField(max_length=1024, primary_key=True)
+    records = models.PositiveBigIntegerField(default=0)
+    updated_time = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return '%s@%d' % (self.source, self.records)
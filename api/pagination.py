@@ -0,0 +1,106 @@
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+import base64
+import binascii
+import json
+from datetime import datetime
+
+
+DEFAULT_PAGE_SIZE = getattr(settings, 'AUDIO_PAGE_SIZE', 50)
+MAX_PAGE_SIZE = getattr(settings, 'AUDIO_MAX_PAGE_SIZE', 1000)
+
+# The largest integer SQLite can store; larger ones raise OverflowError.
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def is_paginated(request):
+    return 'limit' in request.GET or 'after' in request.GET
+
+
+def encode_cursor(values):
+    data = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    try:
+        return json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Invalid cursor.')
+
+
+def is_cursor_int(value):
+    """Whether a decoded cursor value is an integer SQLite can compare with."""
+    return isinstance(value, int) and not isinstance(value, bool) and 0 <= value <= MAX_INTEGER
+
+
+def parse_limit(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    limit = int(value)
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError('Invalid limit.')
+    return limit
+
+
+def order_fields(order_by):
+    """Return the ORDER BY for a whitelisted ordering, with id breaking ties."""
+    return (order_by, '-id' if order_by.startswith('-') else 'id')
+
+
+def page_queryset(queryset, limit, after=None, order_by='uploaded_time'):
+    """
+    Return the queryset for one page of keyset pagination on (order_by, id),
+    fetching one row more than limit to tell whether there is a next page.
+    Each page is a range scan on the (field, id) index starting at the
+    cursor, so its cost does not depend on how deep the client has paged.
+    Raises ValueError on a bad cursor.
+    """
+    field = order_by.lstrip('-')
+    queryset = queryset.order_by(*order_fields(order_by))
+    if after:
+        try:
+            value, pk = decode_cursor(after)
+            value = _cursor_value(field, value)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor.')
+        if value is None or not is_cursor_int(pk):
+            raise ValueError('Invalid cursor.')
+        if order_by.startswith('-'):
+            queryset = queryset.filter(**{field + '__lte': value}).filter(
+                Q(**{field + '__lt': value}) | Q(id__lt=pk)
+            )
+        else:
+            queryset = queryset.filter(**{field + '__gte': value}).filter(
+                Q(**{field + '__gt': value}) | Q(id__gt=pk)
+            )
+    return queryset[:limit + 1]
+
+
+def paginate(queryset, limit=None, after=None, order_by='uploaded_time'):
+    """
+    Return (items, next_cursor) for one page. Raises ValueError on a bad
+    limit or cursor.
+    """
+    limit = parse_limit(limit)
+    items = list(page_queryset(queryset, limit, after, order_by))
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        value = getattr(last, order_by.lstrip('-'))
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        next_cursor = encode_cursor([value, last.id])
+    return items, next_cursor
+
+
+def _cursor_value(field, value):
+    if field == 'uploaded_time':
+        return parse_datetime(value)
+    if is_cursor_int(value):
+        return value
+    return None
@@ -0,0 +1,248 @@
+"""
+Precomputed waveform peaks, served by /peaks/<audioType>/<id>/.
+
+write_peaks() reads a PCM WAV file and writes a peaks file next to it,
+with one (min, max) pair per PEAK_RESOLUTIONS[i] sample frames, for every
+resolution. Each resolution must divide the next. The generate_peaks
+command runs it for every stored file that has no peaks file, or an
+older one.
+
+The samples are read through mmap, in chunks of CHUNK_PEAKS peaks of the
+coarsest resolution. A chunk gives whole peaks at every resolution. They
+are written at their place in the output file, and then the chunk's
+pages are dropped. So memory use depends on the chunk size, not on the
+length of the file. With numpy, a chunk is reduced with vectorised
+min/max over a reshaped view of the mapped samples. Without numpy, it is
+reduced with min() and max() over memoryview slices.
+
+Peaks are taken over all channels together and scaled to int16, whatever
+the sample format. A peaks file holds, all little-endian:
+
+    header  '<4sHIQH'  PEAKS_MAGIC, channels, sample rate, frames, levels
+    levels  '<IQQ'     per level: frames per peak, peaks, data offset
+    data    '<h'       per level: (min, max) for each peak
+
+The view serves one level's data straight from the file, as a
+FileResponse, so it can go out with sendfile().
+"""
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.http import quote_etag
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from .audio_headers import wav_layout
+from .conditional import not_modified, set_validators
+from .files import PEAKS_SUFFIX, RangeFile
+
+
+PEAK_RESOLUTIONS = tuple(getattr(settings, 'AUDIO_PEAK_RESOLUTIONS', (256, 1024, 4096, 16384)))
+
+CHUNK_PEAKS = 64
+
+PEAKS_MAGIC = b'AUPK'
+
+HEADER = struct.Struct('<4sHIQH')
+
+LEVEL = struct.Struct('<IQQ')
+
+# (WAV format, bits per sample): (array/memoryview type code, numpy dtype).
+SAMPLE_FORMATS = {
+    (1, 8): ('B', '<u1'),
+    (1, 16): ('h', '<i2'),
+    (1, 32): ('i', '<i4'),
+    (3, 32): ('f', '<f4'),
+}
+
+
+def _to_int16(values, audio_format, bits):
+    """Scale peak values of a sample format to int16."""
+    if numpy is not None:
+        values = numpy.asarray(values)
+        if audio_format == 3:
+            return numpy.clip(numpy.rint(values.astype('<f8') * 32767), -32768, 32767).astype('<i2')
+        if bits == 8:
+            return ((values.astype('<i4') - 128) << 8).astype('<i2')
+        if bits == 32:
+            return (values >> 16).astype('<i2')
+        return values.astype('<i2')
+    if audio_format == 3:
+        return [max(-32768, min(32767, round(value * 32767))) for value in values]
+    if bits == 8:
+        return [(value - 128) << 8 for value in values]
+    if bits == 32:
+        return [value >> 16 for value in values]
+    return list(values)
+
+
+def _reduce(mins, maxs, group):
+    """Min of each group of mins and max of each group of maxs; the last group may be short."""
+    if numpy is not None:
+        full = len(mins) // group * group
+        low = mins[:full].reshape(-1, group).min(axis=1)
+        high = maxs[:full].reshape(-1, group).max(axis=1)
+        if full < len(mins):
+            low = numpy.append(low, mins[full:].min())
+            high = numpy.append(high, maxs[full:].max())
+        return low, high
+    return (
+        [min(mins[i:i + group]) for i in range(0, len(mins), group)],
+        [max(maxs[i:i + group]) for i in range(0, len(maxs), group)],
+    )
+
+
+def _chunk_peaks(samples, channels, audio_format, bits):
+    """
+    Return the int16 (min, max) pairs of every resolution for one chunk of
+    interleaved samples, as bytes.
+    """
+    group = PEAK_RESOLUTIONS[0] * channels
+    if numpy is not None:
+        full = len(samples) // group * group
+        block = samples[:full].reshape(-1, group)
+        mins, maxs = block.min(axis=1), block.max(axis=1)
+        if full < len(samples):
+            mins = numpy.append(mins, samples[full:].min())
+            maxs = numpy.append(maxs, samples[full:].max())
+    else:
+        mins = [min(samples[i:i + group]) for i in range(0, len(samples), group)]
+        maxs = [max(samples[i:i + group]) for i in range(0, len(samples), group)]
+
+    levels = []
+    for i, resolution in enumerate(PEAK_RESOLUTIONS):
+        if i:
+            mins, maxs = _reduce(mins, maxs, resolution // PEAK_RESOLUTIONS[i - 1])
+        low, high = _to_int16(mins, audio_format, bits), _to_int16(maxs, audio_format, bits)
+        if numpy is not None:
+            pairs = numpy.empty(2 * len(low), dtype='<i2')
+            pairs[0::2], pairs[1::2] = low, high
+            levels.append(pairs.tobytes())
+        else:
+            pairs = array('h', [0]) * (2 * len(low))
+            pairs[0::2], pairs[1::2] = array('h', low), array('h', high)
+            levels.append(pairs.tobytes())
+    return levels
+
+
+def write_peaks(path):
+    """
+    Write the peaks file of the WAV file at path, replacing any earlier
+    one. Returns its path. Raises ValueError if the file is not a PCM WAV
+    file in a supported sample format.
+    """
+    if any(high % low for low, high in zip(PEAK_RESOLUTIONS, PEAK_RESOLUTIONS[1:])):
+        raise ValueError('Each peak resolution must divide the next.')
+    if numpy is None and sys.byteorder != 'little':
+        raise ValueError('Peaks need numpy on big-endian machines.')
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if f.read(12)[8:] != b'WAVE':
+            raise ValueError('Not a WAV file.')
+        (audio_format, channels, sample_rate, _, block_align, bits), _, offset, length = wav_layout(f, size)
+        formats = SAMPLE_FORMATS.get((audio_format, bits))
+        if formats is None or block_align != channels * bits // 8 or not channels:
+            raise ValueError('Unsupported sample format.')
+        type_code, dtype = formats
+        frames = length // block_align
+
+        counts = [-(-frames // resolution) for resolution in PEAK_RESOLUTIONS]
+        offsets = []
+        position = HEADER.size + LEVEL.size * len(PEAK_RESOLUTIONS)
+        for count in counts:
+            offsets.append(position)
+            position += count * 4
+
+        peaks_path = path + PEAKS_SUFFIX
+        temporary = peaks_path + '.tmp'
+        with open(temporary, 'wb') as out:
+            out.write(HEADER.pack(PEAKS_MAGIC, channels, sample_rate, frames, len(PEAK_RESOLUTIONS)))
+            for resolution, count, level_offset in zip(PEAK_RESOLUTIONS, counts, offsets):
+                out.write(LEVEL.pack(resolution, count, level_offset))
+            out.truncate(position)
+            if frames:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    _write_levels(mapped, out, offset, frames, channels, block_align, type_code, dtype,
+                                  audio_format, bits, offsets)
+    os.replace(temporary, peaks_path)
+    return peaks_path
+
+
+def _write_levels(mapped, out, offset, frames, channels, block_align, type_code, dtype, audio_format, bits,
+                  offsets):
+    chunk_frames = PEAK_RESOLUTIONS[-1] * CHUNK_PEAKS
+    for first in range(0, frames, chunk_frames):
+        count = min(chunk_frames, frames - first)
+        start = offset + first * block_align
+        if numpy is not None:
+            samples = numpy.frombuffer(mapped, dtype=dtype, count=count * channels, offset=start)
+            levels = _chunk_peaks(samples, channels, audio_format, bits)
+            del samples
+        else:
+            with memoryview(mapped) as view, view[start:start + count * block_align] as raw, \
+                    raw.cast(type_code) as samples:
+                levels = _chunk_peaks(samples, channels, audio_format, bits)
+        for resolution, level_offset, data in zip(PEAK_RESOLUTIONS, offsets, levels):
+            out.seek(level_offset + first // resolution * 4)
+            out.write(data)
+        if hasattr(mmap, 'MADV_DONTNEED'):
+            page = start - start % mmap.PAGESIZE
+            mapped.madvise(mmap.MADV_DONTNEED, page, start + count * block_align - page)
+
+
+def read_levels(peaks_path):
+    """
+    Return (channels, sample rate, frames, {frames per peak: (peaks,
+    offset)}) from the header of a peaks file. Raises ValueError if it is
+    not one, or is truncated.
+    """
+    with open(peaks_path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size or header[:4] != PEAKS_MAGIC:
+            raise ValueError('Not a peaks file.')
+        _, channels, sample_rate, frames, count = HEADER.unpack(header)
+        levels = {}
+        for _ in range(count):
+            level = f.read(LEVEL.size)
+            if len(level) < LEVEL.size:
+                raise ValueError('Truncated peaks file.')
+            resolution, peaks, offset = LEVEL.unpack(level)
+            levels[resolution] = (peaks, offset)
+    return channels, sample_rate, frames, levels
+
+
+def peaks_response(request, peaks_path, resolution=None):
+    """
+    Serve one level of a peaks file: the one with the given number of
+    frames per peak, or the coarsest. Raises ValueError if there is no
+    such level.
+    """
+    channels, sample_rate, frames, levels = read_levels(peaks_path)
+    if resolution is None:
+        resolution = max(levels)
+    else:
+        resolution = int(resolution)
+    if resolution not in levels:
+        raise ValueError('No peaks at %d frames per peak.' % resolution)
+    peaks, offset = levels[resolution]
+
+    stat = os.stat(peaks_path)
+    etag = quote_etag('%x-%x-%d' % (stat.st_mtime_ns, stat.st_size, resolution))
+    last_modified = int(stat.st_mtime)
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = FileResponse(RangeFile(peaks_path, offset, offset + peaks * 4),
+                                content_type='application/octet-stream')
+        response['Content-Length'] = str(peaks * 4)
+        response['Peaks-Resolution'] = str(resolution)
+        response['Peaks-Sample-Rate'] = str(sample_rate)
+        response['Peaks-Frames'] = str(frames)
+    return set_validators(response, etag, last_modified)
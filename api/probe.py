@@ -0,0 +1,67 @@
+"""
+Audio duration probing on a process pool.
+
+probe_duration() runs api.audio_headers.safe_duration() in one of
+AUDIO_PROBE_WORKERS worker processes, so header parsing never holds the
+GIL of the process serving requests. The request thread waits on the
+result without holding the GIL, so other requests keep running. Workers
+are started with 'spawn', because forking a threaded server is unsafe.
+They only import the standard library parser, and the pool is created on
+first use and kept.
+
+With AUDIO_PROBE_WORKERS = 0 the parser runs in the calling thread, which
+suits tests and single-threaded deployments.
+"""
+from django.conf import settings
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from .audio_headers import safe_duration
+
+
+PROBE_WORKERS = getattr(settings, 'AUDIO_PROBE_WORKERS', os.cpu_count() or 1)
+
+PROBE_TIMEOUT = getattr(settings, 'AUDIO_PROBE_TIMEOUT', 5)
+
+_pool = None
+
+_pool_lock = threading.Lock()
+
+
+def probe_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(PROBE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False)
+
+
+def probe_duration(path):
+    """
+    Return the duration of the audio file at path in whole seconds, or
+    None if its format is not recognised or probing fails.
+    """
+    if not PROBE_WORKERS:
+        seconds = safe_duration(path)
+    else:
+        pool = probe_pool()
+        try:
+            seconds = pool.submit(safe_duration, path).result(timeout=PROBE_TIMEOUT)
+        except TimeoutError:
+            return None
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            return None
+    return None if seconds is None else round(seconds)
@@ -0,0 +1,45 @@
+"""
+Database router for the production profile in AudioServe/settings.py.
+
+Queries made while a read view (list, read, feed, search, stats, stream,
+peaks) is serving a request, inside read_only(), go to the read-only
+connection READ_DATABASE. Raw SQL picks its connection with
+router.db_for_read() to follow the same split. Everything else, including
+every write, goes to the writer connection, 'default'. Both aliases point
+at the same SQLite file; in WAL mode readers work from a snapshot and
+never wait for the writer.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+import contextvars
+from contextlib import contextmanager
+
+
+READ_DATABASE = getattr(settings, 'AUDIO_READ_DATABASE', 'reader')
+
+_reading = contextvars.ContextVar('audioserve_reading', default=False)
+
+
+@contextmanager
+def read_only():
+    """Route the ORM reads made inside this block to READ_DATABASE."""
+    token = _reading.set(True)
+    try:
+        yield
+    finally:
+        _reading.reset(token)
+
+
+class ReadWriteRouter:
+    def db_for_read(self, model, **hints):
+        return READ_DATABASE if _reading.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,86 @@
+"""
+Full-text search over all audio types, backed by the SQLite FTS5 table
+api_search. Each indexed item is one FTS row whose rowid encodes the item
+id and its type (id * 4 + type code), so the triggers created in migration
+0006 can update or delete it by rowid without a scan.
+"""
+from django.db import connection, connections, router
+
+import re
+
+from .models import Song
+
+
+SEARCH_TYPES = {'song': 1, 'podcast': 2, 'audiobook': 3}
+
+SEARCH_TYPE_NAMES = {code: name for name, code in SEARCH_TYPES.items()}
+
+# BM25 column weights: a match in the name/title counts more than a match
+# in the host, participants, author or narrator.
+TITLE_WEIGHT = 10.0
+PEOPLE_WEIGHT = 1.0
+
+INDEX_SQL = {
+    'song': "INSERT INTO api_search (rowid, title, people) SELECT id * 4 + 1, name, '' FROM api_song",
+    'podcast': (
+        "INSERT INTO api_search (rowid, title, people) "
+        "SELECT id * 4 + 2, name, host || ' ' || participants FROM api_podcast"
+    ),
+    'audiobook': (
+        "INSERT INTO api_search (rowid, title, people) "
+        "SELECT id * 4 + 3, title, author || ' ' || narrator FROM api_audiobook"
+    ),
+}
+
+REBUILD_SQL = (
+    ["DELETE FROM api_search"]
+    + list(INDEX_SQL.values())
+    + ["INSERT INTO api_search (api_search) VALUES ('optimize')"]
+)
+
+
+def match_expression(query):
+    """
+    Turn free text into an FTS5 query that matches every word as a prefix.
+    Returns None if the text contains no words.
+    """
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    return ' '.join('"%s"*' % word for word in words)
+
+
+def search(query, audioType=None, limit=50, offset=0):
+    """
+    Return a list of (audioType, id) pairs for the best matches, ordered by
+    BM25 rank. Raises ValueError if the query has no searchable words.
+    """
+    expression = match_expression(query)
+    if expression is None:
+        raise ValueError('Empty query.')
+    sql = 'SELECT rowid FROM api_search WHERE api_search MATCH %s'
+    params = [expression]
+    if audioType is not None:
+        sql += ' AND rowid %% 4 = %s'
+        params.append(SEARCH_TYPES[audioType])
+    sql += ' ORDER BY bm25(api_search, %s, %s) LIMIT %s OFFSET %s'
+    params += [TITLE_WEIGHT, PEOPLE_WEIGHT, limit, offset]
+    # The index has no model; route it like the tables it indexes.
+    with connections[router.db_for_read(Song)].cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(SEARCH_TYPE_NAMES[rowid % 4], rowid // 4) for rowid, in cursor.fetchall()]
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        for sql in REBUILD_SQL:
+            cursor.execute(sql)
+
+
+def index_range_sql(audioType):
+    """
+    SQL that indexes the items with first < id <= last, taking (first,
+    last) as parameters. Does what the insert trigger does, for many rows
+    in one statement.
+    """
+    return INDEX_SQL[audioType] + ' WHERE id > %s AND id <= %s'
@@ -0,0 +1,76 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+
+from .models import Audiobook, Podcast, Song
+
+
+encoder = DjangoJSONEncoder(separators=(',', ':'))
+
+# The fields of each type in a response, in output order.
+SCHEMAS = {
+    'song': ('id', 'name', 'duration'),
+    'podcast': ('id', 'name', 'duration', 'host', 'participants'),
+    'audiobook': ('id', 'title', 'duration', 'author', 'narrator'),
+}
+
+# Stored as JSON text; spliced into the output instead of decoded.
+JSON_TEXT_FIELDS = frozenset(['participants'])
+
+
+def _value_encoder(model, name):
+    if name in JSON_TEXT_FIELDS:
+        return str
+    field = model._meta.get_field(name)
+    if isinstance(field, models.IntegerField) and not field.null:
+        return str
+    if isinstance(field, models.CharField) and not field.null:
+        return encode_basestring_ascii
+    return encoder.encode
+
+
+@lru_cache(maxsize=None)
+def row_serializer(model, fields):
+    """
+    Return a function that encodes a values_list() row as a JSON object.
+    The row must start with fields, in order; trailing values are ignored.
+    The function's fields attribute is the projection to fetch, so callers
+    never build a model instance.
+    """
+    template = '{%s}' % ','.join('"%s":%%s' % name for name in fields)
+    encoders = tuple(_value_encoder(model, name) for name in fields)
+
+    def to_json(row):
+        return template % tuple([encode(value) for encode, value in zip(encoders, row)])
+
+    to_json.fields = fields
+    return to_json
+
+
+song_json = row_serializer(Song, SCHEMAS['song'])
+podcast_json = row_serializer(Podcast, SCHEMAS['podcast'])
+audiobook_json = row_serializer(Audiobook, SCHEMAS['audiobook'])
+
+
+def parse_fields(model, audioType, value):
+    """
+    Return the serializer for a ?fields= value, a comma separated subset
+    of the type's fields, or for all of them if value is None. Raises
+    ValueError on an unknown or empty field list.
+    """
+    if value is None:
+        return row_serializer(model, SCHEMAS[audioType])
+    fields = []
+    for name in value.split(','):
+        name = name.strip()
+        if name not in SCHEMAS[audioType]:
+            raise ValueError('Unknown field: %r.' % name)
+        if name not in fields:
+            fields.append(name)
+    return row_serializer(model, tuple(fields))
+
+
+def json_list(items):
+    return '[%s]' % ','.join(items)
@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+import threading
+from contextlib import contextmanager
+
+from .changes import audio_changed
+from .models import Song, Podcast, Audiobook
+
+
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_changes():
+    """
+    Collect the ids saved in this thread inside the block, by audio type,
+    instead of recording each save as it happens. The caller records them
+    with audio_changed once its transaction has committed.
+    """
+    changes = {}
+    _deferred.changes = changes
+    try:
+        yield changes
+    finally:
+        del _deferred.changes
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Podcast)
+@receiver(post_save, sender=Audiobook)
+def record_saved_item(sender, instance, **kwargs):
+    changes = getattr(_deferred, 'changes', None)
+    if changes is not None:
+        changes.setdefault(sender._meta.model_name, []).append(instance.pk)
+    else:
+        audio_changed(sender._meta.model_name, [instance.pk])
@@ -0,0 +1,106 @@
+"""
+Catalog statistics: per audio type, the number of items and their total
+duration, split into duration buckets for histograms.
+
+The counters live in api_audiostat and are moved by SQLite triggers on
+api_song, api_podcast and api_audiobook (migration 0008), in the same
+transaction as the write. Bucket i holds durations in
+[DURATION_BUCKETS[i - 1], DURATION_BUCKETS[i]) seconds; the last bucket is
+open ended. The triggers carry their own copy of these edges, so changing
+them needs a migration that re-creates the triggers, followed by
+reconcile_stats.
+"""
+from django.db import connections, router
+
+from .models import AudioStat
+
+
+DURATION_BUCKETS = [60, 180, 300, 600, 1200, 1800, 3600, 7200]
+
+STATS_TABLES = {'song': 'api_song', 'podcast': 'api_podcast', 'audiobook': 'api_audiobook'}
+
+
+def bucket_sql(column):
+    """SQL expression giving the bucket index of a duration column."""
+    cases = ' '.join('WHEN %s < %d THEN %d' % (column, edge, i) for i, edge in enumerate(DURATION_BUCKETS))
+    return 'CASE %s ELSE %d END' % (cases, len(DURATION_BUCKETS))
+
+
+def add_range_sql(audioType):
+    """
+    SQL that adds the items with first < id <= last to the counters, taking
+    (first, last) as parameters. Does what the insert trigger does, for
+    many rows in one statement.
+    """
+    return (
+        'INSERT INTO api_audiostat (audio_type, bucket, count, total_duration) '
+        "SELECT '%s', %s AS bucket, COUNT(*), SUM(duration) FROM %s WHERE id > %%s AND id <= %%s GROUP BY bucket "
+        'ON CONFLICT (audio_type, bucket) DO UPDATE SET '
+        'count = count + excluded.count, total_duration = total_duration + excluded.total_duration'
+    ) % (audioType, bucket_sql('duration'), STATS_TABLES[audioType])
+
+
+def catalog_stats():
+    """
+    Return {audioType: {'count', 'total_duration', 'histogram'}} from the
+    counters, in one query over at most (types x buckets) rows.
+    """
+    rows = {(stat.audio_type, stat.bucket): stat for stat in AudioStat.objects.all()}
+    result = {}
+    for audioType in STATS_TABLES:
+        histogram = []
+        for bucket in range(len(DURATION_BUCKETS) + 1):
+            stat = rows.get((audioType, bucket))
+            histogram.append({
+                'min': DURATION_BUCKETS[bucket - 1] if bucket else 0,
+                'max': DURATION_BUCKETS[bucket] if bucket < len(DURATION_BUCKETS) else None,
+                'count': stat.count if stat else 0,
+            })
+        stats = [rows[key] for key in rows if key[0] == audioType]
+        result[audioType] = {
+            'count': sum(stat.count for stat in stats),
+            'total_duration': sum(stat.total_duration for stat in stats),
+            'histogram': histogram,
+        }
+    return result
+
+
+def computed_stats():
+    """Count every table from scratch: {(audioType, bucket): (count, total_duration)}."""
+    counts = {}
+    with connections[router.db_for_read(AudioStat)].cursor() as cursor:
+        for audioType, table in STATS_TABLES.items():
+            cursor.execute(
+                'SELECT %s AS bucket, COUNT(*), COALESCE(SUM(duration), 0) FROM %s GROUP BY bucket'
+                % (bucket_sql('duration'), table)
+            )
+            for bucket, count, total_duration in cursor.fetchall():
+                counts[audioType, bucket] = (count, total_duration)
+    return counts
+
+
+def reconcile(dry_run=False):
+    """
+    Compare the counters with a full count of the tables and, unless
+    dry_run, replace them with it. Returns the drift as a list of
+    (audioType, bucket, (stored count, stored duration), (actual count,
+    actual duration)). Run it inside a transaction.
+    """
+    stored = {
+        (stat.audio_type, stat.bucket): (stat.count, stat.total_duration)
+        for stat in AudioStat.objects.all()
+    }
+    actual = computed_stats()
+    drift = []
+    for key in sorted(set(stored) | set(actual)):
+        before = stored.get(key, (0, 0))
+        after = actual.get(key, (0, 0))
+        if before != after:
+            drift.append(key + (before, after))
+    if not dry_run:
+        AudioStat.objects.all().delete()
+        AudioStat.objects.bulk_create([
+            AudioStat(audio_type=audioType, bucket=bucket, count=count, total_duration=total_duration)
+            for (audioType, bucket), (count, total_duration) in actual.items()
+        ])
+    return drift
@@ -0,0 +1,51 @@
+from django.conf import settings
+
+
+STREAM_CHUNK_SIZE = getattr(settings, 'AUDIO_STREAM_CHUNK_SIZE', 2000)
+
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def stream_rows(queryset, to_json, stream_format, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Yield the queryset as a JSON array or as NDJSON. Rows are fetched with a
+    server-side iterator and written out one chunk at a time, so memory use
+    stays flat however big the table is.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    if stream_format == 'ndjson':
+        yield from _ndjson_chunks(rows, to_json, chunk_size)
+    else:
+        yield from _array_chunks(rows, to_json, chunk_size)
+
+
+def _ndjson_chunks(rows, to_json, chunk_size):
+    buffer = []
+    for row in rows:
+        buffer.append(to_json(row))
+        if len(buffer) >= chunk_size:
+            buffer.append('')
+            yield '\n'.join(buffer)
+            buffer = []
+    if buffer:
+        buffer.append('')
+        yield '\n'.join(buffer)
+
+
+def _array_chunks(rows, to_json, chunk_size):
+    separator = '['
+    buffer = []
+    for row in rows:
+        buffer.append(separator)
+        buffer.append(to_json(row))
+        separator = ','
+        if len(buffer) >= 2 * chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if separator == '[':
+        buffer.append(separator)
+    buffer.append(']')
+    yield ''.join(buffer)
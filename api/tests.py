@@ -1,9 +1,95 @@
-from django.test import TestCase, Client
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncClient, AsyncRequestFactory, RequestFactory, TestCase, TransactionTestCase, Client, override_settings
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from django.urls import path
+from django.utils.module_loading import import_string
 
+import asyncio
+import gzip
+import itertools
 import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+import types
+import zlib
+from array import array
+from io import StringIO
+from unittest import mock
 
-from .models import Podcast, Song, Audiobook
+from .admission import Gate, TokenBuckets, gates
+from .async_views import as_async_view
+from .audio_corpus import KINDS, generate_corpus, wav_header, write_audio
+from .audio_headers import HEAD_SIZE, OGG_TAIL_SIZE, audio_duration
+from .bench import compare, run_benchmarks, seed
+from .bulk import parse_items
+from .cache import FileBasedLRUCache, LocMemLRUCache, cache_stats, invalidate, response_key, set_response
+from .compression import COMPRESSORS, GzipCompressor, choose_encoding, compress_stream
+from .feed import feed_sql
+from .files import AudioUploadHandler, parse_range
+from .filters import ORDERINGS, TEXT_FILTERS
+from .group_commit import GroupCommitWriter
+from .metrics import Histogram, QueryTimer, reset as reset_metrics
+from .models import AudioStat, AudioVersion, Podcast, Song, Audiobook, Participant
+from .pagination import encode_cursor, page_queryset
+from . import peaks, urls
+from .peaks import PEAK_RESOLUTIONS, read_levels, write_peaks
+from .probe import probe_duration
+from .routers import ReadWriteRouter, read_only
+from .serializers import podcast_json
+from .stats import computed_stats
+from .transfer import import_records, read_records
+from .views import CacheStatsView, CreateView, ReadView
+
+
+def async_urlconf():
+    """api/urls.py with the async views, as AudioServe/asgi.py serves it."""
+    urlconf = types.ModuleType('async_urls')
+    urlconf.urlpatterns = [
+        path(str(pattern.pattern), as_async_view(pattern.callback.view_class), name=pattern.name)
+        for pattern in urls.urlpatterns
+    ]
+    return urlconf
+
+
+def temporary_media(test):
+    """Point MEDIA_ROOT at a new directory for the duration of test. Returns its path."""
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    overrides = override_settings(MEDIA_ROOT=media.name, FILE_UPLOAD_TEMP_DIR=os.path.join(media.name, '.uploads'))
+    overrides.enable()
+    test.addCleanup(overrides.disable)
+    return media.name
+
+
+async def concurrent_asgi_requests(middleware, count=4, delay=0.3):
+    """
+    Send count requests at once through Django's ASGI request handling,
+    with the given middleware, to a view that takes delay seconds. Returns
+    their status codes and the time they took together.
+    """
+    get = CacheStatsView.get
+
+    def slow_get(self, request, *args, **kwargs):
+        time.sleep(delay)
+        return get(self, request, *args, **kwargs)
+
+    with override_settings(ROOT_URLCONF=async_urlconf(), MIDDLEWARE=middleware), \
+            mock.patch.object(CacheStatsView, 'get', slow_get), \
+            mock.patch.dict(gates, {'read': Gate(count, count, 10 * delay)}):
+        client = AsyncClient()
+        started = time.perf_counter()
+        responses = await asyncio.gather(*[client.get('/cache/stats/') for _ in range(count)])
+        return [response.status_code for response in responses], time.perf_counter() - started
 
 
 class PodcastModelsTest(TestCase):
@@ -192,3 +278,1562 @@ class HttpErrorTest(TestCase):
         self.assertEquals(response.status_code, 400)
         response = self.client.get('/create/song/')
         self.assertEquals(response.status_code, 400)
+
+
+class PaginationTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for i in range(5):
+            Song.objects.create(name='song%d' % i, duration=100 + i)
+
+    def test_keyset_pages(self):
+        response = self.client.get('/read/song/', {'limit': 2})
+        self.assertEquals(response.status_code, 200)
+        page = response.json()
+        self.assertEquals([s['name'] for s in page['results']], ['song0', 'song1'])
+        names = [s['name'] for s in page['results']]
+        while page['next']:
+            response = self.client.get('/read/song/', {'limit': 2, 'after': page['next']})
+            self.assertEquals(response.status_code, 200)
+            page = response.json()
+            names += [s['name'] for s in page['results']]
+        self.assertEquals(names, ['song%d' % i for i in range(5)])
+
+    def test_page_ignores_deleted_rows_before_cursor(self):
+        page = self.client.get('/read/song/', {'limit': 2}).json()
+        Song.objects.filter(name='song0').delete()
+        page = self.client.get('/read/song/', {'limit': 2, 'after': page['next']}).json()
+        self.assertEquals([s['name'] for s in page['results']], ['song2', 'song3'])
+
+    def test_invalid_parameters(self):
+        response = self.client.get('/read/song/', {'limit': 0})
+        self.assertEquals(response.status_code, 400)
+        response = self.client.get('/read/song/', {'limit': 'abc'})
+        self.assertEquals(response.status_code, 400)
+        response = self.client.get('/read/song/', {'after': 'not-a-cursor'})
+        self.assertEquals(response.status_code, 400)
+        for cursor in ([0, 10 ** 30], [0, True], [10 ** 30, 1]):
+            params = {'order_by': 'duration', 'limit': 1, 'after': encode_cursor(cursor)}
+            response = self.client.get('/read/song/', params)
+            self.assertEquals(response.status_code, 400)
+
+
+class StreamingReadTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        Podcast.objects.create(name='podcast1', duration=500, host='host1', participants=json.dumps(['a', 'b']))
+        Podcast.objects.create(name='podcast2', duration=600, host='host2', participants=json.dumps([]))
+
+    def test_stream_json_array(self):
+        response = self.client.get('/read/podcast/', {'stream': 'json'})
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        items = json.loads(b''.join(response.streaming_content))
+        self.assertEquals([p['name'] for p in items], ['podcast1', 'podcast2'])
+        self.assertEquals(items[0]['participants'], ['a', 'b'])
+
+    def test_stream_ndjson(self):
+        response = self.client.get('/read/podcast/', {'stream': 'ndjson'})
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEquals([json.loads(line)['host'] for line in lines], ['host1', 'host2'])
+
+    def test_stream_empty_table(self):
+        response = self.client.get('/read/song/', {'stream': 'json'})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(json.loads(b''.join(response.streaming_content)), [])
+
+    def test_stream_invalid_format(self):
+        response = self.client.get('/read/song/', {'stream': 'xml'})
+        self.assertEquals(response.status_code, 400)
+
+
+class BulkCreateTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_json_array(self):
+        songs = [{'name': 'song%d' % i, 'duration': 100 + i} for i in range(10)]
+        songs.append({'name': 'bad', 'duration': -1})
+        songs.append({'name': 'bad', 'wrongparam': 1})
+        response = self.client.post('/create/song/', json.dumps(songs), content_type='application/json')
+        self.assertEquals(response.status_code, 200)
+        result = response.json()
+        self.assertEquals(result['created'], 10)
+        self.assertEquals([e['index'] for e in result['errors']], [10, 11])
+        self.assertIn('duration', result['errors'][0]['errors'])
+        self.assertEquals(Song.objects.count(), 10)
+
+    def test_ndjson(self):
+        podcasts = [
+            {'name': 'podcast1', 'duration': 500, 'host': 'host1', 'participants': 'a, b'},
+            {'name': 'podcast2', 'duration': 500, 'host': 'host2', 'participants': ['c']},
+        ]
+        body = '\n'.join(json.dumps(p) for p in podcasts) + '\n'
+        response = self.client.post('/create/podcast/', body, content_type='application/x-ndjson')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['created'], 2)
+        self.assertEquals(json.loads(Podcast.objects.get(name='podcast1').participants), ['a', 'b'])
+
+    def test_all_invalid(self):
+        audiobooks = [{'title': 'audiobook1'}]
+        response = self.client.post('/create/audiobook/', json.dumps(audiobooks), content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(len(response.json()['errors']), 1)
+        response = self.client.post('/create/audiobook/', '{"title": 1', content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(Audiobook.objects.count(), 0)
+
+
+    def test_body_size_limit(self):
+        songs = json.dumps([{'name': 'song%d' % i, 'duration': 100} for i in range(10)])
+        ndjson = ''.join(json.dumps({'name': 'song%d' % i, 'duration': 100}) + '\n' for i in range(10))
+        with mock.patch('api.bulk.BULK_MAX_BYTES', min(len(songs), len(ndjson)) - 1):
+            for body, content_type in ((songs, 'application/json'), (ndjson, 'application/x-ndjson')):
+                response = self.client.post('/create/song/', body, content_type=content_type)
+                self.assertEquals(response.status_code, 413)
+            response = self.client.post('/update/song/', songs, content_type='application/json')
+            self.assertEquals(response.status_code, 413)
+            response = self.client.post('/delete/song/', json.dumps(list(range(10000))), content_type='application/json')
+            self.assertEquals(response.status_code, 413)
+            self.assertEquals(Song.objects.count(), 0)
+        with mock.patch('api.bulk.BULK_MAX_BYTES', len(songs)):
+            response = self.client.post('/create/song/', songs, content_type='application/json')
+            self.assertEquals(response.json()['created'], 10)
+
+
+class BulkUpdateDeleteTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.ids = [Podcast.objects.create(name='podcast%d' % i, duration=500, host='host', participants='[]').id
+                    for i in range(4)]
+
+    def test_bulk_update(self):
+        items = [
+            {'id': self.ids[0], 'name': 'renamed'},
+            {'id': self.ids[1], 'duration': 900, 'participants': 'a, b'},
+            {'id': self.ids[2], 'duration': 'abc'},
+            {'id': 9999, 'name': 'missing'},
+        ]
+        with self.assertNumQueries(6):
+            response = self.client.post('/update/podcast/', json.dumps(items), content_type='application/json')
+        self.assertEquals(response.status_code, 200)
+        result = response.json()
+        self.assertEquals(result['updated'], self.ids[:2])
+        self.assertEquals(result['missing'], [9999])
+        self.assertEquals(result['errors'][0]['index'], 2)
+        self.assertEquals(Podcast.objects.get(id=self.ids[0]).name, 'renamed')
+        self.assertEquals(Podcast.objects.get(id=self.ids[0]).duration, 500)
+        self.assertEquals(json.loads(Podcast.objects.get(id=self.ids[1]).participants), ['a', 'b'])
+
+    def test_bulk_delete(self):
+        ids = self.ids[:3] + [9999]
+        with self.assertNumQueries(5):
+            response = self.client.post('/delete/podcast/', json.dumps(ids), content_type='application/json')
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json(), {'deleted': self.ids[:3], 'missing': [9999]})
+        self.assertEquals(list(Podcast.objects.values_list('id', flat=True)), self.ids[3:])
+
+    def test_bulk_invalid(self):
+        response = self.client.post('/delete/podcast/', json.dumps(['a']), content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+        response = self.client.post('/update/podcast/', {'name': 'form'})
+        self.assertEquals(response.status_code, 400)
+
+    def test_boolean_ids_are_invalid(self):
+        Podcast.objects.filter(id=self.ids[0]).update(id=1)
+        response = self.client.post('/update/podcast/', json.dumps([{'id': True, 'name': 'renamed'}]),
+                                    content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(response.json()['errors'][0]['index'], 0)
+        response = self.client.post('/delete/podcast/', json.dumps([True]), content_type='application/json')
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(Podcast.objects.get(id=1).name, 'podcast0')
+
+
+class ReadCacheTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.podcast = Podcast.objects.create(name='podcast1', duration=500, host='host1', participants='["a"]')
+
+    def test_single_item_hit_and_invalidation(self):
+        url = '/read/podcast/%d/' % self.podcast.id
+        before = cache_stats()
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEquals(response.json()['name'], 'podcast1')
+        after = cache_stats()
+        self.assertEquals(after['hits'] - before['hits'], 1)
+        self.assertEquals(after['misses'] - before['misses'], 1)
+
+        self.client.post('/update/podcast/%d/' % self.podcast.id, {'name': 'renamed'})
+        self.assertEquals(self.client.get(url).json()['name'], 'renamed')
+        self.client.post('/delete/podcast/%d/' % self.podcast.id)
+        self.assertEquals(self.client.get(url).status_code, 400)
+
+    def test_field_subsets_are_cached_apart(self):
+        url = '/read/podcast/%d/' % self.podcast.id
+        for _ in range(2):
+            self.assertEquals(self.client.get(url + '?fields=id').json(), {'id': self.podcast.id})
+            self.assertEquals(self.client.get(url).json()['name'], 'podcast1')
+            self.assertEquals(self.client.get(url + '?fields=name').json(), {'name': 'podcast1'})
+
+    def test_list_invalidation(self):
+        self.assertEquals(len(self.client.get('/read/podcast/').json()), 1)
+        items = [{'name': 'podcast2', 'duration': 10, 'host': 'host2', 'participants': []}]
+        self.client.post('/create/podcast/', json.dumps(items), content_type='application/json')
+        self.assertEquals(len(self.client.get('/read/podcast/').json()), 2)
+        self.client.post('/delete/podcast/', json.dumps([self.podcast.id]), content_type='application/json')
+        self.assertEquals(len(self.client.get('/read/podcast/').json()), 1)
+
+    def test_lru_eviction(self):
+        lru = LocMemLRUCache('test-lru', {'OPTIONS': {'MAX_ENTRIES': 2}})
+        lru.clear()
+        evictions = cache_stats()['evictions']
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEquals(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEquals(cache_stats()['evictions'], evictions + 1)
+        self.assertEquals(set(self.client.get('/cache/stats/').json()), {'hits', 'misses', 'evictions'})
+
+    def test_file_cache_invalidates_every_process(self):
+        # Two worker processes, each with its own cache object on one directory.
+        with tempfile.TemporaryDirectory() as location:
+            workers = [FileBasedLRUCache(location, {}) for _ in range(2)]
+            with mock.patch('api.cache.get_cache', lambda: workers[0]):
+                key = response_key('podcast', self.podcast.id, '')
+                set_response(key, b'{}')
+            with mock.patch('api.cache.get_cache', lambda: workers[1]):
+                self.assertEquals(response_key('podcast', self.podcast.id, ''), key)
+                invalidate('podcast', [self.podcast.id])
+            with mock.patch('api.cache.get_cache', lambda: workers[0]):
+                self.assertNotEquals(response_key('podcast', self.podcast.id, ''), key)
+
+
+class ConditionalReadTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.song = Song.objects.create(name='song1', duration=100)
+
+    def test_list_etag(self):
+        response = self.client.get('/read/song/')
+        etag = response['ETag']
+        self.assertTrue(response.has_header('Last-Modified'))
+        response = self.client.get('/read/song/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        self.assertEquals(response.content, b'')
+
+        self.client.post('/create/song/', {'name': 'song2', 'duration': 200})
+        response = self.client.get('/read/song/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+        self.assertNotEquals(response['ETag'], etag)
+
+        etag = response['ETag']
+        self.client.post('/delete/song/%d/' % self.song.id)
+        response = self.client.get('/read/song/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+    def test_item_etag_and_last_modified(self):
+        url = '/read/song/%d/' % self.song.id
+        response = self.client.get(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEquals(response.status_code, 304)
+
+        Song.objects.create(name='other', duration=1)
+        self.assertEquals(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.client.post('/update/song/%d/' % self.song.id, {'duration': 300})
+        self.assertEquals(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class ParticipantIndexTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.podcast1 = Podcast.objects.create(name='podcast1', duration=500, host='host1', participants='["adam", "bob"]')
+        self.podcast2 = Podcast.objects.create(name='podcast2', duration=500, host='host2', participants='["bob"]')
+
+    def test_index_follows_writes(self):
+        self.assertEquals(
+            list(Participant.objects.filter(podcast=self.podcast1).order_by('position').values_list('name', flat=True)),
+            ['adam', 'bob'],
+        )
+        self.client.post('/update/podcast/%d/' % self.podcast1.id, {'participants': 'carl'})
+        self.assertEquals(list(Participant.objects.filter(podcast=self.podcast1).values_list('name', flat=True)), ['carl'])
+        items = [{'name': 'podcast3', 'duration': 10, 'host': 'host3', 'participants': ['carl']}]
+        self.client.post('/create/podcast/', json.dumps(items), content_type='application/json')
+        self.assertEquals(Participant.objects.filter(name='carl').count(), 2)
+        self.client.post('/delete/podcast/', json.dumps([self.podcast1.id]), content_type='application/json')
+        self.assertEquals(Participant.objects.filter(podcast_id=self.podcast1.id).count(), 0)
+
+    def test_participant_lookup(self):
+        response = self.client.get('/read/podcast/', {'participant': 'bob'})
+        self.assertEquals([p['name'] for p in response.json()], ['podcast1', 'podcast2'])
+        response = self.client.get('/read/podcast/', {'participant': 'adam', 'limit': 10})
+        self.assertEquals([p['participants'] for p in response.json()['results']], [['adam', 'bob']])
+        response = self.client.get('/read/podcast/', {'participant': 'nobody'})
+        self.assertEquals(response.json(), [])
+
+    def test_lookup_uses_index(self):
+        podcasts = Participant.objects.filter(name='bob').values('podcast_id')
+        plan = Podcast.objects.filter(id__in=podcasts).explain()
+        self.assertIn('participant_name_idx', plan)
+        self.assertNotIn('SCAN api_podcast', plan)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.song = Song.objects.create(name='Blue Monday', duration=100)
+        Podcast.objects.create(name='Tech Talk', duration=500, host='Bluebell', participants='["adam"]')
+        Audiobook.objects.create(title='Moby Dick', duration=1000, author='Melville', narrator='Blue')
+
+    def search(self, **params):
+        response = self.client.get('/search/', params)
+        self.assertEquals(response.status_code, 200)
+        return response.json()
+
+    def test_prefix_and_ranking(self):
+        results = self.search(q='blu')['results']
+        self.assertEquals(len(results), 3)
+        self.assertEquals((results[0]['type'], results[0]['name']), ('song', 'Blue Monday'))
+        self.assertEquals([r['type'] for r in self.search(q='adam')['results']], ['podcast'])
+        self.assertEquals(self.search(q='blue', type='audiobook')['results'][0]['title'], 'Moby Dick')
+
+    def test_index_follows_writes(self):
+        self.client.post('/update/song/%d/' % self.song.id, {'name': 'Red Monday'})
+        self.assertEquals(self.search(q='red')['results'][0]['id'], self.song.id)
+        self.client.post('/delete/song/%d/' % self.song.id)
+        self.assertEquals(self.search(q='monday')['results'], [])
+
+    def test_pagination(self):
+        page = self.search(q='blu', limit=2)
+        self.assertEquals(len(page['results']), 2)
+        page = self.search(q='blu', limit=2, after=page['next'])
+        self.assertEquals(len(page['results']), 1)
+        self.assertIsNone(page['next'])
+
+    def test_invalid_queries(self):
+        self.assertEquals(self.client.get('/search/', {'q': '***'}).status_code, 400)
+        self.assertEquals(self.client.get('/search/', {'q': 'blue', 'type': 'abc'}).status_code, 400)
+        for cursor in ([10 ** 30], [-1], [True], ['1']):
+            response = self.client.get('/search/', {'q': 'blue', 'after': encode_cursor(cursor)})
+            self.assertEquals(response.status_code, 400)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM api_search')
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEquals(len(self.search(q='blu')['results']), 3)
+
+
+class AsyncViewTest(TransactionTestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    async def test_crud_on_db_pool(self):
+        create = as_async_view(CreateView)
+        request = self.factory.post(
+            '/create/song/', 'name=song1&duration=100', content_type='application/x-www-form-urlencoded'
+        )
+        response = await create(request, audioType='song')
+        self.assertEquals(response.status_code, 200)
+
+        read = as_async_view(ReadView)
+        response = await read(self.factory.get('/read/song/'), audioType='song')
+        self.assertEquals([s['name'] for s in json.loads(response.content)], ['song1'])
+
+        response = await read(self.factory.get('/read/song/?stream=ndjson'), audioType='song')
+        self.assertEquals(response['Content-Type'], 'application/x-ndjson')
+        self.assertEquals(json.loads(b''.join(response.streaming_content))['name'], 'song1')
+
+    async def test_queries_are_timed_on_db_pool(self):
+        # A missing item is never cached, so it always queries.
+        request = self.factory.get('/read/song/999/')
+        request.query_timer = QueryTimer()
+        await as_async_view(ReadView)(request, audioType='song', audioFileID=999)
+        self.assertGreater(request.query_timer.count, 0)
+
+    async def test_queries_are_timed_through_asgi(self):
+        with override_settings(ROOT_URLCONF=async_urlconf()):
+            response = await AsyncClient().get('/read/song/999/')
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"$')
+
+    async def test_compression_through_asgi(self):
+        await sync_to_async(Song.objects.bulk_create)([Song(name='song%d' % i, duration=i) for i in range(100)])
+        with override_settings(ROOT_URLCONF=async_urlconf()):
+            client = AsyncClient()
+            for params in ({}, {'stream': 'ndjson'}):
+                plain = await client.get('/read/song/', params)
+                plain = b''.join(plain.streaming_content) if plain.streaming else plain.content
+                # AsyncClient takes headers by their ASGI names.
+                response = await client.get('/read/song/', params, **{'accept-encoding': 'gzip'})
+                self.assertEquals(response['Content-Encoding'], 'gzip')
+                content = b''.join(response.streaming_content) if response.streaming else response.content
+                self.assertEquals(gzip.decompress(content), plain)
+
+    async def test_requests_overlap_through_every_middleware(self):
+        for name in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(name), 'async_capable', False), name)
+        statuses, elapsed = await concurrent_asgi_requests(settings.MIDDLEWARE, count=4, delay=0.3)
+        self.assertEquals(statuses, [200] * 4)
+        self.assertLess(elapsed, 0.6)
+
+    async def test_runs_outside_event_loop_thread(self):
+        threads = set()
+        view = as_async_view(CacheStatsView)
+        original = CacheStatsView.get
+
+        def get(self, request, *args, **kwargs):
+            threads.add(threading.current_thread().name)
+            return original(self, request, *args, **kwargs)
+
+        with mock.patch.object(CacheStatsView, 'get', get):
+            await asyncio.gather(*[view(self.factory.get('/cache/stats/')) for _ in range(8)])
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith('audioserve-db') for name in threads))
+
+
+class ProductionDatabaseTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, 'db.sqlite3')
+        self.connections = ConnectionHandler({
+            'default': {
+                'ENGINE': 'api.backends.sqlite3',
+                'NAME': path,
+                'PRAGMAS': settings.AUDIO_SQLITE_PRAGMAS,
+                'TRANSACTION_MODE': 'IMMEDIATE',
+            },
+            'reader': {
+                'ENGINE': 'api.backends.sqlite3',
+                'NAME': path,
+                'PRAGMAS': dict(settings.AUDIO_SQLITE_PRAGMAS, query_only='ON'),
+            },
+        })
+
+    def tearDown(self):
+        self.connections.close_all()
+        self.tmp.cleanup()
+
+    def pragma(self, alias, name):
+        with self.connections[alias].cursor() as cursor:
+            cursor.execute('PRAGMA %s' % name)
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        self.assertEquals(self.pragma('default', 'journal_mode'), 'wal')
+        self.assertEquals(self.pragma('default', 'synchronous'), 1)
+        self.assertEquals(self.pragma('default', 'busy_timeout'), 5000)
+        self.assertEquals(self.pragma('reader', 'query_only'), 1)
+
+    def test_reader_is_read_only_and_not_blocked_by_writer(self):
+        writer = self.connections['default']
+        with writer.cursor() as cursor:
+            cursor.execute('CREATE TABLE t (x integer)')
+        writer.set_autocommit(True)
+        writer._start_transaction_under_autocommit()
+        with writer.cursor() as cursor:
+            cursor.execute('INSERT INTO t VALUES (1)')
+        # The write lock is held, yet the reader sees the last commit.
+        with self.connections['reader'].cursor() as cursor:
+            cursor.execute('SELECT count(*) FROM t')
+            self.assertEquals(cursor.fetchone()[0], 0)
+            with self.assertRaises(OperationalError):
+                cursor.execute('INSERT INTO t VALUES (2)')
+        with writer.cursor() as cursor:
+            cursor.execute('COMMIT')
+
+    def test_router(self):
+        router = ReadWriteRouter()
+        self.assertEquals(router.db_for_read(Song), 'default')
+        with read_only():
+            self.assertEquals(router.db_for_read(Song), 'reader')
+            self.assertEquals(router.db_for_write(Song), 'default')
+        self.assertEquals(router.db_for_read(Song), 'default')
+        self.assertFalse(router.allow_migrate('reader', 'api'))
+        self.assertTrue(router.allow_migrate('default', 'api'))
+
+    def test_read_view_reads_from_reader(self):
+        databases = []
+
+        def read_item(view, audioType, audioFileID, to_json):
+            databases.append(ReadWriteRouter().db_for_read(Song))
+            return '{}'
+
+        with mock.patch.object(ReadView, 'read_item', read_item):
+            self.client.get('/read/song/1/')
+        self.client.post('/create/song/', {'name': 'song1', 'duration': 100})
+        self.assertEquals(databases, ['reader'])
+        self.assertEquals(ReadWriteRouter().db_for_read(Song), 'default')
+
+    def test_search_and_stats_read_from_reader(self):
+        databases = []
+        db_for_read = ReadWriteRouter().db_for_read
+
+        def record(model, **hints):
+            databases.append(db_for_read(model, **hints))
+            return 'default'
+
+        with mock.patch('django.db.router.db_for_read', record):
+            self.client.get('/search/', {'q': 'song'})
+            self.client.get('/stats/')
+            computed_stats()
+        self.assertTrue(databases)
+        # reconcile() counts the tables in its write transaction.
+        self.assertEquals(databases[-1], 'default')
+        self.assertEquals(set(databases[:-1]), {'reader'})
+
+
+class GroupCommitTest(TransactionTestCase):
+    def setUp(self):
+        self.writer = GroupCommitWriter(max_items=8, max_delay=0.2)
+        self.batches = []
+        commit = self.writer._commit
+
+        def record(batch):
+            self.batches.append(len(batch))
+            commit(batch)
+
+        self.writer._commit = record
+
+    def test_concurrent_creates_share_a_commit(self):
+        statuses = []
+
+        def create(i):
+            statuses.append(Client().post('/create/song/', {'name': 'song%d' % i, 'duration': 100}).status_code)
+            connections.close_all()
+
+        # Group commit is on from startup in production, which lets as many
+        # writes through admission control as fit in a batch.
+        with mock.patch('api.group_commit.GROUP_COMMIT', True), mock.patch('api.group_commit.writer', self.writer), \
+                mock.patch.dict(gates, {'write': Gate(8, 32, 1)}):
+            threads = [threading.Thread(target=create, args=(i,)) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEquals(statuses, [200] * 8)
+        self.assertEquals(Song.objects.count(), 8)
+        self.assertEquals(sum(self.batches), 8)
+        self.assertLess(len(self.batches), 8)
+        self.assertEquals(AudioVersion.objects.get(audio_type='song').version, len(self.batches))
+
+    def test_each_request_gets_its_own_result(self):
+        good = self.writer.submit(Song(name='good', duration=100))
+        bad = self.writer.submit(Song(name='bad', duration=-1))
+        self.assertEquals(Song.objects.get(id=good.result()).name, 'good')
+        with self.assertRaises(IntegrityError):
+            bad.result()
+        self.assertEquals(self.batches, [2])
+        self.assertEquals(Song.objects.count(), 1)
+
+
+class ListFilterTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        for i, name in enumerate(['blue', 'blues', 'bluegrass', 'red', 'Blue']):
+            Song.objects.create(name=name, duration=100 * (i + 1))
+
+    def names(self, params):
+        response = self.client.get('/read/song/', params)
+        self.assertEquals(response.status_code, 200)
+        return [s['name'] for s in response.json()]
+
+    def test_filters(self):
+        self.assertEquals(self.names({'min_duration': 200, 'max_duration': 400}), ['blues', 'bluegrass', 'red'])
+        self.assertEquals(self.names({'name': 'blue'}), ['blue'])
+        self.assertEquals(sorted(self.names({'name_prefix': 'blue'})), ['blue', 'bluegrass', 'blues'])
+        self.assertEquals(self.names({'name_prefix': 'blue', 'min_duration': 300}), ['bluegrass'])
+        self.assertEquals(len(self.names({'uploaded_after': '2000-01-01'})), 5)
+        self.assertEquals(self.names({'uploaded_before': '2000-01-01T00:00:00Z'}), [])
+
+    def test_order_by(self):
+        self.assertEquals(self.names({'order_by': '-duration'}), ['Blue', 'red', 'bluegrass', 'blues', 'blue'])
+        page = self.client.get('/read/song/', {'order_by': '-duration', 'limit': 2}).json()
+        names = [s['name'] for s in page['results']]
+        while page['next']:
+            page = self.client.get('/read/song/', {'order_by': '-duration', 'limit': 2, 'after': page['next']}).json()
+            names += [s['name'] for s in page['results']]
+        self.assertEquals(names, ['Blue', 'red', 'bluegrass', 'blues', 'blue'])
+
+    def test_invalid_parameters(self):
+        for params in [{'min_duration': 'x'}, {'max_duration': -1}, {'min_duration': 10 ** 20},
+                       {'max_duration': 2 ** 63}, {'uploaded_after': 'yesterday'},
+                       {'order_by': 'name'}, {'order_by': 'name', 'limit': 2}]:
+            self.assertEquals(self.client.get('/read/song/', params).status_code, 400)
+
+    def test_every_filter_combination_uses_an_index(self):
+        filters = {
+            'duration': {'min_duration': 60, 'max_duration': 600},
+            'uploaded': {'uploaded_after': '2020-01-01', 'uploaded_before': '2030-01-01'},
+        }
+        factory = RequestFactory()
+        view = ReadView()
+        for audioType, fields in TEXT_FILTERS.items():
+            options = dict(filters)
+            for field in fields:
+                options[field] = {field: 'x'}
+                options[field + '_prefix'] = {field + '_prefix': 'x'}
+            for size in range(len(options) + 1):
+                for names in itertools.combinations(options, size):
+                    params = {}
+                    for name in names:
+                        params.update(options[name])
+                    for ordering in ORDERINGS:
+                        value = 100 if 'duration' in ordering else '2021-01-01T00:00:00+00:00'
+                        queryset = view.list_queryset(audioType, factory.get('/', params))
+                        for after in (None, encode_cursor([value, 1])):
+                            plan = page_queryset(queryset, 50, after, ordering).explain()
+                            self.assertIsNone(
+                                re.search(r'SCAN api_%s$' % audioType, plan, re.MULTILINE),
+                                '%s %s %s:\n%s' % (audioType, params, ordering, plan),
+                            )
+
+
+class FeedTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        Song.objects.create(name='song1', duration=100)
+        Podcast.objects.create(name='podcast1', duration=200, host='host', participants='[]')
+        Audiobook.objects.create(title='book1', author='author', narrator='narrator', duration=300)
+        Song.objects.create(name='song2', duration=400)
+
+    def test_latest_first_across_types(self):
+        response = self.client.get('/read/all/')
+        self.assertEquals(response.status_code, 200)
+        page = response.json()
+        self.assertEquals(
+            [(item['type'], item['name']) for item in page['results']],
+            [('song', 'song2'), ('audiobook', 'book1'), ('podcast', 'podcast1'), ('song', 'song1')],
+        )
+        self.assertEquals(set(page['results'][0]), {'type', 'id', 'name', 'duration', 'uploaded_time'})
+        self.assertIsNone(page['next'])
+
+    def test_keyset_pages(self):
+        # Same uploaded_time everywhere, so the pages are decided by type and id.
+        for model in (Song, Podcast, Audiobook):
+            model.objects.update(uploaded_time=Song.objects.get(name='song1').uploaded_time)
+        names = []
+        page = self.client.get('/read/all/', {'limit': 1}).json()
+        names += [item['name'] for item in page['results']]
+        while page['next']:
+            page = self.client.get('/read/all/', {'limit': 1, 'after': page['next']}).json()
+            names += [item['name'] for item in page['results']]
+        self.assertEquals(names, ['book1', 'podcast1', 'song2', 'song1'])
+
+    def test_invalid_parameters(self):
+        self.assertEquals(self.client.get('/read/all/', {'limit': 0}).status_code, 400)
+        self.assertEquals(self.client.get('/read/all/', {'after': 'not-a-cursor'}).status_code, 400)
+        after = encode_cursor(['2021-01-01T00:00:00+00:00', 1, 10 ** 30])
+        self.assertEquals(self.client.get('/read/all/', {'after': after}).status_code, 400)
+
+    def test_branches_use_uploaded_time_indexes(self):
+        for after in (None, ('2021-01-01 00:00:00', 2, 10)):
+            sql, params = feed_sql(50, after)
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+            for audioType in ('song', 'podcast', 'audiobook'):
+                self.assertIn('api_%s USING INDEX %s_uploaded_idx' % (audioType, audioType), plan)
+                self.assertIsNone(re.search(r'SCAN api_%s$' % audioType, plan, re.MULTILINE), plan)
+
+
+class CatalogStatsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def song_stats(self):
+        response = self.client.get('/stats/')
+        self.assertEquals(response.status_code, 200)
+        return response.json()['song']
+
+    def test_every_write_path_updates_stats(self):
+        self.client.post('/create/song/', {'name': 'song1', 'duration': 30})
+        self.client.post('/create/song/', json.dumps([{'name': 'song2', 'duration': 90}] * 2),
+                         content_type='application/json')
+        stats = self.song_stats()
+        self.assertEquals((stats['count'], stats['total_duration']), (3, 210))
+        self.assertEquals([b['count'] for b in stats['histogram'][:3]], [1, 2, 0])
+        self.assertEquals(stats['histogram'][0], {'min': 0, 'max': 60, 'count': 1})
+        self.assertIsNone(stats['histogram'][-1]['max'])
+
+        song1 = Song.objects.get(name='song1')
+        self.client.post('/update/song/%d/' % song1.id, {'duration': 8000})
+        ids = list(Song.objects.filter(name='song2').values_list('id', flat=True))
+        self.client.post('/update/song/', json.dumps([{'id': ids[0], 'duration': 100}]),
+                         content_type='application/json')
+        self.client.post('/delete/song/', json.dumps([ids[1]]), content_type='application/json')
+        stats = self.song_stats()
+        self.assertEquals((stats['count'], stats['total_duration']), (2, 8100))
+        self.assertEquals(stats['histogram'][-1]['count'], 1)
+
+        self.client.post('/delete/song/%d/' % song1.id)
+        self.assertEquals(self.song_stats()['count'], 1)
+
+    def test_stats_read_is_one_query(self):
+        Song.objects.create(name='song1', duration=30)
+        with self.assertNumQueries(1):
+            self.client.get('/stats/')
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        Song.objects.create(name='song1', duration=30)
+        AudioStat.objects.filter(audio_type='song', bucket=0).update(count=5)
+        out = StringIO()
+        call_command('reconcile_stats', '--dry-run', stdout=out)
+        self.assertIn('song bucket 0: count 5 -> 1', out.getvalue())
+        self.assertEquals(self.song_stats()['count'], 5)
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('1 counters drifted and were rebuilt', out.getvalue())
+        self.assertEquals(self.song_stats()['count'], 1)
+        out = StringIO()
+        call_command('reconcile_stats', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+
+class BenchTest(TestCase):
+    def test_every_route_is_benchmarked(self):
+        from .urls import urlpatterns
+        names = set()
+        request = Client.request
+
+        def record(client, **kwargs):
+            response = request(client, **kwargs)
+            names.add(response.resolver_match.url_name)
+            return response
+
+        ids = seed(30)
+        self.assertEquals(Song.objects.count(), 30)
+        with mock.patch.object(Client, 'request', record):
+            results = run_benchmarks(ids, 2)
+        self.assertEquals({name: result['errors'] for name, result in results.items() if result['errors']}, {})
+        self.assertEquals(names, {pattern.name for pattern in urlpatterns})
+        self.assertEquals(set(results['read song']), {'requests', 'errors', 'throughput', 'p50_ms', 'p95_ms', 'p99_ms'})
+
+    def test_compare(self):
+        baseline = {'read song': {'p95_ms': 10.0, 'throughput': 100.0}}
+        self.assertEquals(compare({'read song': {'p95_ms': 11.0, 'throughput': 95.0}}, baseline, 0.2), [])
+        self.assertEquals(
+            compare({'read song': {'p95_ms': 13.0, 'throughput': 70.0}, 'new': {}}, baseline, 0.2),
+            [('read song', 'p95_ms', 10.0, 13.0), ('read song', 'throughput', 100.0, 70.0)],
+        )
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        reset_metrics()
+        self.song = Song.objects.create(name='song1', duration=100)
+
+    def test_server_timing(self):
+        response = self.client.get('/read/song/%d/' % self.song.id)
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"$')
+        # Served from the cache: no queries.
+        response = self.client.get('/read/song/%d/' % self.song.id)
+        self.assertRegex(response['Server-Timing'], r'desc="0 queries"$')
+
+    def test_metrics_endpoint(self):
+        self.client.get('/read/song/%d/' % self.song.id)
+        self.client.get('/read/song/')
+        self.client.get('/read/nothing/')
+        self.client.get('/no/such/route/')
+        response = self.client.get('/metrics/')
+        self.assertEquals(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('# TYPE audioserve_request_duration_seconds histogram', text)
+        self.assertIn('audioserve_request_duration_seconds_count{route="read"} 1', text)
+        self.assertIn('audioserve_db_queries_count{route="list"} 2', text)
+        self.assertIn('audioserve_response_size_bytes_bucket{route="read",le="+Inf"} 1', text)
+        self.assertIn('audioserve_requests_total{route="list",status="400"} 1', text)
+        self.assertIn('audioserve_requests_total{route="unmatched",status="400"} 1', text)
+        self.assertIn('audioserve_cache_hits_total', text)
+
+    def test_histogram(self):
+        histogram = Histogram([1, 5])
+        for value in (0, 1, 3, 10):
+            histogram.observe(value)
+        self.assertEquals(list(histogram.samples()), [(1, 2), (5, 3), ('+Inf', 4)])
+        self.assertEquals(histogram.sum, 14)
+
+    async def test_asgi_requests_overlap(self):
+        # Sync-only middleware would run the whole chain, views included, in
+        # Django's single thread_sensitive thread.
+        statuses, elapsed = await concurrent_asgi_requests(['api.metrics.MetricsMiddleware'], count=4, delay=0.3)
+        self.assertEquals(statuses, [200] * 4)
+        self.assertLess(elapsed, 0.6)
+
+
+class ImportExportTest(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def triggers(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' ORDER BY name")
+            return [name for name, in cursor.fetchall()]
+
+    def test_import_csv(self):
+        triggers = self.triggers()
+        path = self.write('podcasts.csv', (
+            'name,duration,host,participants\n'
+            'pod1,100,host1,"[""adam"", ""bob""]"\n'
+            'pod2,-5,host2,carl\n'
+            'pod3,200,host3,"dennis, erin"\n'
+        ))
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_audio', 'podcast', path, stdout=stdout, stderr=stderr)
+        self.assertIn('Imported 2 podcasts', stdout.getvalue())
+        self.assertIn('record 2: {"duration"', stderr.getvalue())
+        self.assertEquals(
+            list(Podcast.objects.order_by('id').values_list('name', 'participants')),
+            [('pod1', '["adam", "bob"]'), ('pod3', '["dennis", "erin"]')],
+        )
+        # The suspended triggers are back, and their work was done.
+        self.assertEquals(self.triggers(), triggers)
+        self.assertEquals(Participant.objects.filter(name='erin').count(), 1)
+        self.assertEquals(len(Client().get('/search/', {'q': 'pod3'}).json()['results']), 1)
+        out = StringIO()
+        call_command('reconcile_stats', '--dry-run', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+    def test_import_after_deleting_the_highest_id(self):
+        songs = [Song.objects.create(name='song%d' % i, duration=100) for i in range(10)]
+        top = songs[-1].id
+        songs[-1].delete()
+        path = self.write('songs.ndjson', ''.join(
+            json.dumps({'name': 'imported%d' % i, 'duration': 100}) + '\n' for i in range(5)
+        ))
+        call_command('import_audio', 'song', path, stdout=StringIO(), stderr=StringIO())
+        ids = list(Song.objects.filter(name__startswith='imported').order_by('id').values_list('id', flat=True))
+        self.assertEquals(ids, list(range(top + 1, top + 6)))
+        self.assertEquals(Client().get('/stats/').json()['song']['count'], Song.objects.count())
+        self.assertEquals(len(Client().get('/search/', {'q': 'imported4'}).json()['results']), 1)
+        out = StringIO()
+        call_command('reconcile_stats', '--dry-run', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+    def test_round_trip(self):
+        Podcast.objects.create(name='pod1', duration=100, host='host', participants='["adam"]')
+        Podcast.objects.create(name='pod2', duration=200, host='host', participants='["bob", "carl"]')
+        expected = list(Podcast.objects.order_by('id').values_list('name', 'duration', 'host', 'participants'))
+        for fmt in ('csv', 'ndjson'):
+            path = os.path.join(self.tmp.name, 'podcasts.' + fmt)
+            call_command('export_audio', 'podcast', path, stderr=StringIO())
+            Podcast.objects.all().delete()
+            call_command('import_audio', 'podcast', path, stdout=StringIO(), stderr=StringIO())
+            self.assertEquals(
+                list(Podcast.objects.order_by('id').values_list('name', 'duration', 'host', 'participants')),
+                expected,
+            )
+
+    def test_export_csv(self):
+        song = Song.objects.create(name='song, one', duration=100)
+        out = StringIO()
+        call_command('export_audio', 'song', '--format', 'csv', stdout=out, stderr=StringIO())
+        self.assertEquals(out.getvalue(), 'id,name,duration\r\n%d,"song, one",100\r\n' % song.id)
+
+    def test_resume(self):
+        path = self.write('songs.ndjson', ''.join(
+            json.dumps({'name': 'song%d' % i, 'duration': 100}) + '\n' for i in range(5)
+        ))
+
+        def interrupted(records):
+            for i, record in enumerate(records):
+                if i == 3:
+                    raise KeyboardInterrupt
+                yield record
+
+        with open(path) as f:
+            with self.assertRaises(KeyboardInterrupt):
+                import_records('song', interrupted(read_records(f, 'ndjson')), 'test', batch_size=2)
+        self.assertEquals(Song.objects.count(), 2)
+        with open(path) as f:
+            self.assertEquals(import_records('song', read_records(f, 'ndjson'), 'test', resume=True), (5, 3, 0))
+        self.assertEquals(list(Song.objects.order_by('id').values_list('name', flat=True)),
+                          ['song%d' % i for i in range(5)])
+
+
+class SerializerTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_row_serializer(self):
+        row = (1, 'say "hi" \\ caf\xe9\n', 60, 'host', '["adam", "b\\"ob"]')
+        self.assertEquals(json.loads(podcast_json(row)), {
+            'id': 1, 'name': 'say "hi" \\ caf\xe9\n', 'duration': 60, 'host': 'host',
+            'participants': ['adam', 'b"ob'],
+        })
+        self.assertEquals(podcast_json(row + ('ignored',)), podcast_json(row))
+
+    def test_reads_build_no_instances(self):
+        podcast = Podcast.objects.create(name='pod1', duration=60, host='host', participants='["adam"]')
+        with mock.patch.object(Podcast, '__init__', side_effect=AssertionError):
+            item = self.client.get('/read/podcast/%d/' % podcast.id).json()
+            self.assertEquals(item['participants'], ['adam'])
+            self.assertEquals(self.client.get('/read/podcast/').json(), [item])
+            self.assertEquals(self.client.get('/read/podcast/', {'limit': 10}).json()['results'], [item])
+            response = self.client.get('/read/podcast/', {'stream': 'ndjson'})
+            self.assertEquals(json.loads(b''.join(response.streaming_content)), item)
+            results = self.client.get('/search/', {'q': 'pod1'}).json()['results']
+            self.assertEquals(results, [dict(item, type='podcast')])
+
+
+class CompressionTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        Song.objects.bulk_create([Song(name='song%d' % i, duration=i) for i in range(100)])
+
+    def test_list_is_compressed(self):
+        plain = self.client.get('/read/song/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertEquals(plain['Vary'], 'Accept-Encoding')
+        response = self.client.get('/read/song/', HTTP_ACCEPT_ENCODING='br;q=0.5, gzip')
+        self.assertEquals(response['Content-Encoding'], 'gzip')
+        self.assertEquals(response['Vary'], 'Accept-Encoding')
+        self.assertEquals(int(response['Content-Length']), len(response.content))
+        self.assertEquals(gzip.decompress(response.content), plain.content)
+        self.assertEquals(response['ETag'], 'W/' + plain['ETag'])
+        response = self.client.get('/read/song/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
+
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get('/read/song/%d/' % Song.objects.first().id, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEquals(response['Vary'], 'Accept-Encoding')
+
+    def test_stream_is_compressed(self):
+        plain = b''.join(self.client.get('/read/song/', {'stream': 'ndjson'}).streaming_content)
+        response = self.client.get('/read/song/', {'stream': 'ndjson'}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertTrue(response.streaming)
+        self.assertEquals(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEquals(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    async def test_asgi_requests_overlap(self):
+        statuses, elapsed = await concurrent_asgi_requests(['api.compression.CompressionMiddleware'], count=4, delay=0.3)
+        self.assertEquals(statuses, [200] * 4)
+        self.assertLess(elapsed, 0.6)
+
+    def test_every_chunk_is_flushed(self):
+        decompressor = zlib.decompressobj(31)
+        chunks = compress_stream(iter([b'{"id":1}\n', b'{"id":2}\n']), GzipCompressor(6))
+        self.assertEquals(decompressor.decompress(next(chunks)), b'{"id":1}\n')
+        self.assertEquals(decompressor.decompress(next(chunks)), b'{"id":2}\n')
+        decompressor.decompress(next(chunks))
+        self.assertTrue(decompressor.eof)
+
+    def test_choose_encoding(self):
+        self.assertEquals(choose_encoding('gzip, deflate'), 'gzip')
+        self.assertEquals(choose_encoding('*'), next(iter(COMPRESSORS)))
+        self.assertIsNone(choose_encoding('gzip;q=0, identity'))
+        self.assertIsNone(choose_encoding(''))
+
+
+class SparseFieldsTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.podcasts = [
+            Podcast.objects.create(name='pod%d' % i, duration=60, host='host', participants='["adam"]')
+            for i in range(3)
+        ]
+
+    def test_item(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/read/podcast/%d/' % self.podcasts[0].id, {'fields': 'name,id'})
+        self.assertEquals(response.json(), {'name': 'pod0', 'id': self.podcasts[0].id})
+        self.assertNotIn('participants', queries[-1]['sql'])
+
+    def test_list(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/read/podcast/', {'fields': 'participants'})
+        self.assertEquals(response.json(), [{'participants': ['adam']}] * 3)
+        self.assertNotIn('"name"', queries[-1]['sql'])
+        response = self.client.get('/read/podcast/', {'fields': 'name', 'stream': 'ndjson'})
+        self.assertEquals(b''.join(response.streaming_content), b'{"name":"pod0"}\n{"name":"pod1"}\n{"name":"pod2"}\n')
+
+    def test_page(self):
+        page = self.client.get('/read/podcast/', {'fields': 'name', 'limit': 2}).json()
+        self.assertEquals(page['results'], [{'name': 'pod0'}, {'name': 'pod1'}])
+        page = self.client.get('/read/podcast/', {'fields': 'name', 'limit': 2, 'after': page['next']}).json()
+        self.assertEquals(page, {'results': [{'name': 'pod2'}], 'next': None})
+
+    def test_invalid_fields(self):
+        for fields in ('', 'title', 'name,uploaded_time', 'name,'):
+            response = self.client.get('/read/podcast/', {'fields': fields})
+            self.assertEquals(response.status_code, 400)
+        response = self.client.get('/read/podcast/%d/' % self.podcasts[0].id, {'fields': 'title'})
+        self.assertEquals(response.status_code, 400)
+
+
+class AdmissionTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.song = Song.objects.create(name='song1', duration=100)
+
+    def test_gate(self):
+        gate = Gate(1, 1, 0.05)
+        self.assertTrue(gate.acquire())
+        self.assertFalse(gate.acquire())
+        self.assertEquals(gate.stats()['shed'], {'queue_full': 0, 'timeout': 1})
+
+        results = []
+        waiter = threading.Thread(target=lambda: results.append(gate.acquire()))
+        gate.max_wait = 5
+        waiter.start()
+        while not gate.stats()['waiting']:
+            time.sleep(0.001)
+        # The queue holds one request.
+        self.assertFalse(gate.acquire())
+        gate.release()
+        waiter.join()
+        self.assertEquals(results, [True])
+        stats = gate.stats()
+        self.assertEquals((stats['active'], stats['admitted'], stats['shed']['queue_full']), (1, 2, 1))
+
+    def test_token_buckets(self):
+        buckets = TokenBuckets(rate=1, burst=2, max_clients=1)
+        self.assertEquals((buckets.take('a'), buckets.take('a')), (0, 0))
+        self.assertAlmostEqual(buckets.take('a'), 1, places=1)
+        self.assertEquals(buckets.take('b'), 0)
+        # 'a' was evicted and starts over with a full bucket.
+        self.assertEquals(buckets.take('a'), 0)
+        self.assertEquals(buckets.limited, 1)
+
+    def test_overloaded_writes_are_shed(self):
+        with mock.patch.dict(gates, {'write': Gate(0, 0, 0.25)}):
+            response = self.client.post('/create/song/', {'name': 'song2', 'duration': 100})
+            self.assertEquals((response.status_code, response['Retry-After']), (503, '1'))
+            self.assertEquals(self.client.get('/read/song/%d/' % self.song.id).status_code, 200)
+            metrics = self.client.get('/metrics/').content.decode()
+        self.assertIn('audioserve_admission_shed_total{gate="write",reason="queue_full"} 1', metrics)
+        self.assertEquals(Song.objects.count(), 1)
+
+    def test_stream_holds_its_slot(self):
+        with mock.patch.dict(gates, {'read': Gate(1, 0, 0)}):
+            response = self.client.get('/read/song/', {'stream': 'ndjson'})
+            self.assertEquals(gates['read'].stats()['active'], 1)
+            self.assertEquals(self.client.get('/read/song/').status_code, 503)
+            b''.join(response.streaming_content)
+            self.assertEquals(gates['read'].stats()['active'], 0)
+            self.assertEquals(self.client.get('/read/song/').status_code, 200)
+
+    def test_stream_slot_is_released_after_max_hold(self):
+        with mock.patch.dict(gates, {'read': Gate(1, 0, 0)}), mock.patch('api.admission.ADMISSION_MAX_HOLD', 0.05):
+            response = self.client.get('/read/song/', {'stream': 'ndjson'})
+            self.assertEquals(self.client.get('/read/song/').status_code, 503)
+            time.sleep(0.2)
+            self.assertEquals(gates['read'].stats()['active'], 0)
+            self.assertEquals(self.client.get('/read/song/').status_code, 200)
+            b''.join(response.streaming_content)
+            response.close()
+            self.assertEquals(gates['read'].stats()['active'], 0)
+
+    def test_bulk_bodies_are_read_outside_the_write_gate(self):
+        active = []
+
+        def parse(request):
+            active.append(gates['write'].stats()['active'])
+            return parse_items(request)
+
+        items = json.dumps([{'name': 'song2', 'duration': 10}])
+        with mock.patch.dict(gates, {'write': Gate(1, 0, 0)}), mock.patch('api.views.parse_items', parse):
+            for url, body in (('/create/song/', items), ('/update/song/', items), ('/delete/song/', '[]')):
+                response = self.client.post(url, body, content_type='application/json')
+                self.assertNotEquals(response.status_code, 503)
+            self.assertEquals(active, [0, 0, 0])
+            self.assertEquals(gates['write'].stats()['admitted'], 3)
+            gates['write'].acquire()
+            response = self.client.post('/create/song/', items, content_type='application/json')
+            self.assertEquals(response.status_code, 503)
+            # Shed by the view, once the body was read.
+            self.assertEquals(len(active), 4)
+            # Requests for one item are still gated by the middleware.
+            response = self.client.post('/update/song/%d/' % self.song.id, '{}', content_type='application/json')
+            self.assertEquals(response.status_code, 503)
+        self.assertEquals(Song.objects.count(), 2)
+
+    async def test_asgi_requests_overlap(self):
+        statuses, elapsed = await concurrent_asgi_requests(['api.admission.AdmissionMiddleware'], count=4, delay=0.3)
+        self.assertEquals(statuses, [200] * 4)
+        self.assertLess(elapsed, 0.6)
+
+    async def test_asgi_requests_queue_and_are_shed(self):
+        gate = Gate(1, 1, 5)
+        self.assertTrue(gate.acquire())
+        with override_settings(ROOT_URLCONF=async_urlconf(), MIDDLEWARE=['api.admission.AdmissionMiddleware']), \
+                mock.patch.dict(gates, {'read': gate}):
+            client = AsyncClient()
+            queued = asyncio.ensure_future(client.get('/cache/stats/'))
+            while not gate.stats()['waiting']:
+                await asyncio.sleep(0.001)
+            # The queue holds one request.
+            self.assertEquals((await client.get('/cache/stats/')).status_code, 503)
+            gate.release()
+            self.assertEquals((await queued).status_code, 200)
+        self.assertEquals(gate.stats()['active'], 0)
+
+    def test_rate_limit(self):
+        with mock.patch('api.admission.buckets', TokenBuckets(rate=0.5, burst=1)):
+            self.assertEquals(self.client.get('/read/song/').status_code, 200)
+            response = self.client.get('/read/song/')
+            self.assertEquals((response.status_code, response['Retry-After']), (429, '2'))
+            self.assertIn('audioserve_rate_limited_total 1', self.client.get('/metrics/').content.decode())
+
+
+class SingleUpdateTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.song = Song.objects.create(name='song1', duration=100)
+        self.podcast = Podcast.objects.create(name='pod1', duration=100, host='host', participants='["adam"]')
+
+    def test_one_update_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/update/song/%d/' % self.song.id, {'name': 'renamed', 'duration': ''})
+        self.assertEquals(response.status_code, 200)
+        # The UPDATE, and the change version bump.
+        self.assertEquals(len(queries), 2)
+        sql = queries[0]['sql']
+        self.assertTrue(sql.startswith('UPDATE "api_song" SET'))
+        self.assertIn('"name"', sql)
+        self.assertIn('"updated_time"', sql)
+        self.assertNotIn('"duration"', sql)
+        song = Song.objects.get(id=self.song.id)
+        self.assertEquals((song.name, song.duration), ('renamed', 100))
+        self.assertGreater(song.updated_time, self.song.updated_time)
+
+    def test_participants_update(self):
+        with self.assertNumQueries(2):
+            response = self.client.post('/update/podcast/%d/' % self.podcast.id, {'participants': 'bob, carl'})
+        self.assertEquals(response.content, b'Podcast successfully updated.')
+        self.assertEquals(Podcast.objects.get(id=self.podcast.id).participants, '["bob", "carl"]')
+        self.assertEquals(list(Participant.objects.order_by('position').values_list('name', flat=True)),
+                          ['bob', 'carl'])
+
+    def test_missing_item(self):
+        with self.assertNumQueries(1):
+            response = self.client.post('/update/song/%d/' % (self.song.id + 100), {'duration': 300})
+        self.assertEquals(response.status_code, 400)
+
+    def test_invalid_fields_are_rejected_without_queries(self):
+        for audioType, pk, data in [
+            ('song', self.song.id, {'duration': -1}),
+            ('song', self.song.id, {'name': 'x' * 101}),
+            ('song', self.song.id, {'host': 'host'}),
+            ('podcast', self.podcast.id, {'participants': ','.join(['p'] * 11)}),
+        ]:
+            with self.assertNumQueries(0):
+                response = self.client.post('/update/%s/%d/' % (audioType, pk), data)
+            self.assertEquals(response.status_code, 400)
+        self.assertEquals(Song.objects.get(id=self.song.id).duration, 100)
+
+
+class AudioFileTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.media = temporary_media(self)
+        self.song = Song.objects.create(name='song1', duration=100)
+        self.audio = bytes(range(256)) * 4096
+
+    def upload(self, audioType='song', pk=None, data=None, name='song.mp3'):
+        return self.client.post('/upload/%s/%d/' % (audioType, pk or self.song.id), {
+            'file': SimpleUploadedFile(name, self.audio if data is None else data, 'audio/mpeg'),
+        })
+
+    def stream(self, **headers):
+        response = self.client.get('/stream/song/%d/' % self.song.id, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, content
+
+    def test_upload_is_streamed_to_disk(self):
+        chunks = []
+        receive = AudioUploadHandler.receive_data_chunk
+
+        def record(handler, raw_data, start):
+            chunks.append(len(raw_data))
+            return receive(handler, raw_data, start)
+
+        with mock.patch.object(AudioUploadHandler, 'chunk_size', 64 * 1024), \
+                mock.patch.object(AudioUploadHandler, 'receive_data_chunk', record):
+            response = self.upload()
+        self.assertEquals(response.content, b'File successfully uploaded.')
+        self.assertEquals(max(chunks), 64 * 1024)
+        self.assertEquals(sum(chunks), len(self.audio))
+        song = Song.objects.get(id=self.song.id)
+        self.assertTrue(song.audio_file.name.startswith('song/'))
+        with open(os.path.join(self.media, song.audio_file.name), 'rb') as f:
+            self.assertEquals(f.read(), self.audio)
+        self.assertEquals(os.listdir(os.path.join(self.media, '.uploads')), [])
+
+    def test_replacing_and_deleting_remove_files(self):
+        self.upload()
+        first = Song.objects.get(id=self.song.id).audio_file.name
+        self.upload(data=b'other')
+        second = Song.objects.get(id=self.song.id).audio_file.name
+        self.assertNotEqual(first, second)
+        self.assertFalse(os.path.exists(os.path.join(self.media, first)))
+        self.client.post('/delete/song/%d/' % self.song.id)
+        self.assertFalse(os.path.exists(os.path.join(self.media, second)))
+
+        song = Song.objects.create(name='song2', duration=100)
+        self.upload(pk=song.id)
+        name = Song.objects.get(id=song.id).audio_file.name
+        self.client.post('/delete/song/', json.dumps([song.id]), content_type='application/json')
+        self.assertFalse(os.path.exists(os.path.join(self.media, name)))
+
+    def test_invalid_uploads(self):
+        self.assertEquals(self.upload(pk=self.song.id + 100).status_code, 400)
+        self.assertEquals(os.listdir(os.path.join(self.media, 'song')), [])
+        self.assertEquals(self.upload('video').status_code, 400)
+        response = self.client.post('/upload/song/%d/' % self.song.id, {'name': 'song'})
+        self.assertEquals(response.status_code, 400)
+        with mock.patch('api.files.MAX_UPLOAD_SIZE', 1000):
+            self.assertEquals(self.upload().status_code, 400)
+        self.assertEquals(Song.objects.get(id=self.song.id).audio_file.name, '')
+
+    def test_full_download(self):
+        self.upload()
+        response, content = self.stream()
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(content, self.audio)
+        self.assertEquals(response['Content-Length'], str(len(self.audio)))
+        self.assertEquals(response['Content-Type'], 'audio/mpeg')
+        self.assertEquals(response['Accept-Ranges'], 'bytes')
+        self.assertNotIn('Content-Encoding', response)
+        response, _ = self.stream(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(response.status_code, 304)
+
+    def test_ranges(self):
+        self.upload()
+        size = len(self.audio)
+        for header, start, stop in [
+            ('bytes=10-19', 10, 20),
+            ('bytes=%d-' % (size - 100), size - 100, size),
+            ('bytes=-5', size - 5, size),
+            ('bytes=100-%d' % (size * 2), 100, size),
+        ]:
+            response, content = self.stream(HTTP_RANGE=header)
+            self.assertEquals(response.status_code, 206)
+            self.assertEquals(content, self.audio[start:stop])
+            self.assertEquals(response['Content-Length'], str(stop - start))
+            self.assertEquals(response['Content-Range'], 'bytes %d-%d/%d' % (start, stop - 1, size))
+
+        response, _ = self.stream(HTTP_RANGE='bytes=%d-' % size)
+        self.assertEquals(response.status_code, 416)
+        self.assertEquals(response['Content-Range'], 'bytes */%d' % size)
+        for header in ['bytes=0-1,5-6', 'lines=1-2', 'bytes=9-1']:
+            response, content = self.stream(HTTP_RANGE=header)
+            self.assertEquals((response.status_code, len(content)), (200, size))
+
+    def test_if_range(self):
+        self.upload()
+        response, _ = self.stream()
+        response, content = self.stream(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=response['ETag'])
+        self.assertEquals((response.status_code, content), (206, self.audio[:10]))
+        response, content = self.stream(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEquals((response.status_code, len(content)), (200, len(self.audio)))
+
+    def test_missing_file(self):
+        self.assertEquals(self.stream()[0].status_code, 400)
+        self.assertEquals(self.client.get('/stream/song/%d/' % (self.song.id + 100)).status_code, 400)
+
+    def test_file_responses_release_read_slot(self):
+        self.upload()
+        response = self.client.get('/stream/song/%d/' % self.song.id)
+        self.assertEquals(gates['read'].stats()['active'], 0)
+        response.close()
+
+    def test_parse_range(self):
+        self.assertEquals(parse_range('bytes=0-0', 10), (0, 1))
+        self.assertEquals(parse_range('bytes=-20', 10), (0, 10))
+        self.assertEquals(parse_range('bytes=5-', 10), (5, 10))
+        self.assertIsNone(parse_range('bytes=-', 10))
+        self.assertIsNone(parse_range('bytes=a-b', 10))
+        with self.assertRaises(ValueError):
+            parse_range('bytes=-0', 10)
+        with self.assertRaises(ValueError):
+            parse_range('bytes=0-', 0)
+
+
+class DurationProbeTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.media = temporary_media(self)
+
+    def audio(self, kind, seconds):
+        path = os.path.join(self.media, 'probe-%s-%d' % (kind, seconds))
+        write_audio(path, kind, seconds)
+        with open(path, 'rb') as f:
+            return SimpleUploadedFile('audio.bin', f.read())
+
+    def test_corpus(self):
+        for path, kind, seconds in generate_corpus(self.media, 4 * len(KINDS), max_seconds=7200):
+            self.assertEquals((kind, round(audio_duration(path))), (kind, seconds))
+
+    def test_reads_are_bounded(self):
+        read = []
+
+        class CountingFile:
+            def __init__(self, *args):
+                self.file = open(*args)
+
+            def __getattr__(self, name):
+                return getattr(self.file, name)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc_info):
+                self.file.close()
+
+            def read(self, size):
+                data = self.file.read(size)
+                read.append(len(data))
+                return data
+
+        for kind in KINDS:
+            path = os.path.join(self.media, kind)
+            write_audio(path, kind, 10800)
+            read.clear()
+            with mock.patch('api.audio_headers.open', CountingFile, create=True):
+                self.assertEquals(round(audio_duration(path)), 10800)
+            self.assertLessEqual(sum(read), 2 * HEAD_SIZE + OGG_TAIL_SIZE, kind)
+
+    def test_unrecognised_files(self):
+        path = os.path.join(self.media, 'junk')
+        for data in [b'', bytes(range(256)) * 100, b'RIFF\x00\x00\x00\x00WAVEfmt ', b'OggS' + bytes(100)]:
+            with open(path, 'wb') as f:
+                f.write(data)
+            with self.assertRaises(ValueError):
+                audio_duration(path)
+            self.assertIsNone(probe_duration(path))
+
+    def test_probe_pool(self):
+        path = os.path.join(self.media, 'song.ogg')
+        write_audio(path, 'ogg-opus', 90)
+        self.assertEquals(probe_duration(path), 90)
+        with mock.patch('api.probe.PROBE_WORKERS', 0):
+            self.assertEquals(probe_duration(path), 90)
+
+    def test_create_takes_duration_from_file(self):
+        response = self.client.post('/create/song/', {'name': 'song', 'file': self.audio('mp3-xing', 125)})
+        self.assertEquals(response.content, b'Song successfully created.')
+        response = self.client.post('/create/podcast/', {
+            'name': 'podcast', 'host': 'host', 'participants': 'adam', 'duration': 1,
+            'file': self.audio('wav', 61),
+        })
+        self.assertEquals(response.content, b'Podcast successfully created.')
+        song, podcast = Song.objects.get(), Podcast.objects.get()
+        self.assertEquals((song.duration, podcast.duration), (125, 61))
+        self.assertTrue(song.audio_file.name.startswith('song/'))
+        self.assertTrue(os.path.exists(os.path.join(self.media, podcast.audio_file.name)))
+        self.assertEquals(AudioStat.objects.filter(audio_type='podcast').get().total_duration, 61)
+
+    def test_unrecognised_file_needs_a_duration(self):
+        junk = SimpleUploadedFile('audio.bin', b'junk' * 1000)
+        response = self.client.post('/create/song/', {'name': 'song', 'file': junk})
+        self.assertEquals(response.status_code, 400)
+        self.assertEquals(os.listdir(os.path.join(self.media, 'song')), [])
+        junk.seek(0)
+        response = self.client.post('/create/song/', {'name': 'song', 'duration': 30, 'file': junk})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(Song.objects.get().duration, 30)
+
+    def test_upload_updates_duration(self):
+        song = Song.objects.create(name='song', duration=1)
+        response = self.client.post('/upload/song/%d/' % song.id, {'file': self.audio('ogg-vorbis', 200)})
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(Song.objects.get(id=song.id).duration, 200)
+
+
+class PeaksTest(TestCase):
+    # (WAV format, bits, array type code, scale to int16)
+    FORMATS = [
+        (1, 16, 'h', lambda value: value),
+        (1, 8, 'B', lambda value: (value - 128) << 8),
+        (1, 32, 'i', lambda value: value >> 16),
+        (3, 32, 'f', lambda value: max(-32768, min(32767, round(value * 32767)))),
+    ]
+
+    def setUp(self):
+        self.client = Client()
+        self.media = temporary_media(self)
+        self.rng = random.Random(0)
+
+    def wav(self, name, frames, channels=2, audio_format=1, bits=16, type_code='h'):
+        """Write a WAV file of random samples. Returns its path and samples."""
+        if type_code == 'f':
+            samples = array('f', [self.rng.uniform(-1.2, 1.2) for _ in range(frames * channels)])
+        else:
+            low, high = {'h': (-32768, 32767), 'B': (0, 255), 'i': (-2 ** 31, 2 ** 31 - 1)}[type_code]
+            samples = array(type_code, [self.rng.randint(low, high) for _ in range(frames * channels)])
+        path = os.path.join(self.media, name)
+        with open(path, 'wb') as f:
+            f.write(wav_header(len(samples) * samples.itemsize, 8000, channels, bits, audio_format))
+            f.write(samples.tobytes())
+        return path, samples
+
+    def levels(self, path):
+        channels, sample_rate, frames, levels = read_levels(path + '.peaks')
+        with open(path + '.peaks', 'rb') as f:
+            data = f.read()
+        return frames, {
+            resolution: list(array('h', data[offset:offset + peaks * 4])) for resolution, (peaks, offset) in levels.items()
+        }
+
+    def expected(self, samples, channels, scale):
+        expected = {}
+        for resolution in PEAK_RESOLUTIONS:
+            step = resolution * channels
+            expected[resolution] = [
+                scale(extreme(samples[i:i + step])) for i in range(0, len(samples), step) for extreme in (min, max)
+            ]
+        return expected
+
+    def test_levels_match_samples(self):
+        frames = 3 * PEAK_RESOLUTIONS[-1] + 1000
+        for audio_format, bits, type_code, scale in self.FORMATS:
+            for channels in (1, 2):
+                path, samples = self.wav('%d-%d.wav' % (bits, channels), frames, channels, audio_format, bits, type_code)
+                expected = (frames, self.expected(samples, channels, scale))
+                write_peaks(path)
+                self.assertEquals(self.levels(path), expected, (audio_format, bits, channels))
+                with mock.patch('api.peaks.numpy', None):
+                    write_peaks(path)
+                self.assertEquals(self.levels(path), expected, (audio_format, bits, channels))
+
+    def test_chunks_are_bounded(self):
+        path, samples = self.wav('long.wav', 10 * PEAK_RESOLUTIONS[-1] + 7)
+        write_peaks(path)
+        expected = self.levels(path)
+        chunks = []
+        chunk_peaks = peaks._chunk_peaks
+
+        def record(samples, *args):
+            chunks.append(len(samples))
+            return chunk_peaks(samples, *args)
+
+        for numpy in (peaks.numpy, None):
+            chunks.clear()
+            with mock.patch('api.peaks.CHUNK_PEAKS', 2), mock.patch('api.peaks._chunk_peaks', record), \
+                    mock.patch('api.peaks.numpy', numpy):
+                write_peaks(path)
+            self.assertEquals(max(chunks), 2 * PEAK_RESOLUTIONS[-1] * 2)
+            self.assertEquals(sum(chunks), len(samples))
+            self.assertEquals(self.levels(path), expected)
+
+    def test_empty_and_unsupported_files(self):
+        path, _ = self.wav('empty.wav', 0)
+        write_peaks(path)
+        self.assertEquals(self.levels(path), (0, {resolution: [] for resolution in PEAK_RESOLUTIONS}))
+        for kind in ('mp3-cbr', 'ogg-vorbis'):
+            write_audio(os.path.join(self.media, kind), kind, 5)
+        with open(os.path.join(self.media, '24bit'), 'wb') as f:
+            f.write(wav_header(6000, 8000, 2, 24) + bytes(6000))
+        for name in ('mp3-cbr', 'ogg-vorbis', '24bit'):
+            with self.assertRaises(ValueError):
+                write_peaks(os.path.join(self.media, name))
+            self.assertFalse(os.path.exists(os.path.join(self.media, name + '.peaks')))
+
+    def test_truncated_files(self):
+        song = Song.objects.create(name='song', duration=1)
+        path = self.upload(song)
+        write_peaks(path)
+        with open(path + '.peaks', 'r+b') as f:
+            f.truncate(peaks.HEADER.size + peaks.LEVEL.size // 2)
+        self.assertEquals(self.client.get('/peaks/song/%d/' % song.id).status_code, 400)
+
+        # A fmt chunk cut off at the end of the file, uploaded like any other.
+        truncated = wav_header(0)[:12] + b'fmt ' + (16).to_bytes(4, 'little') + bytes(6)
+        response = self.client.post('/upload/song/%d/' % song.id, {'file': SimpleUploadedFile('cut.wav', truncated)})
+        self.assertEquals(response.status_code, 200)
+        with self.assertRaises(ValueError):
+            write_peaks(Song.objects.get(id=song.id).audio_file.path)
+        out = StringIO()
+        call_command('generate_peaks', stdout=out)
+        self.assertIn('Wrote peaks for 0 files; 0 were up to date, 1 unsupported, 0 missing.', out.getvalue())
+
+    def upload(self, song, name='song.wav', frames=5 * PEAK_RESOLUTIONS[-1]):
+        path, _ = self.wav(name, frames)
+        with open(path, 'rb') as f:
+            response = self.client.post('/upload/song/%d/' % song.id, {'file': SimpleUploadedFile(name, f.read())})
+        self.assertEquals(response.status_code, 200)
+        return Song.objects.get(id=song.id).audio_file.path
+
+    def test_endpoint_serves_levels(self):
+        song = Song.objects.create(name='song', duration=1)
+        self.assertEquals(self.client.get('/peaks/song/%d/' % song.id).status_code, 400)
+        path = self.upload(song)
+        self.assertEquals(self.client.get('/peaks/song/%d/' % song.id).status_code, 400)
+        write_peaks(path)
+        frames, levels = self.levels(path)
+        for resolution in PEAK_RESOLUTIONS:
+            response = self.client.get('/peaks/song/%d/' % song.id, {'resolution': resolution})
+            self.assertEquals(response.status_code, 200)
+            self.assertEquals(response['Content-Type'], 'application/octet-stream')
+            self.assertEquals(response['Peaks-Resolution'], str(resolution))
+            self.assertEquals(response['Peaks-Frames'], str(frames))
+            self.assertEquals(response['Peaks-Sample-Rate'], '8000')
+            content = b''.join(response.streaming_content)
+            self.assertEquals(int(response['Content-Length']), len(content))
+            self.assertEquals(list(array('h', content)), levels[resolution])
+        response = self.client.get('/peaks/song/%d/' % song.id)
+        self.assertEquals(response['Peaks-Resolution'], str(PEAK_RESOLUTIONS[-1]))
+        response.close()
+        not_modified = self.client.get(
+            '/peaks/song/%d/' % song.id, {'resolution': PEAK_RESOLUTIONS[0]}, HTTP_IF_NONE_MATCH=response['ETag'],
+        )
+        self.assertEquals(not_modified.status_code, 200)
+        not_modified.close()
+        not_modified = self.client.get('/peaks/song/%d/' % song.id, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEquals(not_modified.status_code, 304)
+        for resolution in ('3', 'x', '-1'):
+            response = self.client.get('/peaks/song/%d/' % song.id, {'resolution': resolution})
+            self.assertEquals(response.status_code, 400)
+        self.assertEquals(self.client.get('/peaks/song/%d/' % (song.id + 1)).status_code, 400)
+        self.assertEquals(self.client.get('/peaks/tune/%d/' % song.id).status_code, 400)
+
+    def test_generate_peaks_command(self):
+        songs = [Song.objects.create(name='song%d' % i, duration=1) for i in range(3)]
+        paths = [self.upload(song, 'song%d.wav' % i, 1000 * (i + 1)) for i, song in enumerate(songs)]
+        junk = Podcast.objects.create(name='podcast', duration=1, host='host', participants='["adam"]')
+        self.client.post('/upload/podcast/%d/' % junk.id, {'file': SimpleUploadedFile('junk.bin', b'junk' * 100)})
+        Song.objects.create(name='no file', duration=1)
+        out = StringIO()
+        call_command('generate_peaks', stdout=out)
+        self.assertIn('Wrote peaks for 3 files; 0 were up to date, 1 unsupported, 0 missing.', out.getvalue())
+        for i, path in enumerate(paths):
+            self.assertEquals(self.levels(path)[0], 1000 * (i + 1))
+        os.remove(paths[0])
+        out = StringIO()
+        call_command('generate_peaks', '--type', 'song', stdout=out)
+        self.assertIn('Wrote peaks for 0 files; 2 were up to date, 0 unsupported, 1 missing.', out.getvalue())
+        out = StringIO()
+        call_command('generate_peaks', '--type', 'song', '--force', stdout=out)
+        self.assertIn('Wrote peaks for 2 files; 0 were up to date, 0 unsupported, 1 missing.', out.getvalue())
+
+    def test_peaks_go_with_their_file(self):
+        song = Song.objects.create(name='song', duration=1)
+        old = self.upload(song)
+        write_peaks(old)
+        new = self.upload(song, 'other.wav')
+        self.assertFalse(os.path.exists(old + '.peaks'))
+        write_peaks(new)
+        self.assertEquals(self.client.post('/delete/song/%d/' % song.id).status_code, 200)
+        self.assertFalse(os.path.exists(new))
+        self.assertFalse(os.path.exists(new + '.peaks'))
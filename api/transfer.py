@@ -0,0 +1,216 @@
+"""
+Streaming import and export of catalog snapshots as CSV or NDJSON, used by
+the import_audio and export_audio management commands. Both read and write
+one record at a time, so memory use does not depend on the file size.
+
+Imports apply CreateView's bulk validation to every record and insert the
+valid ones one chunk per transaction. That transaction also advances the
+source's ImportProgress, which is what makes --resume exact.
+
+Per-row triggers dominate the cost of a large insert: the search index,
+the catalog stats and the participant index each run once per row. While a
+chunk is inserted, insert_rows drops those triggers, does their work with
+one set-based statement over the new id range, and re-creates them, all in
+the chunk's transaction. Other connections never see the table without
+its triggers.
+"""
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+import csv
+import json
+from itertools import islice
+
+from .bulk import CREATE_FIELDS, _error_dict, clean_fields
+from .changes import audio_changed
+from .models import ImportProgress
+from .search import index_range_sql
+from .stats import add_range_sql
+from .streaming import STREAM_CHUNK_SIZE, stream_rows
+from .views import AUDIO_TYPES
+
+
+FORMATS = ('csv', 'ndjson')
+
+IMPORT_BATCH_SIZE = getattr(settings, 'AUDIO_IMPORT_BATCH_SIZE', 20000)
+
+# Written by export_audio; ignored on import, which assigns new ones.
+IGNORED_FIELDS = ('id', 'uploaded_time', 'updated_time')
+
+PARTICIPANTS_RANGE_SQL = """
+    INSERT INTO api_participant (podcast_id, name, position)
+    SELECT api_podcast.id, participant.value, participant.key
+    FROM api_podcast, json_each(api_podcast.participants) AS participant
+    WHERE api_podcast.id > %s AND api_podcast.id <= %s
+"""
+
+# Insert triggers that insert_rows suspends, each with the statement that
+# does the same work for a range of new ids (first, last].
+SUSPENDED_TRIGGERS = {
+    'song': [
+        ('api_song_search_insert', index_range_sql('song')),
+        ('api_song_stats_insert', add_range_sql('song')),
+    ],
+    'podcast': [
+        ('api_podcast_participants_insert', PARTICIPANTS_RANGE_SQL),
+        ('api_podcast_search_insert', index_range_sql('podcast')),
+        ('api_podcast_stats_insert', add_range_sql('podcast')),
+    ],
+    'audiobook': [
+        ('api_audiobook_search_insert', index_range_sql('audiobook')),
+        ('api_audiobook_stats_insert', add_range_sql('audiobook')),
+    ],
+}
+
+
+def format_for(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'ndjson'
+
+
+def read_records(file, fmt):
+    """
+    Yield every record of a CSV or NDJSON file as a dict, or None if it
+    cannot be parsed. In CSV, a participants cell holding a JSON list is
+    decoded; any other value is split on commas like the create form.
+    """
+    if fmt == 'csv':
+        for row in csv.DictReader(file):
+            participants = row.get('participants')
+            if participants and participants.lstrip().startswith('['):
+                try:
+                    row['participants'] = json.loads(participants)
+                except ValueError:
+                    row = None
+            yield row
+    else:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+def clean_record(model, audioType, data):
+    """Validate one record and return its cleaned fields. Raises ValidationError."""
+    fields = set(CREATE_FIELDS[audioType])
+    if not isinstance(data, dict):
+        raise ValidationError('Expected an object with fields: %s.' % ', '.join(sorted(fields)))
+    data = {key: value for key, value in data.items() if key not in IGNORED_FIELDS}
+    if set(data) != fields:
+        raise ValidationError('Expected fields: %s.' % ', '.join(sorted(fields)))
+    return clean_fields(model, data)
+
+
+def insert_rows(connection, audioType, rows):
+    """
+    Insert cleaned rows with a single executemany and return their ids as
+    (first, last], suspending the triggers in SUSPENDED_TRIGGERS around
+    it. Must be called inside a transaction.
+    """
+    model, _ = AUDIO_TYPES[audioType]
+    table = model._meta.db_table
+    fields = CREATE_FIELDS[audioType]
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    names = [name for name, _ in SUSPENDED_TRIGGERS[audioType]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)"
+            % ', '.join(['%s'] * len(names)),
+            names,
+        )
+        triggers = dict(cursor.fetchall())
+        for name in triggers:
+            cursor.execute('DROP TRIGGER %s' % name)
+        # The tables are AUTOINCREMENT, so new ids start above the highest
+        # id ever used, which sqlite_sequence holds, not above MAX(id).
+        # The transaction holds the write lock, so they are consecutive.
+        cursor.execute(
+            'SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = %%s), 0), COALESCE(MAX(id), 0)) '
+            'FROM %s' % table,
+            [table],
+        )
+        first = cursor.fetchone()[0]
+        cursor.executemany(
+            "INSERT INTO %s (%s, uploaded_time, updated_time, audio_file) VALUES (%s, '')"
+            % (table, ', '.join(fields), ', '.join(['%s'] * (len(fields) + 2))),
+            [[row[field] for field in fields] + [now, now] for row in rows],
+        )
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+        last = cursor.fetchone()[0]
+        for name, sql in SUSPENDED_TRIGGERS[audioType]:
+            if name in triggers:
+                cursor.execute(sql, [first, last])
+                cursor.execute(triggers[name])
+    return first, last
+
+
+def import_records(audioType, records, source, resume=False, batch_size=IMPORT_BATCH_SIZE,
+                   on_error=None, on_progress=None):
+    """
+    Validate and insert records, one transaction per batch_size records.
+    source names the input for ImportProgress. With resume, the records
+    already committed for it are skipped. on_error(record number, errors)
+    is called for every invalid record. on_progress(records, imported,
+    errors) is called after every commit. Returns the final (records,
+    imported, errors).
+    """
+    model, _ = AUDIO_TYPES[audioType]
+    using = router.db_for_write(model)
+    connection = connections[using]
+    progress = ImportProgress.objects.using(using)
+    start = 0
+    if resume:
+        start = progress.filter(source=source).values_list('records', flat=True).first() or 0
+    else:
+        progress.filter(source=source).delete()
+    consumed, imported, errors = start, 0, 0
+    records = islice(records, start, None)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            break
+        rows = []
+        for number, data in enumerate(batch, consumed + 1):
+            try:
+                rows.append(clean_record(model, audioType, data))
+            except ValidationError as e:
+                errors += 1
+                if on_error is not None:
+                    on_error(number, _error_dict(e))
+        consumed += len(batch)
+        with transaction.atomic(using=using):
+            if rows:
+                insert_rows(connection, audioType, rows)
+            progress.update_or_create(source=source, defaults={'records': consumed})
+        if rows:
+            audio_changed(audioType)
+        imported += len(rows)
+        if on_progress is not None:
+            on_progress(consumed, imported, errors)
+    return consumed, imported, errors
+
+
+def export_records(audioType, file, fmt, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    Write every item of a type to file, in id order, reading the table
+    with a server-side iterator. Returns the number of items written.
+    """
+    model, to_json = AUDIO_TYPES[audioType]
+    queryset = model.objects.order_by('id')
+    count = 0
+    if fmt == 'csv':
+        fields = ['id'] + CREATE_FIELDS[audioType]
+        writer = csv.writer(file)
+        writer.writerow(fields)
+        for row in queryset.values_list(*fields).iterator(chunk_size=chunk_size):
+            writer.writerow(row)
+            count += 1
+    else:
+        for chunk in stream_rows(queryset.values_list(*to_json.fields), to_json, 'ndjson', chunk_size):
+            file.write(chunk)
+            count += chunk.count('\n')
+    return count
@@ -1,11 +1,30 @@
+from django.conf import settings
 from django.urls import path
 
 from .import views
 
+
+def as_view(view_class):
+    if getattr(settings, 'AUDIO_ASYNC_VIEWS', False):
+        from .async_views import as_async_view
+        return as_async_view(view_class)
+    return view_class.as_view()
+
+
 urlpatterns = [
-    path('create/<str:audioType>/', views.CreateView.as_view(), name='create'),
-    path('update/<str:audioType>/<int:audioFileID>/', views.UpdateView.as_view(), name='update'),
-    path('read/<str:audioType>/', views.ReadView.as_view(), name='list'),
-    path('read/<str:audioType>/<int:audioFileID>/', views.ReadView.as_view(), name='read'),
-    path('delete/<str:audioType>/<int:audioFileID>/', views.DeleteView.as_view(), name='delete')
+    path('create/<str:audioType>/', as_view(views.CreateView), name='create'),
+    path('update/<str:audioType>/', as_view(views.UpdateView), name='bulk_update'),
+    path('update/<str:audioType>/<int:audioFileID>/', as_view(views.UpdateView), name='update'),
+    path('read/all/', as_view(views.FeedView), name='feed'),
+    path('read/<str:audioType>/', as_view(views.ReadView), name='list'),
+    path('read/<str:audioType>/<int:audioFileID>/', as_view(views.ReadView), name='read'),
+    path('delete/<str:audioType>/', as_view(views.DeleteView), name='bulk_delete'),
+    path('delete/<str:audioType>/<int:audioFileID>/', as_view(views.DeleteView), name='delete'),
+    path('upload/<str:audioType>/<int:audioFileID>/', as_view(views.UploadView), name='upload'),
+    path('stream/<str:audioType>/<int:audioFileID>/', as_view(views.StreamView), name='stream'),
+    path('peaks/<str:audioType>/<int:audioFileID>/', as_view(views.PeaksView), name='peaks'),
+    path('search/', as_view(views.SearchView), name='search'),
+    path('stats/', as_view(views.StatsView), name='stats'),
+    path('cache/stats/', as_view(views.CacheStatsView), name='cache_stats'),
+    path('metrics/', as_view(views.MetricsView), name='metrics'),
 ]
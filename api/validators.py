@@ -5,13 +5,24 @@ import json
 
 
 def validate_participants(value):
-    value = json.loads(value)
+    if isinstance(value, str):
+        value = json.loads(value)
+    if not isinstance(value, list):
+        raise ValidationError(
+            _('%(value)s must be a list'),
+            params={'value': value},
+        )
     if len(value) > 10:
         raise ValidationError(
             _('%(value)s can contain maximum 10 items'),
             params={'value': value},
         )
     for val in value:
+        if not isinstance(val, str):
+            raise ValidationError(
+            _('item must be a string: %(val)s '),
+            params={'val': val},
+        )
         if len(val) > 100:
             raise ValidationError(
             _('maximum length of item can only be 100: %(val)s '),
@@ -1,14 +1,46 @@
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
 from django.views import View
 
-import json
-
-from .models import Song, Podcast, Audiobook
+from .admission import run_gated
+from .bulk import (
+    BULK_BATCH_SIZE, CREATE_FIELDS, BodyTooLarge, build_items, build_updates, clean_fields, delete_ids, is_bulk,
+    is_id, parse_items, parse_participants, update_items,
+)
+from .cache import cache_stats, get_response, response_key, set_response
+from .changes import audio_changed
+from .conditional import get_validators, not_modified, set_validators
+from .feed import feed_page
+from .files import PEAKS_SUFFIX, delete_files, file_response, receive_upload, store_upload
+from .filters import filter_queryset, parse_ordering
+from .group_commit import save_item
+from .metrics import render as render_metrics
+from .models import Song, Podcast, Audiobook, Participant
+from .pagination import (
+    decode_cursor, encode_cursor, is_cursor_int, is_paginated, order_fields, paginate, parse_limit,
+)
+from .peaks import peaks_response
+from .probe import probe_duration
+from .routers import read_only
+from .search import search
+from .serializers import audiobook_json, encoder, json_list, parse_fields, podcast_json, song_json
+from .stats import catalog_stats
+from .streaming import STREAM_FORMATS, stream_rows
 
 
 INVALID_REQUEST_MESSAGE = "Invalid request."
 
+BODY_TOO_LARGE_MESSAGE = "Request body too large."
+
+
+AUDIO_TYPES = {
+    'song': (Song, song_json),
+    'podcast': (Podcast, podcast_json),
+    'audiobook': (Audiobook, audiobook_json),
+}
+
 
 class CreateView(View):
     def get(self, request, *args, **kwargs):
@@ -16,63 +48,114 @@ class CreateView(View):
 
     def post(self, request, *args, **kwargs):
         audioType = kwargs['audioType'].lower()
-        if audioType == 'song' and self.save_song_to_db(request):
+        if audioType in AUDIO_TYPES and is_bulk(request):
+            return self.bulk_save_to_db(audioType, request)
+        if request.content_type != 'multipart/form-data':
+            return self.save_to_db(audioType, request.POST)
+        # The body may carry an audio file. Receive it, and read its
+        # duration, before taking the write slot (see api/admission.py).
+        try:
+            upload = receive_upload(request)
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        if upload is None:
+            return run_gated('write', self.save_to_db, audioType, request.POST)
+        if audioType not in AUDIO_TYPES:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        data = request.POST.copy()
+        duration = probe_duration(upload.temporary_file_path())
+        if duration is not None:
+            data['duration'] = str(duration)
+        return run_gated('write', self.save_to_db, audioType, data, upload)
+
+    def save_to_db(self, audioType, data, upload=None):
+        """
+        Create one item from form data, with the uploaded file if there is
+        one. The file is stored first and removed again if the item is not
+        created.
+        """
+        audio_file = store_upload(AUDIO_TYPES[audioType][0], upload) if upload is not None else ''
+        if audioType == 'song' and self.save_song_to_db(data, audio_file):
             return HttpResponse("Song successfully created.")
-        elif audioType == 'podcast' and self.save_podcast_to_db(request):
+        elif audioType == 'podcast' and self.save_podcast_to_db(data, audio_file):
             return HttpResponse("Podcast successfully created.")
-        elif audioType == 'audiobook' and self.save_audiobook_to_db(request):
+        elif audioType == 'audiobook' and self.save_audiobook_to_db(data, audio_file):
             return HttpResponse("Audiobook successfully created.")
         else:
+            if audio_file:
+                delete_files(AUDIO_TYPES[audioType][0], [audio_file])
             return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
 
-    def save_song_to_db(self, request):
-        keys = [key for key in request.POST.keys()]
+    def bulk_save_to_db(self, audioType, request):
+        model, _ = AUDIO_TYPES[audioType]
+        try:
+            items = parse_items(request)
+        except BodyTooLarge:
+            return HttpResponse(BODY_TOO_LARGE_MESSAGE, status=413)
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        instances, errors = build_items(model, audioType, items)
+        # The body is read; only the insert needs the write slot (see api/admission.py).
+        return run_gated('write', self.bulk_create, audioType, instances, errors)
+
+    def bulk_create(self, audioType, instances, errors):
+        model, _ = AUDIO_TYPES[audioType]
+        with transaction.atomic():
+            model.objects.bulk_create(instances, batch_size=BULK_BATCH_SIZE)
+        audio_changed(audioType)
+        status = 400 if errors and not instances else 200
+        return JsonResponse({'created': len(instances), 'errors': errors}, status=status)
+
+    def save_song_to_db(self, data, audio_file=''):
+        keys = [key for key in data.keys()]
         fields = ['name', 'duration']
         if set(keys) != set(fields):
             return False
-        name = request.POST.get('name')
-        duration = request.POST.get('duration')
-        item = Song(name=name, duration=duration)
+        name = data.get('name')
+        duration = data.get('duration')
+        item = Song(name=name, duration=duration, audio_file=audio_file)
         try:
             item.full_clean()
-            item.save()
+            save_item(item)
         except ValidationError:
             return False
         return True
 
-    def save_podcast_to_db(self, request):
-        keys = [key for key in request.POST.keys()]
+    def save_podcast_to_db(self, data, audio_file=''):
+        keys = [key for key in data.keys()]
         fields = ['name', 'host', 'participants', 'duration']
         if set(keys) != set(fields):
             return False
-        name = request.POST.get('name')
-        duration = request.POST.get('duration')
-        host = request.POST.get('host')
-        participants = request.POST.get('participants')
-        participants = participants.split(',')
-        participants = [p.strip() for p in participants]
-        participants = json.dumps(participants)
-        item = Podcast(name=name, duration=duration, host=host, participants=participants)
+        name = data.get('name')
+        duration = data.get('duration')
+        host = data.get('host')
+        participants = data.get('participants')
         try:
-            item.full_clean()
-            item.save()
+            participants = parse_participants(participants)
+            item = Podcast(
+                name=name, duration=duration, host=host, participants=participants, audio_file=audio_file,
+            )
+            item.full_clean(exclude=['participants'])
+            save_item(item)
         except ValidationError:
             return False
         return True
 
-    def save_audiobook_to_db(self, request):
-        keys = [key for key in request.POST.keys()]
+    def save_audiobook_to_db(self, data, audio_file=''):
+        keys = [key for key in data.keys()]
         fields = ['title', 'author', 'narrator', 'duration']
         if set(keys) != set(fields):
             return False
-        title = request.POST.get('title')
-        author = request.POST.get('author')
-        narrator = request.POST.get('narrator')
-        duration = request.POST.get('duration')
-        item = Audiobook(title=title, author=author, narrator=narrator, duration=duration)
+        title = data.get('title')
+        author = data.get('author')
+        narrator = data.get('narrator')
+        duration = data.get('duration')
+        item = Audiobook(
+            title=title, author=author, narrator=narrator, duration=duration, audio_file=audio_file,
+        )
         try:
             item.full_clean()
-            item.save()
+            save_item(item)
         except ValidationError:
             return False
         return True
@@ -84,195 +167,166 @@ class UpdateView(View):
 
     def post(self, request, *args, **kwargs):
         audioType = kwargs['audioType'].lower()
-        audioFileID = kwargs['audioFileID']
-        if audioType == 'song' and self.update_song(audioFileID, request):
-            return HttpResponse("Song successfully updated.")
-        elif audioType == 'podcast' and self.update_podcast(audioFileID, request):
-            return HttpResponse("Podcast successfully updated.")
-        elif audioType == 'audiobook' and self.update_audiobook(audioFileID, request):
-            return HttpResponse("Audiobook successfully updated.")
+        audioFileID = kwargs.get('audioFileID')
+        if audioFileID is None:
+            if audioType in AUDIO_TYPES and is_bulk(request):
+                return self.bulk_update(audioType, request)
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        if audioType in AUDIO_TYPES and self.update_item(audioType, audioFileID, request):
+            return HttpResponse("%s successfully updated." % audioType.capitalize())
         return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
 
-    def update_song(self, audioFileID, request):
-        keys = [key for key in request.POST.keys()]
-        fields = ['name', 'duration']
-        if not all(x in fields for x in keys):
-            return False
-        try:
-            item = Song.objects.get(id=audioFileID)
-        except Song.DoesNotExist:
-            return False
-        name = request.POST.get('name')
-        duration = request.POST.get('duration')
-        if name:
-            item.name = name
-        if duration:
-            item.duration = duration
+    def bulk_update(self, audioType, request):
+        model, _ = AUDIO_TYPES[audioType]
         try:
-            item.full_clean()
-        except ValidationError:
-            return False
-        item.save()
-        return True
+            items = parse_items(request)
+        except BodyTooLarge:
+            return HttpResponse(BODY_TOO_LARGE_MESSAGE, status=413)
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        changes, errors = build_updates(model, audioType, items)
+        return run_gated('write', self.apply_updates, audioType, changes, errors)
 
-    def update_podcast(self, audioFileID, request):
-        keys = [key for key in request.POST.keys()]
-        fields = ['name', 'host', 'participants', 'duration']
-        if not all(x in fields for x in keys):
-            return False
-        try:
-            item = Podcast.objects.get(id=audioFileID)
-        except Podcast.DoesNotExist:
-            return False
-        name = request.POST.get('name')
-        host = request.POST.get('host')
-        participants = request.POST.get('participants')
-        if participants:
-            participants = participants.split(',')
-            participants = [p.strip() for p in participants]
-            participants = json.dumps(participants)
-        duration = request.POST.get('duration')
-        if name:
-            item.name = name
-        if host:
-            item.host = host
-        if participants:
-            item.participants = participants
-        if duration:
-            item.duration = duration
-        try:
-            item.full_clean()
-        except ValidationError:
-            return False
-        item.save()
-        return True
+    def apply_updates(self, audioType, changes, errors):
+        model, _ = AUDIO_TYPES[audioType]
+        with transaction.atomic():
+            updated = update_items(model, changes)
+        audio_changed(audioType, updated)
+        missing = sorted(set(changes) - set(updated))
+        status = 400 if errors and not updated else 200
+        return JsonResponse({'updated': updated, 'missing': missing, 'errors': errors}, status=status)
 
-    def update_audiobook(self, audioFileID, request):
-        keys = [key for key in request.POST.keys()]
-        fields = ['title', 'author', 'narrator', 'duration']
-        if not all(x in fields for x in keys):
+    def update_item(self, audioType, audioFileID, request):
+        """
+        Validate only the submitted fields and apply them with one UPDATE,
+        whose row count tells whether the item exists. Empty values leave
+        their field unchanged.
+        """
+        model, _ = AUDIO_TYPES[audioType]
+        if not set(request.POST) <= set(CREATE_FIELDS[audioType]):
             return False
         try:
-            item = Audiobook.objects.get(id=audioFileID)
-        except Audiobook.DoesNotExist:
-            return False
-        title = request.POST.get('title')
-        author = request.POST.get('author')
-        narrator = request.POST.get('narrator')
-        duration = request.POST.get('duration')
-        if title:
-            item.title = title
-        if author:
-            item.author = author
-        if narrator:
-            item.narrator = narrator
-        if duration:
-            item.duration = duration
-        try:
-            item.full_clean()
+            changes = clean_fields(model, {name: value for name, value in request.POST.items() if value})
         except ValidationError:
             return False
-        item.save()
+        if not model.objects.filter(id=audioFileID).update(updated_time=timezone.now(), **changes):
+            return False
+        audio_changed(audioType, [audioFileID])
         return True
 
 
 class ReadView(View):
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
     def get(self, request, *args, **kwargs):
         audioType = kwargs['audioType'].lower()
         try:
             audioFileID = kwargs['audioFileID']
         except KeyError:
             audioFileID = None
-        if audioType == 'song':
-            result = self.read_song(audioFileID)
-            if result:
-                return JsonResponse(result, safe=False)
-        elif audioType == 'podcast':
-            result = self.read_podcast(audioFileID)
-            if result:
-                return JsonResponse(result, safe=False)
-        elif audioType == 'audiobook':
-            result = self.read_audiobook(audioFileID)
-            if result:
-                return JsonResponse(result, safe=False)
-        return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        if audioType not in AUDIO_TYPES:
+            return self.read(request, audioType, audioFileID)
+        key = None
+        if 'stream' not in request.GET:
+            key = response_key(audioType, audioFileID, request.GET.urlencode())
+            cached = get_response(key)
+            if cached is not None:
+                content, etag, last_modified = cached
+                response = not_modified(request, etag, last_modified) if etag else None
+                if response is None:
+                    response = HttpResponse(content, content_type='application/json')
+                return set_validators(response, etag, last_modified) if etag else response
+        etag, last_modified = get_validators(AUDIO_TYPES[audioType][0], audioFileID)
+        if etag:
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return set_validators(response, etag, last_modified)
+        response = self.read(request, audioType, audioFileID)
+        if response.status_code == 200:
+            if key:
+                set_response(key, (response.content, etag, last_modified))
+            if etag:
+                set_validators(response, etag, last_modified)
+        return response
 
-    def read_song(self, audioFileID):
-        if not audioFileID:
-            songs_ = Song.objects.all()
-            songs = []
-            for song in songs_:
-                temp = {}
-                temp['id'] = song.id
-                temp['name'] = song.name
-                temp['duration'] = song.duration
-                songs.append(temp)
-            return songs
-        else:
-            try:
-                song = Song.objects.get(id=audioFileID)
-            except Song.DoesNotExist:
-                return False
-            song = {
-                'id': song.id,
-                'name': song.name,
-                'duration': song.duration
-            }
-            return song
-
-    def read_podcast(self, audioFileID):
-        if not audioFileID:
-            podcasts_ = Podcast.objects.all()
-            podcasts = []
-            for podcast in podcasts_:
-                temp = {}
-                temp['id'] = podcast.id
-                temp['name'] = podcast.name
-                temp['duration'] = podcast.duration
-                temp['host'] = podcast.host
-                temp['participants'] = json.loads(podcast.participants)
-                podcasts.append(temp)
-            return podcasts
+    def read(self, request, audioType, audioFileID):
+        if audioType not in AUDIO_TYPES:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        model, _ = AUDIO_TYPES[audioType]
+        try:
+            to_json = parse_fields(model, audioType, request.GET.get('fields'))
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        if audioFileID is not None:
+            result = self.read_item(audioType, audioFileID, to_json)
         else:
             try:
-                podcast = Podcast.objects.get(id=audioFileID)
-            except Podcast.DoesNotExist:
-                return False
-            podcast = {
-                'id': podcast.id,
-                'name': podcast.name,
-                'duration': podcast.duration,
-                'host': podcast.host,
-                'participants': json.loads(podcast.participants)
-            }
-            return podcast
-
-    def read_audiobook(self, audioFileID):
-        if not audioFileID:
-            audiobooks_ = Audiobook.objects.all()
-            audiobooks = []
-            for audiobook in audiobooks_:
-                temp = {}
-                temp['id'] = audiobook.id
-                temp['title'] = audiobook.title
-                temp['duration'] = audiobook.duration
-                temp['author'] = audiobook.author
-                temp['narrator'] = audiobook.narrator
-                audiobooks.append(temp)
-            return audiobooks
-        else:
+                queryset = self.list_queryset(audioType, request)
+            except ValueError:
+                return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+            if 'stream' in request.GET:
+                return self.read_stream(queryset, request, to_json)
+            elif is_paginated(request):
+                result = self.read_page(queryset, request, to_json)
+            else:
+                result = self.read_list(queryset, request, to_json)
+        if result:
+            return HttpResponse(result, content_type='application/json')
+        return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+
+    def list_queryset(self, audioType, request):
+        model, _ = AUDIO_TYPES[audioType]
+        queryset = filter_queryset(model.objects.all(), audioType, request.GET)
+        participant = request.GET.get('participant')
+        if audioType == 'podcast' and participant:
+            podcasts = Participant.objects.filter(name=participant).values('podcast_id')
+            queryset = queryset.filter(id__in=podcasts)
+        return queryset
+
+    def read_item(self, audioType, audioFileID, to_json):
+        model, _ = AUDIO_TYPES[audioType]
+        row = model.objects.filter(id=audioFileID).values_list(*to_json.fields).first()
+        if row is None:
+            return False
+        return to_json(row)
+
+    def read_list(self, queryset, request, to_json):
+        if 'order_by' in request.GET:
             try:
-                audiobook = Audiobook.objects.get(id=audioFileID)
-            except Audiobook.DoesNotExist:
+                queryset = queryset.order_by(*order_fields(parse_ordering(request.GET['order_by'])))
+            except ValueError:
                 return False
-            audiobook = {
-                'id': audiobook.id,
-                'title': audiobook.title,
-                'duration': audiobook.duration,
-                'author': audiobook.author,
-                'narrator': audiobook.narrator
-            }
-            return audiobook
+        return json_list(to_json(row) for row in queryset.values_list(*to_json.fields))
+
+    def read_page(self, queryset, request, to_json):
+        try:
+            order_by = parse_ordering(request.GET.get('order_by'))
+            # paginate() reads the cursor off the last row by name.
+            fields = to_json.fields
+            fields += tuple(name for name in ('id', order_by.lstrip('-')) if name not in fields)
+            items, next_cursor = paginate(
+                queryset.values_list(*fields, named=True),
+                limit=request.GET.get('limit'),
+                after=request.GET.get('after'),
+                order_by=order_by,
+            )
+        except ValueError:
+            return False
+        return '{"results":%s,"next":%s}' % (json_list(to_json(row) for row in items), encoder.encode(next_cursor))
+
+    def read_stream(self, queryset, request, to_json):
+        stream_format = request.GET.get('stream') or 'json'
+        if stream_format not in STREAM_FORMATS:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        # The rows are fetched after dispatch() has returned, so pin the
+        # queryset to the database chosen for this request now.
+        queryset = queryset.using(queryset.db).order_by('id').values_list(*to_json.fields)
+        return StreamingHttpResponse(
+            stream_rows(queryset, to_json, stream_format),
+            content_type=STREAM_FORMATS[stream_format],
+        )
 
     def post(self, request, *args, **kwargs):
         return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
@@ -284,13 +338,19 @@ class DeleteView(View):
 
     def post(self, request, *args, **kwargs):
         audioType = kwargs['audioType'].lower()
-        audioFileID = kwargs['audioFileID']
+        audioFileID = kwargs.get('audioFileID')
+        if audioFileID is None:
+            if audioType in AUDIO_TYPES and is_bulk(request):
+                return self.bulk_delete(audioType, request)
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
         if audioType == 'song':
             try:
                 song = Song.objects.get(id=audioFileID)
             except Song.DoesNotExist:
                 return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
             song.delete()
+            delete_files(Song, [song.audio_file.name])
+            audio_changed('song', [audioFileID])
             return HttpResponse("Song deleted.")
         elif audioType == 'podcast':
             try:
@@ -298,6 +358,8 @@ class DeleteView(View):
             except Podcast.DoesNotExist:
                 return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
             podcast.delete()
+            delete_files(Podcast, [podcast.audio_file.name])
+            audio_changed('podcast', [audioFileID])
             return HttpResponse("Podcast deleted.")
         elif audioType == 'audiobook':
             try:
@@ -305,10 +367,192 @@ class DeleteView(View):
             except Audiobook.DoesNotExist:
                 return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
             audiobook.delete()
+            delete_files(Audiobook, [audiobook.audio_file.name])
+            audio_changed('audiobook', [audioFileID])
             return HttpResponse("Audiobook deleted.")
         else:
             return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
 
+    def bulk_delete(self, audioType, request):
+        try:
+            ids = parse_items(request)
+        except BodyTooLarge:
+            return HttpResponse(BODY_TOO_LARGE_MESSAGE, status=413)
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        if not all(is_id(pk) for pk in ids):
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        return run_gated('write', self.delete_items, audioType, list(set(ids)))
+
+    def delete_items(self, audioType, ids):
+        model, _ = AUDIO_TYPES[audioType]
+        with transaction.atomic():
+            deleted, files = delete_ids(model, ids)
+        delete_files(model, files)
+        audio_changed(audioType, deleted)
+        missing = sorted(set(ids) - set(deleted))
+        return JsonResponse({'deleted': deleted, 'missing': missing})
+
+
+class UploadView(View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+
+    def post(self, request, *args, **kwargs):
+        audioType = kwargs['audioType'].lower()
+        if audioType not in AUDIO_TYPES:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        try:
+            upload = receive_upload(request)
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        if upload is None or request.POST:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        duration = probe_duration(upload.temporary_file_path())
+        # The file is on disk now; only storing it needs the write slot.
+        return run_gated('write', self.store_file, audioType, kwargs['audioFileID'], upload, duration)
+
+    def store_file(self, audioType, audioFileID, upload, duration):
+        """
+        Move the upload into storage and point the item at it, with the
+        duration read from the file if there is one, then remove the file
+        it replaces.
+        """
+        model, _ = AUDIO_TYPES[audioType]
+        name = store_upload(model, upload)
+        changes = {'audio_file': name}
+        if duration is not None:
+            changes['duration'] = duration
+        with transaction.atomic():
+            old = model.objects.filter(id=audioFileID).values_list('audio_file', flat=True).first()
+            if old is not None:
+                model.objects.filter(id=audioFileID).update(updated_time=timezone.now(), **changes)
+        if old is None:
+            delete_files(model, [name])
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        delete_files(model, [old])
+        audio_changed(audioType, [audioFileID])
+        return HttpResponse("File successfully uploaded.")
+
+
+class StreamView(View):
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        audioType = kwargs['audioType'].lower()
+        if audioType not in AUDIO_TYPES:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        model, _ = AUDIO_TYPES[audioType]
+        name = model.objects.filter(id=kwargs['audioFileID']).values_list('audio_file', flat=True).first()
+        if not name:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        try:
+            return file_response(request, model._meta.get_field('audio_file').storage.path(name))
+        except FileNotFoundError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+
+    def post(self, request, *args, **kwargs):
+        return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+
+
+class PeaksView(View):
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        audioType = kwargs['audioType'].lower()
+        if audioType not in AUDIO_TYPES:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        model, _ = AUDIO_TYPES[audioType]
+        name = model.objects.filter(id=kwargs['audioFileID']).values_list('audio_file', flat=True).first()
+        if not name:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        path = model._meta.get_field('audio_file').storage.path(name) + PEAKS_SUFFIX
+        try:
+            return peaks_response(request, path, request.GET.get('resolution'))
+        except (FileNotFoundError, ValueError):
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+
+    def post(self, request, *args, **kwargs):
+        return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+
+
+class FeedView(View):
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        try:
+            items, next_cursor = feed_page(request.GET.get('limit'), request.GET.get('after'))
+        except ValueError:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        return HttpResponse(
+            '{"results":%s,"next":%s}' % (json_list(encoder.encode(item) for item in items), encoder.encode(next_cursor)),
+            content_type='application/json',
+        )
+
+
+class SearchView(View):
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        audioType = request.GET.get('type')
+        if audioType is not None and audioType not in AUDIO_TYPES:
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            offset = decode_cursor(request.GET['after'])[0] if 'after' in request.GET else 0
+            if not is_cursor_int(offset):
+                raise ValueError('Invalid cursor.')
+            matches = search(request.GET.get('q', ''), audioType, limit + 1, offset)
+        except (TypeError, ValueError, IndexError, KeyError):
+            return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
+        next_cursor = None
+        if len(matches) > limit:
+            matches = matches[:limit]
+            next_cursor = encode_cursor([offset + limit])
+        results = self.load_items(matches)
+        return HttpResponse(
+            '{"results":%s,"next":%s}' % (json_list(results), encoder.encode(next_cursor)),
+            content_type='application/json',
+        )
+
+    def load_items(self, matches):
+        ids = {}
+        for audioType, pk in matches:
+            ids.setdefault(audioType, []).append(pk)
+        items = {}
+        for audioType, pks in ids.items():
+            model, to_json = AUDIO_TYPES[audioType]
+            for row in model.objects.filter(id__in=pks).values_list(*to_json.fields):
+                items[audioType, row[0]] = '{"type":"%s",%s' % (audioType, to_json(row)[1:])
+        return [items[match] for match in matches if match in items]
+
+
+class StatsView(View):
+    def dispatch(self, request, *args, **kwargs):
+        with read_only():
+            return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(catalog_stats())
+
+
+class CacheStatsView(View):
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(cache_stats())
+
+
+class MetricsView(View):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 def handle4xx(request, exception):
     return HttpResponse(INVALID_REQUEST_MESSAGE, status=400)
@@ -0,0 +1,161 @@
+"""
+Overload test for the admission control in api/admission.py.
+
+Closed-loop clients send a mix of reads and writes through the WSGI
+handler, served by a pool of --server-threads threads, as in a threaded
+WSGI server. There are more clients than the server can keep up with. The
+run is repeated with admission control at its defaults and with limits
+too large ever to apply. Shed clients wait out the Retry-After, with
+jitter. For each run the table shows the throughput and latency of the
+requests that were served, and how many were shed with a 503, leaving out
+the first --warmup seconds while every server thread opens its
+connections.
+
+    python benchmarks/admission_load.py --seconds 10 --clients 200
+
+Each run is a subprocess on a fresh copy of the same seeded file, using
+the production SQLite profile.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+UNLIMITED = {
+    'AUDIOSERVE_READ_CONCURRENCY': '100000', 'AUDIOSERVE_READ_QUEUE': '100000',
+    'AUDIOSERVE_WRITE_CONCURRENCY': '100000', 'AUDIOSERVE_WRITE_QUEUE': '100000',
+}
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def seed(rows):
+    setup_django()
+    from django.core.management import call_command
+    from api.bench import seed
+    call_command('migrate', verbosity=0)
+    seed(rows)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(seconds, warmup, clients, server_threads, write_fraction, rows):
+    setup_django()
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    server = ThreadPoolExecutor(max_workers=server_threads)
+    lock = threading.Lock()
+    latencies = {'read': [], 'write': []}
+    statuses = {}
+    measure_from = time.perf_counter() + warmup
+    deadline = measure_from + seconds
+
+    def handle(method, path, body):
+        environ = {
+            'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'REMOTE_ADDR': '127.0.0.1', 'wsgi.input': io.BytesIO(body),
+            'CONTENT_TYPE': 'application/x-www-form-urlencoded', 'CONTENT_LENGTH': str(len(body)),
+            'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http', 'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+        }
+        status = []
+        result = application(environ, lambda s, h, exc_info=None: status.append((s, dict(h))))
+        b''.join(result)
+        result.close()
+        status, headers = status[0]
+        return int(status[:3]), float(headers.get('Retry-After', 0))
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            if rng.random() < write_fraction:
+                kind, request = 'write', ('POST', '/create/song/', b'name=load&duration=100')
+            else:
+                kind, request = 'read', ('GET', '/read/song/%d/' % rng.randint(1, rows), b'')
+            started = time.perf_counter()
+            status, retry_after = server.submit(handle, *request).result()
+            elapsed = time.perf_counter() - started
+            if started >= measure_from:
+                with lock:
+                    statuses[kind, status] = statuses.get((kind, status), 0) + 1
+                    if status == 200:
+                        latencies[kind].append(elapsed)
+            time.sleep(retry_after * rng.uniform(0.5, 1.5))
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - measure_from
+    server.shutdown()
+    return {
+        kind: {
+            'served_per_s': len(latencies[kind]) / elapsed,
+            'p50_ms': percentile(latencies[kind], 0.50) * 1000,
+            'p99_ms': percentile(latencies[kind], 0.99) * 1000,
+            'max_ms': max(latencies[kind], default=0) * 1000,
+            'shed': statuses.get((kind, 503), 0),
+            'errors': sum(n for (k, status), n in statuses.items() if k == kind and status not in (200, 503)),
+        }
+        for kind in ('read', 'write')
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--server-threads', type=int, default=200)
+    parser.add_argument('--write-fraction', type=float, default=0.3)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        result = run(args.seconds, args.warmup, args.clients, args.server_threads, args.write_fraction, args.rows)
+        print(json.dumps(result))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, 'seed.sqlite3')
+        os.environ.update(AUDIOSERVE_DB_PATH=seeded, AUDIOSERVE_DB_PROFILE='production')
+        seed(args.rows)
+        print('%-10s %-6s %10s %9s %9s %9s %7s %7s' % (
+            'admission', 'kind', 'served/s', 'p50 ms', 'p99 ms', 'max ms', 'shed', 'errors'))
+        for name, extra in (('off', UNLIMITED), ('on', {})):
+            path = os.path.join(tmp, '%s.sqlite3' % name)
+            shutil.copy(seeded, path)
+            env = dict(os.environ, AUDIOSERVE_DB_PATH=path, **extra)
+            output = subprocess.run(
+                [sys.executable, __file__, '--worker'] + sys.argv[1:],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            for kind, stats in result.items():
+                print('%-10s %-6s %10.1f %9.1f %9.1f %9.1f %7d %7d' % (
+                    name, kind, stats['served_per_s'], stats['p50_ms'], stats['p99_ms'], stats['max_ms'],
+                    stats['shed'], stats['errors']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+"""
+Load test comparing the WSGI path (sync views, one thread per connection)
+with the ASGI path (async views, database work on a bounded thread pool).
+
+Both handlers are driven in-process against the same seeded SQLite file.
+Every simulated client takes --client-delay seconds to send its request,
+like a slow mobile client. Under WSGI that time is spent holding one of
+--wsgi-threads server threads. Under ASGI it is spent awaiting on the event
+loop.
+
+    python benchmarks/asgi_load.py --requests 2000 --concurrency 400 --client-delay 0.5
+
+Each handler runs in its own subprocess, so that the AUDIOSERVE_ASYNC_VIEWS
+switch is read fresh.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django(async_views):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    os.environ['AUDIOSERVE_ASYNC_VIEWS'] = '1' if async_views else '0'
+    import django
+    django.setup()
+
+
+def seed(rows):
+    setup_django(async_views=False)
+    from django.core.management import call_command
+    from api.models import Song
+    call_command('migrate', verbosity=0)
+    Song.objects.bulk_create(
+        [Song(name='song%d' % i, duration=60 + i % 600) for i in range(rows)], batch_size=1000
+    )
+
+
+def request_paths(count, rows):
+    rng = random.Random(0)
+    paths = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            paths.append('/read/song/%d/' % rng.randint(1, rows))
+        else:
+            paths.append('/read/song/?limit=20')
+    return paths
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(mode, latencies, elapsed, errors):
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run_wsgi(paths, concurrency, client_delay, threads):
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    server = ThreadPoolExecutor(max_workers=threads)
+
+    def handle(path, started):
+        time.sleep(client_delay)
+        path, _, query = path.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'wsgi.input': io.BytesIO(b''), 'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        }
+        status = []
+        body = b''.join(application(environ, lambda s, h, exc_info=None: status.append(s)))
+        with lock:
+            latencies.append(time.perf_counter() - started)
+            if not status[0].startswith('200') or not body:
+                errors[0] += 1
+
+    def client(client_paths):
+        for path in client_paths:
+            server.submit(handle, path, time.perf_counter()).result()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(client, [paths[i::concurrency] for i in range(concurrency)]))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+    return summarize('wsgi', latencies, elapsed, errors[0])
+
+
+def run_asgi(paths, concurrency, client_delay):
+    from django.core.asgi import get_asgi_application
+    application = get_asgi_application()
+    latencies = []
+    errors = [0]
+
+    async def handle(path):
+        started = time.perf_counter()
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'localhost')],
+            'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+        }
+        messages = []
+
+        async def receive():
+            await asyncio.sleep(client_delay)
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        await application(scope, receive, send)
+        latencies.append(time.perf_counter() - started)
+        if messages[0]['status'] != 200:
+            errors[0] += 1
+
+    async def client(client_paths):
+        for path in client_paths:
+            await handle(path)
+
+    async def main():
+        await asyncio.gather(*[client(paths[i::concurrency]) for i in range(concurrency)])
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return summarize('asgi', latencies, elapsed, errors[0])
+
+
+def worker(args):
+    setup_django(async_views=args.worker == 'asgi')
+    paths = request_paths(args.requests, args.rows)
+    if args.worker == 'wsgi':
+        result = run_wsgi(paths, args.concurrency, args.client_delay, args.wsgi_threads)
+    else:
+        result = run_asgi(paths, args.concurrency, args.client_delay)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=400)
+    parser.add_argument('--client-delay', type=float, default=0.5)
+    parser.add_argument('--wsgi-threads', type=int, default=32)
+    parser.add_argument('--db-threads', type=int, default=4)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--worker', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, AUDIOSERVE_DB_PATH=os.path.join(tmp, 'bench.sqlite3'),
+                   AUDIOSERVE_DB_THREADS=str(args.db_threads))
+        os.environ.update(env)
+        seed(args.rows)
+        print('%-5s %9s %7s %12s %9s %9s' % ('mode', 'requests', 'errors', 'req/s', 'p50 ms', 'p99 ms'))
+        for mode in ('wsgi', 'asgi'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--worker', mode] + sys.argv[1:],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print('%(mode)-5s %(requests)9d %(errors)7d %(throughput)12.1f %(p50_ms)9.1f %(p99_ms)9.1f' % result)
+
+
+if __name__ == '__main__':
+    main()
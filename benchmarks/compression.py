@@ -0,0 +1,83 @@
+"""
+CPU cost against bandwidth saved when compressing list reads, for every
+coding and level api/compression.py can use here (zstd and br only when
+the zstandard or brotli package is installed).
+
+The full /read/song/ list and its NDJSON stream are fetched once,
+uncompressed, through the test client. Each body is then compressed the
+way CompressionMiddleware does it: whole for the list, and chunk by chunk
+with a flush per chunk for the stream. The table shows the compressed
+size, the CPU time and the time the body would take on a 10 and a
+100 Mbit/s link, including that CPU time.
+
+    python benchmarks/compression.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+LEVELS = {'gzip': [1, 6, 9], 'br': [1, 4, 9], 'zstd': [1, 3, 9]}
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def fetch(rows):
+    from django.core.management import call_command
+    from django.test import Client
+    from api.bench import seed
+    from api.models import Podcast, Audiobook
+    call_command('migrate', verbosity=0)
+    seed(rows)
+    # Only songs are measured.
+    Podcast.objects.all().delete()
+    Audiobook.objects.all().delete()
+    client = Client(HTTP_HOST='localhost')
+    body = client.get('/read/song/').content
+    chunks = list(client.get('/read/song/', {'stream': 'ndjson'}).streaming_content)
+    return body, chunks
+
+
+def transfer_ms(size, mbit):
+    return size * 8 / (mbit * 1000000) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['AUDIOSERVE_DB_PATH'] = os.path.join(tmp, 'bench.sqlite3')
+        setup_django()
+        from api.compression import COMPRESSORS
+        body, chunks = fetch(args.rows)
+
+    print('%-7s %-6s %5s %12s %7s %9s %10s %11s' % (
+        'body', 'coding', 'level', 'bytes', 'ratio', 'cpu ms', '10Mbit ms', '100Mbit ms'))
+    for name, parts in (('list', [body]), ('stream', chunks)):
+        size = sum(len(part) for part in parts)
+        print('%-7s %-6s %5s %12d %7.2f %9.1f %10.0f %11.0f' % (
+            name, 'none', '-', size, 1, 0, transfer_ms(size, 10), transfer_ms(size, 100)))
+        for coding, compressor_class in COMPRESSORS.items():
+            for level in LEVELS[coding]:
+                started = time.process_time()
+                compressor = compressor_class(level)
+                compressed = sum(len(compressor.compress(part)) for part in parts) + len(compressor.finish())
+                cpu = (time.process_time() - started) * 1000
+                print('%-7s %-6s %5d %12d %7.2f %9.1f %10.0f %11.0f' % (
+                    name, coding, level, compressed, size / compressed, cpu,
+                    cpu + transfer_ms(compressed, 10), cpu + transfer_ms(compressed, 100)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Files per second for the duration probe of api/audio_headers.py.
+
+Generates a corpus of --files audio files (api/audio_corpus.py: WAV, MP3
+with and without Xing/VBRI tags, Ogg Vorbis and Opus, up to an hour
+long), checks every duration, and times three ways of probing them:
+
+- inline: audio_duration() in this process, one file after another;
+- pool: probe_duration() from --threads request threads, as the views
+  call it, on api/probe.py's pool of AUDIO_PROBE_WORKERS processes;
+- pool, cold: the same, including the time to start the pool.
+
+It also reports the bytes read per file, from /proc/self/io, against the
+files' average size.
+
+    python benchmarks/duration_probe.py --files 4000 --threads 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def bytes_read():
+    try:
+        with open('/proc/self/io') as f:
+            return int(next(line for line in f if line.startswith('rchar:')).split()[1])
+    except (OSError, StopIteration):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=4000)
+    parser.add_argument('--threads', type=int, default=8, help='Request threads probing at once (default 8).')
+    args = parser.parse_args()
+
+    setup_django()
+    from api.audio_corpus import generate_corpus
+    from api.audio_headers import audio_duration
+    from api import probe
+
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        corpus = generate_corpus(tmp, args.files)
+        paths = [path for path, _, _ in corpus]
+        size = sum(os.path.getsize(path) for path in paths) / len(paths)
+        print('Generated %d files in %.1f s, %.1f MB on average.' % (
+            len(paths), time.perf_counter() - started, size / 1e6,
+        ))
+        wrong = [(path, seconds) for path, _, seconds in corpus if round(audio_duration(path)) != seconds]
+        if wrong:
+            sys.exit('Wrong durations: %r' % wrong[:10])
+
+        print('%-12s %10s %12s' % ('probe', 'files/s', 'bytes/file'))
+        before = bytes_read()
+        started = time.perf_counter()
+        for path in paths:
+            audio_duration(path)
+        elapsed = time.perf_counter() - started
+        read = bytes_read()
+        per_file = (read - before) / len(paths) if before is not None else float('nan')
+        print('%-12s %10.0f %12.0f' % ('inline', len(paths) / elapsed, per_file))
+
+        for name in ('pool, cold', 'pool'):
+            with ThreadPoolExecutor(args.threads) as threads:
+                started = time.perf_counter()
+                results = list(threads.map(probe.probe_duration, paths))
+                elapsed = time.perf_counter() - started
+            assert results == [seconds for _, _, seconds in corpus]
+            print('%-12s %10.0f %12s' % (name, len(paths) / elapsed, '-'))
+        print('%d probe workers, %d CPUs.' % (probe.PROBE_WORKERS, os.cpu_count()))
+
+
+if __name__ == '__main__':
+    main()
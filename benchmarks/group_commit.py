@@ -0,0 +1,117 @@
+"""
+Sustained single-item create throughput with the group-commit writer off
+and on (AUDIOSERVE_GROUP_COMMIT).
+
+--clients threads each post one song at a time to /create/song/ for
+--seconds seconds against a file database, the way clients that cannot
+batch their writes do.
+
+    python benchmarks/group_commit.py --seconds 10 --clients 16
+
+Each run uses its own subprocess and a fresh database file, so that the
+settings are read fresh. Pass --profile production to run both sides on
+the production SQLite profile.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(mode, seconds, clients):
+    from django.core.management import call_command
+    from django.db import connections
+    from django.test import Client
+    call_command('migrate', verbosity=0)
+    connections.close_all()
+    deadline = time.perf_counter() + seconds
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def client():
+        http = Client(HTTP_HOST='localhost', raise_request_exception=False)
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            status = http.post('/create/song/', {'name': 'song', 'duration': 100}).status_code
+            with lock:
+                if status == 200:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors[0] += 1
+        connections.close_all()
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {
+        'mode': mode,
+        'creates': len(latencies),
+        'errors': errors[0],
+        'creates_per_s': len(latencies) / seconds,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def worker(args):
+    setup_django()
+    print(json.dumps(run(args.worker, args.seconds, args.clients)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--max-items', type=int, default=64)
+    parser.add_argument('--max-delay', type=float, default=0.002)
+    parser.add_argument('--profile', choices=['default', 'production'], default='default')
+    parser.add_argument('--worker', choices=['off', 'on'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+
+    print('%-4s %8s %7s %10s %9s %9s' % ('mode', 'creates', 'errors', 'creates/s', 'p50 ms', 'p99 ms'))
+    for mode in ('off', 'on'):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(
+                os.environ,
+                AUDIOSERVE_DB_PATH=os.path.join(tmp, 'bench.sqlite3'),
+                AUDIOSERVE_DB_PROFILE=args.profile,
+                AUDIOSERVE_GROUP_COMMIT='1' if mode == 'on' else '0',
+                AUDIOSERVE_GROUP_COMMIT_MAX_ITEMS=str(args.max_items),
+                AUDIOSERVE_GROUP_COMMIT_MAX_DELAY=str(args.max_delay),
+            )
+            output = subprocess.run(
+                [sys.executable, __file__, '--worker', mode] + sys.argv[1:],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print('%(mode)-4s %(creates)8d %(errors)7d %(creates_per_s)10.1f %(p50_ms)9.1f %(p99_ms)9.1f' % result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Throughput of concurrent range requests to /stream/<audioType>/<id>/.
+
+A threaded wsgiref server serves the project on a local port, and
+--clients client threads each fetch random --range-size ranges of
+--files files of --file-size bytes, for --seconds. It runs twice: once
+with a wsgi.file_wrapper that sends with os.sendfile(), like gunicorn's,
+and once with wsgiref's own, which reads the file through Python. The
+table shows requests and megabytes per second and the request latency.
+
+    python benchmarks/range_stream.py --files 4 --file-size 256 --clients 16
+
+The files and the database are created in a temporary directory. The
+read gate of api/admission.py gets one slot per client, so that nothing
+is shed.
+"""
+import argparse
+import http.client
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import ServerHandler, WSGIRequestHandler, WSGIServer
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+MB = 1024 * 1024
+
+
+class SendfileHandler(ServerHandler):
+    def sendfile(self):
+        # What gunicorn does: send Content-Length bytes from the file's
+        # current offset, straight from the page cache.
+        fileno = self.result.filelike.fileno()
+        offset = os.lseek(fileno, 0, os.SEEK_CUR)
+        remaining = int(self.headers['Content-Length'])
+        self.send_headers()
+        self.stdout.flush()
+        socket = self.stdout.raw._sock if hasattr(self.stdout, 'raw') else self.stdout._sock
+        while remaining:
+            sent = os.sendfile(socket.fileno(), fileno, offset, remaining)
+            if not sent:
+                break
+            offset += sent
+            remaining -= sent
+        return True
+
+
+class RequestHandler(WSGIRequestHandler):
+    handler_class = ServerHandler
+
+    def log_message(self, *args):
+        pass
+
+    def handle(self):
+        # WSGIRequestHandler.handle(), with a choice of ServerHandler.
+        self.raw_requestline = self.rfile.readline(65537)
+        if not self.parse_request():
+            return
+        handler = self.handler_class(
+            self.rfile, self.wfile, self.get_stderr(), self.get_environ(), multithread=True,
+        )
+        handler.request_handler = self
+        handler.run(self.server.get_app())
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def setup(tmp, files, file_size, clients):
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'AudioServe.settings'
+    # Measure serving, not admission control.
+    os.environ['AUDIOSERVE_READ_CONCURRENCY'] = str(clients)
+    os.environ['AUDIOSERVE_DB_PATH'] = os.path.join(tmp, 'db.sqlite3')
+    os.environ['AUDIOSERVE_MEDIA_ROOT'] = os.path.join(tmp, 'media')
+    os.environ['AUDIOSERVE_DB_PROFILE'] = 'production'
+    import django
+    django.setup()
+    from django.core.management import call_command
+    from api.models import Song
+    call_command('migrate', verbosity=0)
+    os.makedirs(os.path.join(tmp, 'media', 'song'))
+    block = os.urandom(MB)
+    ids = []
+    for i in range(files):
+        name = 'song/bench%d.mp3' % i
+        with open(os.path.join(tmp, 'media', name), 'wb') as f:
+            for _ in range(file_size // MB):
+                f.write(block)
+        ids.append(Song.objects.create(name='bench %d' % i, duration=600, audio_file=name).id)
+    return ids
+
+
+def run(port, ids, file_size, range_size, clients, seconds):
+    latencies = []
+    transferred = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client(seed):
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            start = rng.randrange(file_size - range_size)
+            started = time.perf_counter()
+            connection = http.client.HTTPConnection('localhost', port)
+            connection.request('GET', '/stream/song/%d/' % rng.choice(ids), headers={
+                'Range': 'bytes=%d-%d' % (start, start + range_size - 1),
+            })
+            response = connection.getresponse()
+            body = response.read()
+            connection.close()
+            assert response.status == 206 and len(body) == range_size, response.status
+            with lock:
+                latencies.append(time.perf_counter() - started)
+                transferred[0] += len(body)
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests/s': len(latencies) / elapsed,
+        'MB/s': transferred[0] / MB / elapsed,
+        'p50 ms': latencies[len(latencies) // 2] * 1000,
+        'p99 ms': latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=4)
+    parser.add_argument('--file-size', type=int, default=256, help='Megabytes per file (default 256).')
+    parser.add_argument('--range-size', type=int, default=1024, help='Kilobytes per range (default 1024).')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ids = setup(tmp, args.files, args.file_size * MB, args.clients)
+        from django.core.wsgi import get_wsgi_application
+        server = ThreadingWSGIServer(('localhost', 0), RequestHandler)
+        server.set_app(get_wsgi_application())
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.server_address[1]
+
+        print('%d files of %d MB, %d KB ranges, %d clients' % (args.files, args.file_size, args.range_size,
+                                                              args.clients))
+        print('%-10s %12s %10s %9s %9s' % ('server', 'requests/s', 'MB/s', 'p50 ms', 'p99 ms'))
+        for name, handler_class in [('sendfile', SendfileHandler), ('read', ServerHandler)]:
+            RequestHandler.handler_class = handler_class
+            result = run(port, ids, args.file_size * MB, args.range_size * 1024, args.clients, args.seconds)
+            print('%-10s %12.1f %10.1f %9.2f %9.2f' % (
+                name, result['requests/s'], result['MB/s'], result['p50 ms'], result['p99 ms'],
+            ))
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
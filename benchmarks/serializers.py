@@ -0,0 +1,108 @@
+"""
+Rows per second for serializing full list reads, comparing the three ways
+the API has turned rows into JSON:
+
+    dicts      a model instance per row, copied into a dict by hand, with
+               participants decoded by json.loads and then encoded again
+               (the original ReadView)
+    instances  a model instance per row, encoded straight to JSON text
+    rows       values_list() rows through api.serializers.row_serializer,
+               with no model instances (what ReadView does now)
+    id,name    the same, for ?fields=id,name (id,title for audiobooks)
+
+Each run fetches and encodes the whole table, like /read/<audioType>/.
+
+    python benchmarks/serializers.py --rows 100000 --repeat 3
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def seed(rows):
+    from django.core.management import call_command
+    from api.bench import seed
+    call_command('migrate', verbosity=0)
+    seed(rows)
+
+
+def dicts(model, audioType):
+    from api.serializers import SCHEMAS, encoder
+    items = []
+    for item in model.objects.all():
+        temp = {}
+        for name in SCHEMAS[audioType]:
+            temp[name] = getattr(item, name)
+        if 'participants' in temp:
+            temp['participants'] = json.loads(temp['participants'])
+        items.append(temp)
+    return encoder.encode(items)
+
+
+def instances(model, audioType):
+    from api.serializers import SCHEMAS, encoder, json_list
+    fields = [name for name in SCHEMAS[audioType] if name != 'participants']
+
+    def to_json(item):
+        text = encoder.encode({name: getattr(item, name) for name in fields})
+        if audioType == 'podcast':
+            text = '%s,"participants":%s}' % (text[:-1], item.participants)
+        return text
+
+    return json_list(to_json(item) for item in model.objects.all())
+
+
+def rows(model, audioType):
+    from api.serializers import json_list
+    from api.views import AUDIO_TYPES
+    _, to_json = AUDIO_TYPES[audioType]
+    return json_list(to_json(row) for row in model.objects.values_list(*to_json.fields))
+
+
+def projected(model, audioType):
+    from api.serializers import json_list, parse_fields
+    to_json = parse_fields(model, audioType, 'id,title' if audioType == 'audiobook' else 'id,name')
+    return json_list(to_json(row) for row in model.objects.values_list(*to_json.fields))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['AUDIOSERVE_DB_PATH'] = os.path.join(tmp, 'bench.sqlite3')
+        setup_django()
+        seed(args.rows)
+        from api.views import AUDIO_TYPES
+        print('%-10s %-10s %12s %12s' % ('type', 'path', 'rows/s', 'bytes'))
+        for audioType, (model, _) in AUDIO_TYPES.items():
+            outputs = []
+            for path in (dicts, instances, rows, projected):
+                best = float('inf')
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    output = path(model, audioType)
+                    best = min(best, time.perf_counter() - started)
+                outputs.append(json.loads(output))
+                name = 'id,name' if path is projected else path.__name__
+                print('%-10s %-10s %12.0f %12d' % (audioType, name, args.rows / best, len(output)))
+            assert outputs[0] == outputs[1] == outputs[2]
+
+
+if __name__ == '__main__':
+    main()
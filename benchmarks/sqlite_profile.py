@@ -0,0 +1,147 @@
+"""
+Mixed read/write load on one SQLite file, with the default database settings
+and with the production profile (AUDIOSERVE_DB_PROFILE=production).
+
+Reader threads fetch random pages of /read/song/ and writer threads create
+songs through /create/song/, all at the same time and for the same number
+of seconds. With the default settings every write locks the whole file
+against readers; with the production profile readers work from a WAL
+snapshot on their own read-only connection.
+
+    python benchmarks/sqlite_profile.py --seconds 10 --readers 8 --writers 2
+
+Each profile runs in its own subprocess on a fresh copy of the same seeded
+file, so that the settings are read fresh.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def seed(rows):
+    setup_django()
+    from django.core.management import call_command
+    from api.models import Song
+    call_command('migrate', verbosity=0)
+    Song.objects.bulk_create(
+        [Song(name='song%d' % i, duration=60 + i % 600) for i in range(rows)], batch_size=1000
+    )
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(profile, seconds, readers, writers):
+    from django.db import connections
+    from django.test import Client
+    from api.models import Song
+    from api.pagination import encode_cursor
+
+    cursors = [
+        encode_cursor([uploaded_time.isoformat(), pk])
+        for uploaded_time, pk in Song.objects.values_list('uploaded_time', 'id')
+    ]
+    connections.close_all()
+    deadline = time.perf_counter() + seconds
+    lock = threading.Lock()
+    counts = {'reads': 0, 'writes': 0, 'read_errors': 0, 'write_errors': 0}
+    latencies = {'reads': [], 'writes': []}
+
+    def loop(kind, request):
+        client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+        rng = random.Random()
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                ok = request(client, rng).status_code == 200
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    counts[kind] += 1
+                    latencies[kind].append(elapsed)
+                else:
+                    counts[kind[:-1] + '_errors'] += 1
+        connections.close_all()
+
+    def read(client, rng):
+        return client.get('/read/song/', {'limit': 20, 'after': rng.choice(cursors)})
+
+    def write(client, rng):
+        return client.post('/create/song/', {'name': 'new song', 'duration': rng.randint(1, 600)})
+
+    threads = [threading.Thread(target=loop, args=('reads', read)) for _ in range(readers)]
+    threads += [threading.Thread(target=loop, args=('writes', write)) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(
+        counts,
+        profile=profile,
+        reads_per_s=counts['reads'] / seconds,
+        writes_per_s=counts['writes'] / seconds,
+        read_p99_ms=percentile(latencies['reads'], 0.99) * 1000,
+        write_p99_ms=percentile(latencies['writes'], 0.99) * 1000,
+    )
+
+
+def worker(args):
+    setup_django()
+    print(json.dumps(run(args.worker, args.seconds, args.readers, args.writers)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--worker', choices=['default', 'production'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        seeded = os.path.join(tmp, 'seed.sqlite3')
+        os.environ['AUDIOSERVE_DB_PATH'] = seeded
+        seed(args.rows)
+        print('%-10s %9s %9s %8s %8s %12s %12s' % (
+            'profile', 'reads/s', 'writes/s', 'r.errs', 'w.errs', 'read p99 ms', 'write p99 ms'))
+        for profile in ('default', 'production'):
+            path = os.path.join(tmp, '%s.sqlite3' % profile)
+            shutil.copy(seeded, path)
+            env = dict(os.environ, AUDIOSERVE_DB_PATH=path, AUDIOSERVE_DB_PROFILE=profile)
+            output = subprocess.run(
+                [sys.executable, __file__, '--worker', profile] + sys.argv[1:],
+                env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print('%(profile)-10s %(reads_per_s)9.1f %(writes_per_s)9.1f %(read_errors)8d %(write_errors)8d '
+                  '%(read_p99_ms)12.1f %(write_p99_ms)12.1f' % result)
+
+
+if __name__ == '__main__':
+    main()
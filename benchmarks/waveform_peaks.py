@@ -0,0 +1,101 @@
+"""
+Peak generation rate and memory of api/peaks.py, and the time to serve a level.
+
+Writes a --seconds long 16-bit stereo WAV file of random samples and times
+write_peaks() on it, with numpy and without. Then, in a fresh process per
+file, it writes the peaks of sparse WAV files of 1 minute and of --hours
+hours and reports the peak RSS of that process, to show that memory use
+does not grow with the length of the file. Last, it times peaks_response()
+for every level of the short file, as the /peaks/ view calls it.
+
+    python benchmarks/waveform_peaks.py --seconds 600 --hours 3
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+
+
+def setup_django():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AudioServe.settings')
+    import django
+    django.setup()
+
+
+def peak_rss(path):
+    """Write the peaks of path in this process; print its peak RSS in KiB."""
+    setup_django()
+    from api.peaks import write_peaks
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    write_peaks(path)
+    print(before, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=int, default=600, help='Length of the timed file (default 600).')
+    parser.add_argument('--hours', type=float, default=3, help='Length of the long sparse file (default 3).')
+    parser.add_argument('--rss', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.rss:
+        return peak_rss(args.rss)
+
+    setup_django()
+    from django.test import RequestFactory
+    from api import peaks
+    from api.audio_corpus import wav_header, write_wav
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'random.wav')
+        data = args.seconds * 44100 * 4
+        with open(path, 'wb') as f:
+            f.write(wav_header(data))
+            for start in range(0, data, 1 << 20):
+                f.write(os.urandom(min(1 << 20, data - start)))
+        print('%d s of 16-bit stereo, %.0f MB.' % (args.seconds, os.path.getsize(path) / 1e6))
+        print('%-10s %10s %10s' % ('path', 'seconds', 'MB/s'))
+        for name, numpy in (('numpy', peaks.numpy), ('fallback', None)):
+            if name == 'numpy' and numpy is None:
+                print('%-10s %10s %10s' % (name, '-', 'not installed'))
+                continue
+            with mock.patch('api.peaks.numpy', numpy):
+                started = time.perf_counter()
+                peaks.write_peaks(path)
+                elapsed = time.perf_counter() - started
+            print('%-10s %10.2f %10.0f' % (name, elapsed, os.path.getsize(path) / elapsed / 1e6))
+
+        print('%-10s %10s %10s %12s' % ('file', 'MB', 'seconds', 'RSS growth'))
+        for label, seconds in (('1 min', 60), ('%g h' % args.hours, int(args.hours * 3600))):
+            sparse = os.path.join(tmp, 'sparse-%d.wav' % seconds)
+            write_wav(sparse, seconds)
+            output = subprocess.run(
+                [sys.executable, __file__, '--rss', sparse], check=True, capture_output=True, text=True,
+            ).stdout.split()
+            before, after, elapsed = int(output[0]), int(output[1]), float(output[2])
+            print('%-10s %10.0f %10.2f %9d KiB' % (label, os.path.getsize(sparse) / 1e6, elapsed, after - before))
+            os.remove(sparse)
+            os.remove(sparse + '.peaks')
+
+        peaks.write_peaks(path)
+        request = RequestFactory().get('/')
+        print('%-10s %10s %10s' % ('level', 'bytes', 'us/request'))
+        for resolution in peaks.PEAK_RESOLUTIONS:
+            started = time.perf_counter()
+            for _ in range(1000):
+                response = peaks.peaks_response(request, path + '.peaks', resolution)
+                size = len(b''.join(response.streaming_content))
+                response.close()
+            print('%-10d %10d %10.0f' % (resolution, size, (time.perf_counter() - started) * 1000))
+
+
+if __name__ == '__main__':
+    main()